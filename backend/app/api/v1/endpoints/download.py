@@ -1,14 +1,36 @@
+import json
 import uuid
 import asyncio
-from typing import Dict
+import httpx
+from pathlib import Path
+from typing import Dict, Optional
 from fastapi import APIRouter, BackgroundTasks, HTTPException
-from app.models.schemas import DownloadRequest, DownloadStatus
-from app.core.state import downloads
+from app.models.schemas import DownloadRequest, DownloadResumeRequest, DownloadStatus
+from app.core.state import downloads, download_requests
 from app.core.config import settings
-from app.services.downloader import VideoDownloader
+from app.services.downloader import REQUEST_NAME, DownloadIncomplete, VideoDownloader
+from app.services.hls import select_segments
 
 router = APIRouter()
 
+def save_download_request(output_dir: Path, download_id: str, request: DownloadRequest):
+    """Keep the request next to the chunk manifest so the download can be resumed after a restart."""
+    chunks_dir = output_dir / "chunks"
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    record = {"downloadId": download_id, "request": request.model_dump()}
+    (chunks_dir / REQUEST_NAME).write_text(json.dumps(record))
+
+def load_download_request(download_id: str) -> Optional[DownloadRequest]:
+    """The saved request of an unfinished download, or None if there is none."""
+    for path in settings.VIDEO_DIR.glob(f"*/chunks/{REQUEST_NAME}"):
+        try:
+            record = json.loads(path.read_text())
+            if record.get("downloadId") == download_id:
+                return DownloadRequest.model_validate(record["request"])
+        except (OSError, ValueError, KeyError, AttributeError):
+            continue
+    return None
+
 async def run_download_task(download_id: str, request: DownloadRequest):
     """Background task to handle the download process"""
     try:
@@ -21,14 +43,19 @@ async def run_download_task(download_id: str, request: DownloadRequest):
             safe_title = f"lecture_{download_id[:8]}"
 
         output_dir = settings.VIDEO_DIR / safe_title
+        save_download_request(output_dir, download_id, request)
 
         stream_info = request.streamInfo
-        if not stream_info.baseUrl:
+        if not stream_info.baseUrl and not stream_info.streamUrl:
              downloads[download_id].status = "error"
              downloads[download_id].message = "No base URL provided"
              return
 
-        downloader = VideoDownloader(output_dir=str(output_dir))
+        downloader = VideoDownloader(
+            output_dir=str(output_dir),
+            streaming_merge=request.streamingMerge,
+            prepare_media=request.prepareMedia,
+        )
 
         def progress_callback(current: int, total: int, message: str):
             progress = (current / total) * 90 if total > 0 else 0
@@ -39,30 +66,65 @@ async def run_download_task(download_id: str, request: DownloadRequest):
 
         downloader.set_progress_callback(progress_callback)
 
-        # Determine chunks
-        CHUNK_DURATION = 16 # Approximation from V1 observations
-        start_chunk = 0
-        end_chunk = 100 # Default if detection fails
-
-        if stream_info.detectedChunk:
-            end_chunk = stream_info.detectedChunk + 10 # Buffer
-
-        if request.startTime is not None:
-            start_chunk = int(request.startTime / CHUNK_DURATION)
-
-        if request.endTime is not None:
-            end_chunk = int(request.endTime / CHUNK_DURATION)
-
-        # Download
-        downloads[download_id].message = f"Downloading chunks {start_chunk}-{end_chunk}..."
-        success = await downloader.download_chunks(
-            base_url=stream_info.baseUrl,
-            start_chunk=start_chunk,
-            end_chunk=end_chunk,
-            key_pair_id=stream_info.keyPairId or "",
-            policy=stream_info.policy or "",
-            signature=stream_info.signature or ""
-        )
+        key_pair_id = stream_info.keyPairId or ""
+        policy = stream_info.policy or ""
+        signature = stream_info.signature or ""
+
+        # Prefer the playlist: it gives the exact segment list and durations
+        segments = None
+        if stream_info.streamUrl:
+            downloads[download_id].message = "Fetching playlist..."
+            try:
+                playlist = await downloader.fetch_playlist(
+                    stream_info.streamUrl, key_pair_id, policy, signature
+                )
+                segments = select_segments(playlist, request.startTime, request.endTime)
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"[Download] Playlist unavailable ({e}), falling back to chunk probing")
+                if not stream_info.baseUrl:
+                    raise
+
+        if segments is not None:
+            if not segments:
+                downloads[download_id].status = "error"
+                downloads[download_id].message = "No segments in the requested time range"
+                return
+
+            start_chunk, end_chunk = segments[0].index, segments[-1].index
+            downloads[download_id].message = f"Downloading {len(segments)} segments..."
+            success = await downloader.download_segments(
+                segments,
+                stream_id=stream_info.streamUrl.split("?", 1)[0],
+                key_pair_id=key_pair_id,
+                policy=policy,
+                signature=signature,
+                concurrency=request.concurrency
+            )
+        else:
+            # No playlist: guess the chunk range and probe for the end
+            CHUNK_DURATION = 16 # Approximation from V1 observations
+            start_chunk = 0
+            end_chunk = 100 # Default if detection fails
+
+            if stream_info.detectedChunk:
+                end_chunk = stream_info.detectedChunk + 10 # Buffer
+
+            if request.startTime is not None:
+                start_chunk = int(request.startTime / CHUNK_DURATION)
+
+            if request.endTime is not None:
+                end_chunk = int(request.endTime / CHUNK_DURATION)
+
+            downloads[download_id].message = f"Downloading chunks {start_chunk}-{end_chunk}..."
+            success = await downloader.download_chunks(
+                base_url=stream_info.baseUrl,
+                start_chunk=start_chunk,
+                end_chunk=end_chunk,
+                key_pair_id=key_pair_id,
+                policy=policy,
+                signature=signature,
+                concurrency=request.concurrency
+            )
 
         if not success:
             downloads[download_id].status = "error"
@@ -82,6 +144,12 @@ async def run_download_task(download_id: str, request: DownloadRequest):
             downloads[download_id].status = "error"
             downloads[download_id].message = "Failed to merge video"
 
+    except DownloadIncomplete as e:
+        # chunks/ and the saved request stay on disk for POST /download/{id}/resume
+        downloads[download_id].status = "error"
+        downloads[download_id].message = f"Download interrupted: {e}. Resume to fetch the rest."
+        downloads[download_id].error = str(e)
+
     except Exception as e:
         print(f"Download Error: {e}")
         downloads[download_id].status = "error"
@@ -102,6 +170,7 @@ async def start_download(request: DownloadRequest, background_tasks: BackgroundT
         message="Initializing...",
         title=request.title
     )
+    download_requests[download_id] = request
 
     background_tasks.add_task(run_download_task, download_id, request)
 
@@ -110,6 +179,48 @@ async def start_download(request: DownloadRequest, background_tasks: BackgroundT
         "message": "Download started"
     }
 
+@router.post("/download/{download_id}/resume", response_model=Dict[str, str])
+async def resume_download(download_id: str, background_tasks: BackgroundTasks,
+                          body: Optional[DownloadResumeRequest] = None):
+    """Resume an interrupted download, fetching only the chunks still missing"""
+    if download_id not in download_requests:
+        # Not started by this server process: look for the request a previous one saved
+        saved = load_download_request(download_id)
+        if saved is None:
+            raise HTTPException(status_code=404, detail="Download not found")
+        download_requests[download_id] = saved
+        downloads[download_id] = DownloadStatus(
+            downloadId=download_id,
+            status="error",
+            progress=0.0,
+            message="Interrupted",
+            title=saved.title
+        )
+    if download_id not in downloads:
+        raise HTTPException(status_code=404, detail="Download not found")
+
+    status = downloads[download_id]
+    if status.status in ("pending", "downloading"):
+        raise HTTPException(status_code=409, detail="Download is already in progress")
+    if status.status == "complete":
+        raise HTTPException(status_code=400, detail="Download is already complete")
+
+    request = download_requests[download_id]
+    if body is not None and body.streamInfo is not None:
+        request = request.model_copy(update={"streamInfo": body.streamInfo})
+        download_requests[download_id] = request
+
+    status.status = "pending"
+    status.message = "Resuming download..."
+    status.error = None
+
+    background_tasks.add_task(run_download_task, download_id, request)
+
+    return {
+        "downloadId": download_id,
+        "message": "Download resumed"
+    }
+
 @router.get("/status/{download_id}", response_model=DownloadStatus)
 async def get_download_status(download_id: str):
     """Get the status of a specific download"""
@@ -1,6 +1,9 @@
-from fastapi import APIRouter
-from typing import Dict, List, Any
+from fastapi import APIRouter, HTTPException
+from typing import Dict, List, Any, Optional
+from app.core.config import settings
+from app.models.schemas import WhisperModelRequest
 from app.services.llm_service import LLMService
+from app.services.whisper_service import WhisperService
 from app.core.config_store import config_store
 from app.core.state import JOB_QUEUE, processes
 
@@ -18,11 +21,43 @@ async def list_models():
         provider_name = "ollama"
 
     return {
-        "whisper": ["turbo", "large-v3", "medium", "small"],
+        "whisper": [
+            "turbo", "large-v3", "medium", "small",
+            # int8 CTranslate2 builds: much faster on CPU-only hosts
+            "ctranslate2:large-v3-turbo", "ctranslate2:medium", "ctranslate2:small",
+        ],
         "llm": llm_models,
         "llmProvider": provider_name,
     }
 
+@router.get("/whisper/models", response_model=Dict[str, Any])
+def list_loaded_whisper_models():
+    """Whisper models currently held in memory, least recently used first."""
+    return {
+        "models": WhisperService().cached_models(),
+        "budgetBytes": settings.WHISPER_CACHE_MB * 2**20,
+    }
+
+@router.post("/whisper/models", response_model=Dict[str, Any])
+def preload_whisper_model(request: WhisperModelRequest):
+    """Load a model ahead of the jobs that need it (blocks until loaded)."""
+    service = WhisperService()
+    try:
+        service.load_model(request.model, request.device)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown transcription engine: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load {request.model}: {e}")
+    return {"message": f"Loaded {request.model}", "models": service.cached_models()}
+
+@router.delete("/whisper/models", response_model=Dict[str, Any])
+def evict_whisper_model(model: str, device: Optional[str] = None):
+    """Unload a model to free its memory."""
+    service = WhisperService()
+    if not service.evict(model, device):
+        raise HTTPException(status_code=404, detail=f"Model not loaded: {model}")
+    return {"message": f"Evicted {model}", "models": service.cached_models()}
+
 @router.get("/queue", response_model=Dict[str, Any])
 async def get_queue_status():
     """Get current queue status"""
@@ -12,13 +12,46 @@ class Settings(BaseSettings):
 
     # AI Settings
     WHISPER_MODEL: str = "turbo"  # large-v3-turbo - fastest and most accurate
+    WHISPER_ENGINE: str = "openai"      # "openai" (PyTorch) or "ctranslate2" (faster-whisper); "engine:model" overrides per job
+    WHISPER_COMPUTE_TYPE: str = "int8"  # CTranslate2 weight quantization ("int8", "int8_float16", "float16", "float32")
+    WHISPER_CACHE_MB: int = 6144        # Memory budget for loaded Whisper models (LRU eviction beyond it)
+    WHISPER_WORKERS: int = 1            # >1 splits audio at silences and transcribes in parallel processes
+    WHISPER_SEGMENT_SECONDS: int = 300  # Target span length for segmented transcription
+    WHISPER_STREAM_SECONDS: int = 60    # Span length for streaming transcription (progress/resume granularity)
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "gpt-oss:20b"
 
+    # Media Settings
+    FRAME_SAMPLING: str = "scene"      # "scene" (emit on picture change) or "interval" (every FRAME_INTERVAL seconds)
+    FRAME_INTERVAL: int = 10           # Seconds between sampled frames in interval mode
+    FRAME_SCENE_THRESHOLD: float = 0.1 # ffmpeg scene score (0-1) that counts as a new picture
+    FRAME_MIN_GAP: float = 1.0         # Scene mode: never emit frames closer together than this (seconds)
+    FRAME_MAX_GAP: float = 60.0        # Scene mode: emit a frame at least this often, even without a change
+    FRAME_PIPE: bool = True            # Dedup raw frames straight from ffmpeg's stdout; only unique slides hit disk
+    OCR_WORKERS: int = 1               # >1 runs OCR in that many processes, one EasyOCR reader each
+    OCR_BATCH_SIZE: int = 8            # Slides per EasyOCR detector batch
+    OCR_TEXT_FILTER: bool = True       # Skip frames without text-like detail and crop the rest to their text area
+    OCR_MAX_SIDE: int = 1280           # Downscale OCR input so its longer side is at most this (0: full size)
+    OCR_PRELOAD: bool = False          # Load the EasyOCR reader in the background at startup
+    OCR_IDLE_TIMEOUT: int = 600        # Free the shared reader after this many idle seconds with an empty queue (0: keep)
+    OCR_CACHE_ENABLED: bool = True     # Reuse OCR of slides seen before (any lecture), matched by pHash
+    OCR_CACHE_PATH: Path = OUTPUT_DIR / "cache" / "ocr.sqlite3"
+    OCR_CACHE_TOLERANCE: int = 2       # Max pHash Hamming distance for a cache hit
+    OCR_CACHE_MAX_ENTRIES: int = 20000 # Least recently used slides are evicted beyond this
+
     # LLM Provider Settings
     LLM_PROVIDER: str = "ollama"       # "ollama" or "openai"
     LLM_MODEL: str = "gpt-oss:20b"    # Default model for active provider
     OPENAI_API_KEY: str = ""           # OpenAI API key
+    OPENAI_MAX_CONCURRENCY: int = 8    # Requests in flight at once against OpenAI
+    OLLAMA_NUM_PARALLEL: int = 1       # Requests in flight at once against Ollama; match the server's OLLAMA_NUM_PARALLEL
+    OLLAMA_KEEP_ALIVE: str = "30m"     # How long Ollama keeps the model (and its prompt cache) loaded after a request
+    OLLAMA_NUM_CTX: int = 8192         # Context window requested from Ollama; keep within what the model supports
+    LLM_OUTPUT_TOKENS: int = 4096      # Context kept free for the response when sizing transcript chunks
+    LLM_CHUNK_OVERLAP_TOKENS: int = 128  # Transcript repeated at the start of the next chunk for continuity
+    LLM_KNOWLEDGE_TOKENS: int = 0      # Merge chunk extractions until the knowledge base fits this (0: the model's context)
+    LLM_RETRIES: int = 2               # Extra attempts for a failed chunk extraction or notes artifact
+    LLM_NOTES_CONCURRENCY: int = 4     # Notes artifacts generated at once (also capped by the provider's limit)
 
     class Config:
         env_file = ".env"
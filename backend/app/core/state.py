@@ -1,11 +1,13 @@
 from typing import Dict, Optional, List
-from app.models.schemas import DownloadStatus, ProcessStatus
+from app.models.schemas import DownloadStatus, DownloadRequest, ProcessStatus
 
 # Global state stores
 # In a production app, these should be in a database (Redis/Postgres)
 # For this local app, in-memory dicts are sufficient as per V1 design
 
 downloads: Dict[str, DownloadStatus] = {}
+# Original requests, kept so an interrupted download can be resumed
+download_requests: Dict[str, DownloadRequest] = {}
 processes: Dict[str, ProcessStatus] = {}
 
 # Job Queue for sequential processing
@@ -1,7 +1,9 @@
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
 from app.core.state import JOB_QUEUE, processes
 from app.services.pipeline import ProcessingPipeline
+from app.services.vision_service import reader_pool
 from app.models.schemas import ProcessRequest
 
 async def process_worker():
@@ -28,7 +30,9 @@ async def process_worker():
                 await run_processing_job(process_id, request)
 
             else:
-                # Idle wait
+                # Idle wait; free the OCR model if nothing has needed it for a while
+                if reader_pool.release_idle(settings.OCR_IDLE_TIMEOUT):
+                    print("👷 Queue idle, released the OCR reader")
                 await asyncio.sleep(1)
 
         except Exception as e:
@@ -52,14 +56,13 @@ async def run_processing_job(process_id: str, request: ProcessRequest):
                 if process_id in processes:
                     processes[process_id].stage = stage
                     # A rough calculation of total progress based on stage
-                    # transcription: 0-40, frames: 40-70, notes: 70-100
+                    # analysis (transcription + frames in parallel): 0-70, notes: 70-100
                     base_progress = 0
-                    if stage == "transcription": base_progress = 0
-                    elif stage == "frames": base_progress = 40
+                    if stage == "analysis": base_progress = 0
                     elif stage == "notes": base_progress = 70
                     elif stage == "complete": base_progress = 100
 
-                    stage_weight = 40 if stage == "transcription" else 30
+                    stage_weight = 70 if stage == "analysis" else 30
                     if stage == "complete": stage_weight = 0
 
                     calc_progress = base_progress + (current / total * stage_weight)
@@ -6,6 +6,7 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.core.worker import process_worker
+from app.services.vision_service import reader_pool
 import os
 import subprocess
 
@@ -21,6 +22,15 @@ def prevent_sleep():
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("⚠️ Caffeinate not found (skipping sleep prevention)")
 
+def preload_ocr():
+    """Load the shared EasyOCR reader ahead of the first job"""
+    try:
+        reader_pool.preload()
+        print("🔤 OCR reader preloaded")
+    except Exception as e:
+        # Not fatal: the first job that needs OCR loads it instead
+        print(f"⚠️ OCR preload failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Scaler Companion Backend starting...")
@@ -28,11 +38,19 @@ async def lifespan(app: FastAPI):
 
     # Start the background worker
     worker_task = asyncio.create_task(process_worker())
+    tasks = [worker_task]
+
+    # Warm the OCR reader off the event loop so the first job doesn't pay for it
+    if settings.OCR_PRELOAD:
+        tasks.append(asyncio.create_task(asyncio.to_thread(preload_ocr)))
 
     yield
 
     print("👋 Scaler Companion Backend shutting down...")
-    worker_task.cancel()
+    # A preload still running in its thread finishes on its own; shutdown just stops waiting for it
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -19,6 +19,12 @@ class DownloadRequest(BaseModel):
     streamInfo: StreamInfo
     startTime: Optional[int] = None  # Start time in seconds
     endTime: Optional[int] = None    # End time in seconds
+    concurrency: int = 8             # Chunk fetches kept in flight
+    streamingMerge: bool = False     # Remux chunks into the output while downloading
+    prepareMedia: bool = False       # Also write audio.wav + frames/ for processing (implies streamingMerge)
+
+class DownloadResumeRequest(BaseModel):
+    streamInfo: Optional[StreamInfo] = None  # Fresh signed URL params, if the old ones expired
 
 class DownloadStatus(BaseModel):
     downloadId: str
@@ -33,13 +39,17 @@ class ProcessRequest(BaseModel):
     title: str
     videoPath: str
     options: Dict = {}
-    whisperModel: str = "medium"
+    whisperModel: Optional[str] = None  # "model" or "engine:model"; None = WHISPER_MODEL
     llmModel: str = "gpt-oss:20b"
     skipTranscription: bool = False
     skipFrames: bool = False
     skipNotes: bool = False
     skipSlideAnalysis: bool = False
 
+class WhisperModelRequest(BaseModel):
+    model: str  # "model" or "engine:model"
+    device: Optional[str] = None  # None = cuda if available, else cpu
+
 class ProcessStatus(BaseModel):
     processId: str
     status: str  # 'pending', 'processing', 'complete', 'error'
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.files import link_or_copy
+
+CACHE_DIR_NAME = "cache"  # Under the output base; skipped by recording listings (no date prefix)
+HASH_BLOCK = 1024 * 1024
+
+# (path, size, mtime) -> sha256, so a video is hashed once per process
+_digests: Dict[Tuple[str, int, int], str] = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if memo_key in _digests:
+            return _digests[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with _digests_lock:
+        _digests[memo_key] = digest
+    return digest
+
+
+def cache_key(*parts: Any) -> str:
+    """Key for an artifact derived from `parts` (input digests, model names, parameters)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store for stage outputs (transcripts, frame hashes,
+    slide OCR). Each artifact is a JSON document under <kind>/<key>.json,
+    optionally with files under <kind>/<key>/. Writes are atomic, and the
+    JSON is written last, so a present entry is always complete.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.root / kind / f"{key}.json"
+
+    def files_dir(self, kind: str, key: str) -> Path:
+        return self.root / kind / key
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        path = self._path(kind, key)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[ArtifactCache] Ignoring unreadable entry {path}: {e}")
+            return None
+
+    def put(self, kind: str, key: str, value: Any, files: Optional[List[str]] = None):
+        """Store `value`, plus hardlinks (or copies) of `files` by basename if given."""
+        if files is not None:
+            target = self.files_dir(kind, key)
+            staging = target.with_name(f"{key}.part")
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            for file in files:
+                link_or_copy(file, str(staging / os.path.basename(file)))
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.part")
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def delete(self, kind: str, key: str):
+        """Remove an artifact and its files, if present."""
+        self._path(kind, key).unlink(missing_ok=True)
+        shutil.rmtree(self.files_dir(kind, key), ignore_errors=True)
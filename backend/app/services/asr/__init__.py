@@ -0,0 +1,8 @@
+from app.services.asr.base import TranscriptionEngine
+from app.services.asr.registry import get_engine, parse_model_spec, register_engine, ENGINES
+
+# Import engines to trigger auto-registration
+import app.services.asr.openai_engine  # noqa: F401
+import app.services.asr.ctranslate2_engine  # noqa: F401
+
+__all__ = ["TranscriptionEngine", "get_engine", "parse_model_spec", "register_engine", "ENGINES"]
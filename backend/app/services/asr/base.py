@@ -0,0 +1,31 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+import numpy as np
+
+
+class TranscriptionEngine(ABC):
+    """Abstract base class for speech-to-text engines.
+
+    An engine loads its model once, in __init__, and returns results in the
+    openai-whisper shape: {"text", "segments": [{"id", "start", "end",
+    "text", ...}], "language"}, so callers don't care which one is behind
+    WhisperService.
+    """
+
+    engine_name: str = ""
+
+    @abstractmethod
+    def __init__(self, model_name: str, device: str = "cpu", threads: int = 0):
+        """Load `model_name` on `device`. `threads` caps CPU threads (0 = library default)."""
+        ...
+
+    @abstractmethod
+    def transcribe(self, audio: Union[str, np.ndarray], language: Optional[str] = "en",
+                   initial_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """Transcribe a file path or 16 kHz mono float32 samples."""
+        ...
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the loaded model, for cache budgeting."""
+        ...
@@ -0,0 +1,96 @@
+"""
+Compare transcription engines on a fixed clip.
+
+    python -m app.services.asr.benchmark clip.wav reference.txt \\
+        turbo ctranslate2:large-v3-turbo ctranslate2:small
+
+Reports model load time, real-time factor (transcription time / audio
+duration, lower is faster) and word error rate against the reference text.
+The clip should be the 16 kHz mono WAV media prep writes.
+"""
+import argparse
+import re
+import time
+from dataclasses import dataclass
+from typing import List
+from app.services.asr import get_engine, parse_model_spec
+from app.services.vad import read_wav, wav_duration
+
+
+@dataclass
+class BenchmarkResult:
+    spec: str
+    load_seconds: float
+    transcribe_seconds: float
+    rtf: float
+    wer: float
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """(substitutions + deletions + insertions) / reference words, ignoring case and punctuation."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    # Word-level edit distance, one row at a time
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def run_benchmark(spec: str, audio_path: str, reference: str, device: str = "cpu",
+                  language: str = "en", runs: int = 1) -> BenchmarkResult:
+    """Load one engine and time `runs` transcriptions of the clip (best run wins)."""
+    engine_name, model_name = parse_model_spec(spec)
+    start = time.perf_counter()
+    engine = get_engine(engine_name, model_name, device=device)
+    load_seconds = time.perf_counter() - start
+
+    audio = read_wav(audio_path)
+    duration = wav_duration(audio_path)
+    best = None
+    text = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = engine.transcribe(audio, language=language)["text"]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return BenchmarkResult(
+        spec=spec,
+        load_seconds=load_seconds,
+        transcribe_seconds=best,
+        rtf=best / duration,
+        wer=word_error_rate(reference, text),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcription engines on a sample clip")
+    parser.add_argument("audio", help="16 kHz mono WAV clip")
+    parser.add_argument("reference", help="Text file with the reference transcript")
+    parser.add_argument("models", nargs="+", help='Model specs, e.g. "turbo" or "ctranslate2:small"')
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.reference) as f:
+        reference = f.read()
+
+    print(f"{'model':<32} {'load s':>8} {'run s':>8} {'RTF':>6} {'WER':>6}")
+    for spec in args.models:
+        r = run_benchmark(spec, args.audio, reference, args.device, args.language, args.runs)
+        print(f"{r.spec:<32} {r.load_seconds:>8.1f} {r.transcribe_seconds:>8.1f} {r.rtf:>6.2f} {r.wer:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
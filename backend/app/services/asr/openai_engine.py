@@ -0,0 +1,39 @@
+import torch
+import whisper
+from typing import Any, Dict, Optional, Union
+import numpy as np
+from app.services.asr.base import TranscriptionEngine
+from app.services.asr.registry import register_engine
+
+TRANSCRIBE_OPTIONS = dict(
+    verbose=False,
+    task="transcribe",
+    # Improve accuracy with these settings
+    temperature=0.0,  # More deterministic
+    best_of=5,        # Sample multiple times
+    beam_size=5,      # Beam search
+    condition_on_previous_text=True,  # Use context
+)
+
+
+class OpenAIWhisperEngine(TranscriptionEngine):
+    """Reference openai-whisper PyTorch model."""
+
+    engine_name = "openai"
+
+    def __init__(self, model_name: str, device: str = "cpu", threads: int = 0):
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_name, device=device)
+
+    def transcribe(self, audio: Union[str, np.ndarray], language: Optional[str] = "en",
+                   initial_prompt: Optional[str] = None) -> Dict[str, Any]:
+        return self.model.transcribe(audio, language=language, initial_prompt=initial_prompt,
+                                     **TRANSCRIBE_OPTIONS)
+
+    def memory_bytes(self) -> int:
+        return sum(p.numel() * p.element_size() for p in self.model.parameters())
+
+
+# Auto-register when imported
+register_engine("openai", OpenAIWhisperEngine)
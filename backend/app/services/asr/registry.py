@@ -0,0 +1,24 @@
+from typing import Dict, Optional, Tuple, Type
+from app.core.config import settings
+from app.services.asr.base import TranscriptionEngine
+
+ENGINES: Dict[str, Type[TranscriptionEngine]] = {}
+
+def register_engine(name: str, cls: Type[TranscriptionEngine]):
+    """Register an engine class by name."""
+    ENGINES[name] = cls
+
+def parse_model_spec(spec: str, default_engine: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Split a model spec into (engine, model). "ctranslate2:small" selects an
+    engine explicitly; a bare model name like "turbo" uses WHISPER_ENGINE.
+    """
+    engine, sep, model = spec.partition(":")
+    if not sep:
+        return default_engine or settings.WHISPER_ENGINE, spec
+    return engine, model
+
+def get_engine(name: str, model_name: str, device: str = "cpu", threads: int = 0) -> TranscriptionEngine:
+    """Instantiate an engine (loading its model). Raises KeyError if unknown."""
+    cls = ENGINES[name]
+    return cls(model_name, device=device, threads=threads)
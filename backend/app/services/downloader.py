@@ -1,20 +1,215 @@
 import os
+import json
 import asyncio
+import hashlib
 import httpx
 import ffmpeg
 import shutil
 import aiofiles
+import threading
+from urllib.parse import urlsplit
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Optional, Callable, Dict, Any, List, Set, Tuple
+from app.services.hls import HLSSegment, is_master_playlist, parse_master_playlist, parse_media_playlist
+from app.services.media_prep import AUDIO_NAME, FRAMES_NAME, discard_prepared_media, media_outputs
+
+DEFAULT_CONCURRENCY = 8
+MAX_CONSECUTIVE_FAILURES = 10
+STREAM_BLOCK_SIZE = 64 * 1024
+LOOKAHEAD_FACTOR = 4
+MANIFEST_NAME = "manifest.jsonl"
+REQUEST_NAME = "request.json"  # Original download request, written by the download endpoint for resume
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadIncomplete(Exception):
+    """
+    The download stopped before the end of the stream (e.g. the network went
+    away). The chunks and manifest are kept so it can be resumed.
+    """
+
+    def __init__(self, downloaded: int, total: int):
+        super().__init__(f"Stopped after {downloaded}/{total} chunks")
+        self.downloaded = downloaded
+        self.total = total
+
+
+class ChunkManifest:
+    """
+    Append-only record of completed chunks in chunks/manifest.jsonl.
+
+    The first line identifies the stream the chunks belong to; each later
+    line records one chunk's index, size and sha256. A line torn by a crash
+    is ignored, so the manifest never claims a chunk it did not finish.
+    """
+
+    def __init__(self, chunks_dir: Path):
+        self.chunks_dir = chunks_dir
+        self.path = chunks_dir / MANIFEST_NAME
+        self.entries: Dict[int, Dict[str, Any]] = {}
+
+    def load(self, stream_id: str) -> bool:
+        """Load entries if the manifest exists and belongs to `stream_id`."""
+        if not self.path.exists():
+            return False
+        lines = self.path.read_text().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, json.JSONDecodeError):
+            return False
+        if header.get("stream") != stream_id:
+            return False
+
+        self.entries = {}
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+                self.entries[int(entry["index"])] = entry
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                continue
+        return True
+
+    def start(self, stream_id: str):
+        """Begin a fresh manifest for `stream_id`."""
+        self.entries = {}
+        self.path.write_text(json.dumps({"stream": stream_id}) + "\n")
+
+    def record(self, index: int, size: int, sha256: str):
+        entry = {"index": index, "size": size, "sha256": sha256}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+        self.entries[index] = entry
+
+    def verified_chunks(self) -> Set[int]:
+        """Indexes whose chunk file is on disk with the recorded size and checksum."""
+        verified = set()
+        for index, entry in self.entries.items():
+            chunk_path = self.chunks_dir / f"{index:06d}.ts"
+            try:
+                if chunk_path.stat().st_size != entry["size"]:
+                    continue
+            except OSError:
+                continue
+            if _file_sha256(chunk_path) == entry["sha256"]:
+                verified.add(index)
+        return verified
+
+
+class StreamingMerger:
+    """
+    Remuxes chunks into full_video.mp4 while the download is still running.
+
+    MPEG-TS segments concatenate byte-wise, so in-order chunks are piped into
+    one long-running ffmpeg process and deleted as soon as they are written.
+    The video is ready moments after the last chunk lands, and at most a
+    window's worth of chunks sits on disk at any time.
+
+    With `media_dir`, the same ffmpeg pass also decodes the stream into the
+    pipeline's inputs (audio.wav and sampled frames/), so processing never
+    has to decode the full video again. They are written under `.part`
+    names and renamed into place only if ffmpeg finishes cleanly.
+    """
+
+    def __init__(self, output_file: Path, media_dir: Optional[Path] = None):
+        self.output_file = output_file
+        self.media_dir = media_dir
+        self.chunks_merged = 0
+        self._process = None
+        self._stderr: List[bytes] = []
+        self._drain: Optional[threading.Thread] = None
+
+    def _media_paths(self) -> Tuple[Path, Path]:
+        return (self.media_dir / f"{AUDIO_NAME}.part", self.media_dir / f"{FRAMES_NAME}.part")
+
+    def start(self):
+        stream = ffmpeg.input('pipe:', format='mpegts')
+        outputs = [stream.output(str(self.output_file), c='copy', format='mp4')]
+        if self.media_dir is not None:
+            audio_part, frames_part = self._media_paths()
+            shutil.rmtree(frames_part, ignore_errors=True)
+            frames_part.mkdir(parents=True)
+            outputs += media_outputs(stream, audio_part, frames_part)
+
+        self._process = (
+            ffmpeg
+            .merge_outputs(*outputs)
+            .global_args('-loglevel', 'error')
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        # Drain stderr on the side: a long run of corrupt packets can fill the
+        # pipe, and a blocked ffmpeg stops reading stdin, hanging append()
+        self._stderr = []
+        self._drain = threading.Thread(target=lambda: self._stderr.append(self._process.stderr.read()),
+                                       daemon=True)
+        self._drain.start()
+
+    def append(self, chunk_path: Path):
+        """Pipe one chunk into ffmpeg, then delete it. Blocking; run in an executor."""
+        with open(chunk_path, 'rb') as f:
+            shutil.copyfileobj(f, self._process.stdin, STREAM_BLOCK_SIZE)
+        chunk_path.unlink()
+        self.chunks_merged += 1
+
+    def finish(self) -> bool:
+        """Close the input and wait for ffmpeg to write the trailer."""
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg already exited; its return code says why
+        self._process.wait()
+        self._drain.join()
+        stderr = b"".join(self._stderr)
+        if self._process.returncode != 0:
+            print(f"FFmpeg error: {stderr.decode(errors='replace') if stderr else self._process.returncode}")
+            return False
+        if not (self.output_file.exists() and self.chunks_merged > 0):
+            return False
+
+        if self.media_dir is not None:
+            audio_part, frames_part = self._media_paths()
+            frames_dir = self.media_dir / FRAMES_NAME
+            shutil.rmtree(frames_dir, ignore_errors=True)
+            os.replace(audio_part, self.media_dir / AUDIO_NAME)
+            os.replace(frames_part, frames_dir)
+        return True
+
+    def abort(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        if self._drain is not None:
+            self._drain.join()
+        self.output_file.unlink(missing_ok=True)
+        if self.media_dir is not None:
+            audio_part, frames_part = self._media_paths()
+            audio_part.unlink(missing_ok=True)
+            shutil.rmtree(frames_part, ignore_errors=True)
 
 
 class VideoDownloader:
-    def __init__(self, output_dir: str, clip_duration: int = 120):
+    def __init__(self, output_dir: str, clip_duration: int = 120, streaming_merge: bool = False,
+                 prepare_media: bool = False):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.chunks_dir = self.output_dir / "chunks"
         self.chunks_dir.mkdir(exist_ok=True)
         self.clip_duration = clip_duration
+        # When set, chunks are remuxed into the output as they arrive instead
+        # of in one pass at the end (see StreamingMerger)
+        # prepare_media also writes audio.wav and frames/ in the same pass,
+        # which needs the streaming merge's ffmpeg process
+        self.prepare_media = prepare_media
+        self.streaming_merge = streaming_merge or prepare_media
+        self._merger: Optional[StreamingMerger] = None
         self.progress_callback: Optional[Callable[[int, int, str], None]] = None
 
     def set_progress_callback(self, callback: Callable[[int, int, str], None]):
@@ -24,48 +219,187 @@ class VideoDownloader:
         if self.progress_callback:
             self.progress_callback(current, total, message)
 
+    async def _stream_to_file(self, client: httpx.AsyncClient, url: str, params: Optional[Dict[str, str]],
+                              file_path: Path) -> Tuple[int, str]:
+        """
+        Stream a response body to disk in STREAM_BLOCK_SIZE blocks.
+
+        The body goes to a `.part` file that is renamed into place only once
+        complete, so an interrupted fetch never leaves a truncated `.ts` behind.
+        Returns (size, sha256) of the written file.
+        """
+        tmp_path = file_path.with_name(file_path.name + ".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with client.stream("GET", url, params=params, timeout=30.0) as resp:
+                resp.raise_for_status()
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    async for block in resp.aiter_bytes(STREAM_BLOCK_SIZE):
+                        await f.write(block)
+                        digest.update(block)
+                        size += len(block)
+            os.replace(tmp_path, file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return size, digest.hexdigest()
+
+    def _prepare_chunks_dir(self, stream_id: str) -> ChunkManifest:
+        """
+        Reuse chunks from a previous run of the same stream, or start clean.
+
+        Anything the manifest does not vouch for (partial files, chunks with a
+        bad size or checksum) is removed so it gets fetched again. The saved
+        request (REQUEST_NAME) is always kept. Hashes every chunk on disk, so
+        call it from an executor.
+        """
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        manifest = ChunkManifest(self.chunks_dir)
+
+        if not manifest.load(stream_id):
+            for path in self.chunks_dir.iterdir():
+                if path.name == REQUEST_NAME:
+                    continue
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+            manifest.start(stream_id)
+            return manifest
+
+        verified = manifest.verified_chunks()
+        for path in self.chunks_dir.iterdir():
+            if path.name in (MANIFEST_NAME, REQUEST_NAME):
+                continue
+            if path.suffix == ".ts" and path.stem.isdigit() and int(path.stem) in verified:
+                continue
+            path.unlink()
+        manifest.entries = {i: e for i, e in manifest.entries.items() if i in verified}
+        print(f"[Downloader] Resuming: {len(verified)} chunks already on disk")
+        return manifest
+
+    async def fetch_playlist(self, playlist_url: str, key_pair_id: str, policy: str,
+                             signature: str) -> List[HLSSegment]:
+        """
+        Fetch an HLS playlist and return its segments in order.
+        A master playlist is followed to its highest-bandwidth variant.
+        """
+        params = self._signed_params(playlist_url, key_pair_id, policy, signature)
+        async with httpx.AsyncClient() as client:
+            resp = await client.get(playlist_url, params=params, timeout=30.0)
+            resp.raise_for_status()
+            text = resp.text
+
+            if is_master_playlist(text):
+                variants = parse_master_playlist(text, playlist_url)
+                if not variants:
+                    raise ValueError("Master playlist lists no variant streams")
+                playlist_url = max(variants, key=lambda v: v.bandwidth).url
+                params = self._signed_params(playlist_url, key_pair_id, policy, signature)
+                resp = await client.get(playlist_url, params=params, timeout=30.0)
+                resp.raise_for_status()
+                text = resp.text
+
+        return parse_media_playlist(text, playlist_url)
+
+    @staticmethod
+    def _signed_params(url: str, key_pair_id: str, policy: str, signature: str) -> Optional[Dict[str, str]]:
+        # URLs that already carry a query (pre-signed) must be requested as-is;
+        # httpx would replace their query with ours.
+        if urlsplit(url).query:
+            return None
+        return {
+            "Key-Pair-Id": key_pair_id,
+            "Policy": policy,
+            "Signature": signature
+        }
+
     async def download_chunks(self, base_url: str, start_chunk: int, end_chunk: int,
-                            key_pair_id: str, policy: str, signature: str):
+                            key_pair_id: str, policy: str, signature: str,
+                            concurrency: int = DEFAULT_CONCURRENCY):
         """
         Download .ts chunks concurrently using httpx and asyncio.
         Chunk format: data000037.ts (6-digit zero-padded with 'data' prefix)
+
+        Used when no playlist is available: the chunk range is a guess, and the
+        end of the stream is found by probing until requests start failing.
         """
-        total_chunks = end_chunk - start_chunk + 1
-        downloaded = 0
-        consecutive_failures = 0
+        # Scaler uses data000037.ts format (6-digit zero-padded)
+        jobs = [(i, f"{base_url}data{i:06d}.ts") for i in range(start_chunk, end_chunk + 1)]
+        return await self._download(jobs, base_url, key_pair_id, policy, signature, concurrency,
+                                    probe_end=True)
+
+    async def download_segments(self, segments: List[HLSSegment], stream_id: str,
+                                key_pair_id: str, policy: str, signature: str,
+                                concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        Download an exact segment list taken from the HLS playlist. Every
+        listed segment must arrive; anything missing (including a 403 from an
+        expired signature) raises DownloadIncomplete.
+        """
+        jobs = [(seg.index, seg.url) for seg in segments]
+        return await self._download(jobs, stream_id, key_pair_id, policy, signature, concurrency)
+
+    async def _download(self, jobs: List[Tuple[int, str]], stream_id: str,
+                        key_pair_id: str, policy: str, signature: str,
+                        concurrency: int = DEFAULT_CONCURRENCY, probe_end: bool = False):
+        """
+        Fetch (chunk_id, url) jobs, keeping up to `concurrency` in flight.
+
+        Results are accounted for in job order, so the consecutive-failure
+        stop condition (and the 403 end-of-stream heuristic) behave the same
+        as a sequential download even when later chunks finish first.
+
+        Chunks recorded in the manifest from an earlier run of the same stream
+        are verified and skipped, so a restarted download only fetches what is
+        missing. audio.wav and frames/ left by an earlier download into the
+        folder are removed up front.
+
+        With streaming_merge, each chunk is handed to the merger as soon as
+        every chunk before it has been accounted for, then deleted. Consumed
+        chunks are gone from disk, so a restart re-fetches them.
+
+        With `probe_end` (the job list is a guess that runs past the end),
+        a run of failures starting at a chunk that keeps returning 403 marks
+        the end of the stream. Otherwise every job must succeed.
+
+        Returns whether anything was downloaded. Raises DownloadIncomplete,
+        leaving chunks/ in place for resume, if the download stopped or
+        missed chunks short of the end of the stream.
+        """
+        total_chunks = len(jobs)
+        concurrency = max(1, concurrency)
+        # Lowest chunk that returned 403 on every attempt. Chunks after it are
+        # almost certainly past the end too, so they fail fast on the first 403.
+        end_of_stream: Optional[int] = None
+
+        loop = asyncio.get_running_loop()
+        # The video is about to be replaced; media decoded from the old one must not outlive it
+        await loop.run_in_executor(None, discard_prepared_media, self.output_dir)
+        manifest = await loop.run_in_executor(None, self._prepare_chunks_dir, stream_id)
+        completed = set(manifest.entries)
+        downloaded = sum(1 for chunk_id, _ in jobs if chunk_id in completed)
+
+        async def fetch_chunk(client, chunk_id, url) -> bool:
+            nonlocal downloaded, end_of_stream
 
-        # Clean up existing chunks
-        if self.chunks_dir.exists():
-            shutil.rmtree(self.chunks_dir)
-        self.chunks_dir.mkdir()
-
-        async def fetch_chunk(client, chunk_id) -> bool:
-            nonlocal downloaded, consecutive_failures
-            
-            # Scaler uses data000037.ts format (6-digit zero-padded)
-            filename = f"data{chunk_id:06d}.ts"
-            url = f"{base_url}{filename}"
-            params = {
-                "Key-Pair-Id": key_pair_id,
-                "Policy": policy,
-                "Signature": signature
-            }
+            params = self._signed_params(url, key_pair_id, policy, signature)
             file_path = self.chunks_dir / f"{chunk_id:06d}.ts"
 
             try:
                 for attempt in range(3):
                     try:
-                        resp = await client.get(url, params=params, timeout=30.0)
-                        resp.raise_for_status()
-                        async with aiofiles.open(file_path, 'wb') as f:
-                            await f.write(resp.content)
-                        consecutive_failures = 0
+                        size, sha256 = await self._stream_to_file(client, url, params, file_path)
+                        manifest.record(chunk_id, size, sha256)
                         break
                     except httpx.HTTPStatusError as e:
-                        if e.response.status_code == 403:
-                            consecutive_failures += 1
-                            if consecutive_failures >= 3:
+                        if probe_end and e.response.status_code == 403:
+                            if end_of_stream is not None and chunk_id > end_of_stream:
+                                return False
+                            if attempt == 2:
                                 print(f"[Downloader] Chunk {chunk_id} returned 403 - likely end of stream")
+                                if end_of_stream is None or chunk_id < end_of_stream:
+                                    end_of_stream = chunk_id
                                 return False
                         if attempt == 2:
                             print(f"Failed chunk {chunk_id}: {e}")
@@ -85,31 +419,121 @@ class VideoDownloader:
                 print(f"Error downloading chunk {chunk_id}: {e}")
                 return False
 
-        limits = httpx.Limits(max_keepalive_connections=10, max_connections=10)
-        async with httpx.AsyncClient(limits=limits) as client:
-            for i in range(start_chunk, end_chunk + 1):
-                success = await fetch_chunk(client, i)
-                if not success:
-                    consecutive_failures += 1
-                    if consecutive_failures >= 10:
-                        print(f"[Downloader] Stopping - 10 consecutive failures")
+        in_flight: Dict[asyncio.Task, int] = {}
+        results: Dict[int, bool] = {}  # keyed by position in jobs
+        next_job = 0
+        frontier = 0  # lowest job whose result has not been accounted for
+        consecutive_failures = 0
+        failure_run_start = 0  # chunk_id where the current run of failures began
+        stopped = False
+        reached_end = True
+
+        merger = None
+        if self.streaming_merge:
+            merger = self._merger = StreamingMerger(
+                self.output_dir / "full_video.mp4",
+                media_dir=self.output_dir if self.prepare_media else None,
+            )
+            merger.start()
+
+        try:
+            limits = httpx.Limits(max_keepalive_connections=concurrency, max_connections=concurrency)
+            async with httpx.AsyncClient(limits=limits) as client:
+                while True:
+                    # Bound how far ahead of the accounted-for frontier we run, so a
+                    # single slow chunk can't let the scheduler probe far past the end.
+                    while (not stopped and len(in_flight) < concurrency and next_job < total_chunks
+                           and next_job < frontier + concurrency * LOOKAHEAD_FACTOR):
+                        chunk_id, url = jobs[next_job]
+                        if chunk_id in completed:
+                            results[next_job] = True
+                        else:
+                            task = asyncio.create_task(fetch_chunk(client, chunk_id, url))
+                            in_flight[task] = next_job
+                        next_job += 1
+
+                    # Walk completed chunks in order so failures are counted the
+                    # same way a sequential download would count them.
+                    while not stopped and frontier in results:
+                        if results.pop(frontier):
+                            consecutive_failures = 0
+                            if merger is not None:
+                                chunk_path = self.chunks_dir / f"{jobs[frontier][0]:06d}.ts"
+                                await loop.run_in_executor(None, merger.append, chunk_path)
+                        else:
+                            consecutive_failures += 1
+                            if consecutive_failures == 1:
+                                failure_run_start = jobs[frontier][0]
+                            if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                                print(f"[Downloader] Stopping - {MAX_CONSECUTIVE_FAILURES} consecutive failures")
+                                stopped = True
+                        frontier += 1
+
+                    if stopped:
+                        for task in in_flight:
+                            task.cancel()
+                        outcomes = await asyncio.gather(*in_flight, return_exceptions=True)
+                        results.update(zip(in_flight.values(), outcomes))
+                        # Only a run that starts at a 403 is the end of the stream;
+                        # anything else (network down) is an interruption to resume
+                        reached_end = probe_end and end_of_stream is not None and end_of_stream <= failure_run_start
+                        if not reached_end:
+                            break
+                        # Everything past the failure run is beyond the end of the
+                        # stream; drop it so the merge only sees contiguous chunks.
+                        for position, ok in results.items():
+                            if ok is True:
+                                downloaded -= 1
+                            chunk_id = jobs[position][0]
+                            (self.chunks_dir / f"{chunk_id:06d}.ts").unlink(missing_ok=True)
                         break
-                else:
-                    consecutive_failures = 0
-            
-            self._update_progress(downloaded, downloaded, f"Downloaded {downloaded} chunks")
 
+                    if not in_flight:
+                        if next_job >= total_chunks:
+                            break
+                        continue
+
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        results[in_flight.pop(task)] = task.result()
+
+                self._update_progress(downloaded, downloaded, f"Downloaded {downloaded} chunks")
+
+        except BaseException:
+            if merger is not None:
+                merger.abort()
+                self._merger = None
+            raise
+
+        if not probe_end and downloaded < total_chunks:
+            # The playlist listed these segments, so a missing one is a failure, not the end
+            reached_end = False
+
+        if merger is not None and (downloaded == 0 or not reached_end):
+            merger.abort()
+            self._merger = None
+
+        if not reached_end:
+            print(f"[Downloader] Interrupted after {downloaded}/{total_chunks} chunks; keeping them for resume")
+            raise DownloadIncomplete(downloaded, total_chunks)
         return downloaded > 0
 
     async def merge_chunks_to_video(self, start_chunk: int, end_chunk: int) -> Optional[str]:
-        """Merge downloaded .ts chunks into a single .mp4 file using FFmpeg."""
+        """
+        Merge the downloaded .ts chunks from start_chunk to end_chunk
+        (inclusive) into a single .mp4 file using FFmpeg. Chunks kept from an
+        earlier run over a different range are left out.
+        """
+        if self._merger is not None:
+            return await self._finish_streaming_merge()
 
         def _run_ffmpeg():
             try:
                 list_file_path = self.chunks_dir / "file_list.txt"
                 
                 chunk_files = sorted(
-                    [f for f in self.chunks_dir.glob("*.ts")],
+                    [f for f in self.chunks_dir.glob("*.ts")
+                     if f.stem.isdigit() and start_chunk <= int(f.stem) <= end_chunk],
                     key=lambda x: int(x.stem)
                 )
                 
@@ -147,3 +571,19 @@ class VideoDownloader:
 
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, _run_ffmpeg)
+
+    async def _finish_streaming_merge(self) -> Optional[str]:
+        merger, self._merger = self._merger, None
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(None, merger.finish)
+        except Exception as e:
+            print(f"Merge error: {e}")
+            ok = False
+
+        if not ok:
+            merger.abort()
+            return None
+        shutil.rmtree(self.chunks_dir, ignore_errors=True)
+        print(f"[Downloader] Merged {merger.chunks_merged} chunks while downloading: {merger.output_file}")
+        return str(merger.output_file)
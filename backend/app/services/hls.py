@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urljoin
+
+
+@dataclass
+class HLSSegment:
+    index: int       # Media sequence number (matches Scaler's dataNNNNNN.ts numbering)
+    url: str
+    duration: float  # Seconds
+    start: float     # Offset from the start of the playlist, in seconds
+
+
+@dataclass
+class HLSVariant:
+    bandwidth: int
+    url: str
+
+
+def is_master_playlist(text: str) -> bool:
+    return "#EXT-X-STREAM-INF" in text
+
+
+def parse_master_playlist(text: str, playlist_url: str) -> List[HLSVariant]:
+    """Return the variant streams listed in a master playlist."""
+    variants = []
+    pending_bandwidth: Optional[int] = None
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            pending_bandwidth = 0
+            for attr in line.split(":", 1)[1].split(","):
+                key, _, value = attr.partition("=")
+                if key.strip() == "BANDWIDTH" and value.strip().isdigit():
+                    pending_bandwidth = int(value)
+        elif not line.startswith("#") and pending_bandwidth is not None:
+            variants.append(HLSVariant(bandwidth=pending_bandwidth, url=urljoin(playlist_url, line)))
+            pending_bandwidth = None
+
+    return variants
+
+
+def parse_media_playlist(text: str, playlist_url: str) -> List[HLSSegment]:
+    """
+    Return the segments of a media playlist in order, with their durations
+    and start offsets. Segment URIs are resolved against the playlist URL.
+    """
+    if not text.lstrip().startswith("#EXTM3U"):
+        raise ValueError("Not an HLS playlist (missing #EXTM3U header)")
+
+    segments = []
+    sequence = 0
+    offset = 0.0
+    pending_duration: Optional[float] = None
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            pending_duration = float(line.split(":", 1)[1].split(",", 1)[0])
+        elif not line.startswith("#") and pending_duration is not None:
+            segments.append(HLSSegment(
+                index=sequence + len(segments),
+                url=urljoin(playlist_url, line),
+                duration=pending_duration,
+                start=offset,
+            ))
+            offset += pending_duration
+            pending_duration = None
+
+    return segments
+
+
+def select_segments(segments: List[HLSSegment], start_time: Optional[float] = None,
+                    end_time: Optional[float] = None) -> List[HLSSegment]:
+    """Return the segments that overlap [start_time, end_time)."""
+    selected = []
+    for seg in segments:
+        if start_time is not None and seg.start + seg.duration <= start_time:
+            continue
+        if end_time is not None and seg.start >= end_time:
+            continue
+        selected.append(seg)
+    return selected
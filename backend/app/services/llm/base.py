@@ -10,12 +10,22 @@ class LLMProvider(ABC):
     """
 
     provider_name: str = ""
+    max_concurrency: int = 1  # Requests the backend serves in parallel; callers cap their fan-out to it
+    default_context_length: int = 8192
 
     @abstractmethod
-    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
-        """Generate text from a prompt. Returns the response string."""
+    def generate_text(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None) -> str:
+        """Generate text from a prompt, after an optional system message. Returns the response string.
+
+        Callers keep `system` identical across related requests and put what
+        varies in `prompt`, so providers with prompt caching reuse its prefill.
+        """
         ...
 
+    def context_length(self, model: Optional[str] = None) -> int:
+        """Tokens the model accepts per request, prompt and response together."""
+        return self.default_context_length
+
     @abstractmethod
     def list_models(self) -> List[str]:
         """Return a list of available model names."""
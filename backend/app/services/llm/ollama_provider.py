@@ -1,5 +1,6 @@
 import ollama
 from typing import List, Optional
+from app.core.config import settings
 from app.services.llm.base import LLMProvider
 from app.services.llm.registry import register_provider
 
@@ -12,12 +13,20 @@ class OllamaProvider(LLMProvider):
     def __init__(self, base_url: str = "http://localhost:11434", default_model: str = "gpt-oss:20b"):
         self.base_url = base_url
         self.default_model = default_model
+        self.max_concurrency = max(1, settings.OLLAMA_NUM_PARALLEL)
 
-    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
+    def generate_text(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None) -> str:
         model = model or self.default_model
-        resp = ollama.generate(model=model, prompt=prompt)
+        kwargs = {"system": system} if system else {}
+        # keep_alive holds the model, and with it the prompt cache, between requests
+        resp = ollama.generate(model=model, prompt=prompt, keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                               options={"num_ctx": settings.OLLAMA_NUM_CTX}, **kwargs)
         return resp["response"]
 
+    def context_length(self, model: Optional[str] = None) -> int:
+        # Ollama truncates prompts to num_ctx (not the model's trained maximum), and we set it
+        return settings.OLLAMA_NUM_CTX
+
     def list_models(self) -> List[str]:
         try:
             resp = ollama.list()
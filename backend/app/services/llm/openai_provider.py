@@ -1,32 +1,51 @@
 import time
 from openai import OpenAI, RateLimitError
 from typing import List, Optional
+from app.core.config import settings
 from app.services.llm.base import LLMProvider
 from app.services.llm.registry import register_provider
 
 MAX_RETRIES = 3
 RETRY_BASE_DELAY = 2
 
+# Context window by model name prefix; the longest matching prefix wins
+CONTEXT_LENGTHS = {
+    "gpt-5": 400_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4": 200_000,
+}
+
 
 class OpenAIProvider(LLMProvider):
     """LLM provider backed by the OpenAI API."""
 
     provider_name = "openai"
+    default_context_length = 128_000
 
     def __init__(self, api_key: str = "", default_model: str = "gpt-4o"):
         if not api_key:
             raise ValueError("API key is required for OpenAI provider")
         self.default_model = default_model
+        self.max_concurrency = max(1, settings.OPENAI_MAX_CONCURRENCY)
         self._client = OpenAI(api_key=api_key)
 
-    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
+    def generate_text(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None) -> str:
         """Generate text with exponential backoff retry on rate limits."""
         model = model or self.default_model
+        # OpenAI caches long prompt prefixes automatically; a shared system message is one
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
         for attempt in range(MAX_RETRIES):
             try:
                 response = self._client.chat.completions.create(
                     model=model,
-                    messages=[{"role": "user", "content": prompt}],
+                    messages=messages,
                     temperature=0.3,
                 )
                 return response.choices[0].message.content
@@ -37,6 +56,11 @@ class OpenAIProvider(LLMProvider):
                 print(f"[OpenAIProvider] Rate limited, retrying in {delay}s (attempt {attempt + 1}/{MAX_RETRIES})")
                 time.sleep(delay)
 
+    def context_length(self, model: Optional[str] = None) -> int:
+        model = model or self.default_model
+        prefixes = [p for p in CONTEXT_LENGTHS if model.startswith(p)]
+        return CONTEXT_LENGTHS[max(prefixes, key=len)] if prefixes else self.default_context_length
+
     def list_models(self) -> List[str]:
         try:
             response = self._client.models.list()
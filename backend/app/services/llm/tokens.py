@@ -0,0 +1,37 @@
+import math
+
+try:
+    import tiktoken
+except ImportError:  # Installed with openai-whisper; fall back to an estimate without it
+    tiktoken = None
+
+ENCODING = "o200k_base"  # GPT-4o / gpt-oss vocabulary; close to other current BPE tokenizers
+CHARS_PER_TOKEN = 3.6    # English transcripts average ~4.2 chars per o200k token; rounded down to stay safe
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(ENCODING)
+        except Exception as e:
+            # The BPE file is downloaded on first use; offline, estimate instead
+            print(f"[tokens] tiktoken unavailable ({e}), estimating token counts")
+            _encoding_failed = True
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count from text length alone."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text`, using tiktoken when available, otherwise estimate_tokens."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
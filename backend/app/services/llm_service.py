@@ -1,59 +1,40 @@
-from typing import Dict, List, Optional
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 from app.services.llm import get_provider, LLMProvider
+from app.services.llm.tokens import count_tokens
+from app.core.config import settings
 from app.core.config_store import config_store
 
+RETRY_BASE_DELAY = 2  # Seconds before the first retry of a failed generation; doubles each attempt
+NOTES_ARTIFACTS = ("notes", "summary", "qa", "announcements")
+MIN_CHUNK_TOKENS = 512  # Floor for tiny context windows
+MIN_MERGE_WORDS = 200   # Shortest length a merge is asked to keep
+WORDS_PER_TOKEN = 0.75
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
 
-class LLMService:
-    """Orchestration layer for LLM operations.
+# (first section, last section, text) of the knowledge base being built
+Section = Tuple[int, int, str]
 
-    Handles chunking, prompt templates, and knowledge base building.
-    Delegates raw text generation to the active LLMProvider.
-    """
-
-    def __init__(self, provider_name: Optional[str] = None, model: Optional[str] = None):
-        name = provider_name or config_store.get("LLM_PROVIDER")
-
-        if name == "openai":
-            from app.services.llm.openai_provider import OpenAIProvider
-            api_key = config_store.get("OPENAI_API_KEY")
-            default_model = model or config_store.get("LLM_MODEL") or "gpt-4o"
-            self.provider = OpenAIProvider(api_key=api_key, default_model=default_model)
-        elif name == "ollama":
-            from app.services.llm.ollama_provider import OllamaProvider
-            base_url = config_store.get("OLLAMA_BASE_URL")
-            default_model = model or config_store.get("LLM_MODEL") or "gpt-oss:20b"
-            self.provider = OllamaProvider(base_url=base_url, default_model=default_model)
-        else:
-            self.provider = get_provider(name)
-
-        self._model_override = model
-        self.chunk_size = 8000
-        self.chunk_overlap = 500
-
-    def _chunk_text(self, text: str) -> List[str]:
-        if len(text) <= self.chunk_size:
-            return [text]
 
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + self.chunk_size
-
-            if end < len(text):
-                search_zone = text[end - 500:end]
-                for sep in ['. ', '.\n', '? ', '!\n', '! ']:
-                    last_sep = search_zone.rfind(sep)
-                    if last_sep != -1:
-                        end = end - 500 + last_sep + len(sep)
-                        break
+class NotesGenerationError(Exception):
+    """
+    Some notes artifacts failed. `results` holds the ones that were
+    generated and `knowledge_base` the input they share, so a retry can
+    skip rebuilding it.
+    """
 
-            chunks.append(text[start:end])
-            start = end - self.chunk_overlap
+    def __init__(self, results: Dict[str, str], errors: Dict[str, Exception], knowledge_base: Optional[str] = None):
+        super().__init__("Failed to generate " + ", ".join(f"{name} ({e})" for name, e in errors.items()))
+        self.results = results
+        self.errors = errors
+        self.knowledge_base = knowledge_base
 
-        return chunks
 
-    def _extract_knowledge_from_chunk(self, chunk: str, chunk_num: int, total_chunks: int) -> str:
-        prompt = f"""You are extracting key knowledge from part {chunk_num} of {total_chunks} of a lecture transcript.
+# Prompts put everything requests have in common first and the part that
+# varies last, so providers' prompt caches can reuse the shared prefix.
+EXTRACTION_SYSTEM_PROMPT = """You are extracting key knowledge from one part of a lecture transcript.
 
 ## Instructions:
 Extract and summarize the KEY INFORMATION from this section:
@@ -65,48 +46,38 @@ Extract and summarize the KEY INFORMATION from this section:
 6. **Announcements** (deadlines, assignments, dates) if any
 
 Be thorough but concise. This will be combined with other sections.
-Do NOT add filler text - only extract actual content.
+Do NOT add filler text - only extract actual content."""
 
-## Transcript Section ({chunk_num}/{total_chunks}):
+CHUNK_PROMPT = """## Transcript Section ({chunk_num}/{total_chunks}):
 {chunk}
 
 ---
-Extract the key knowledge now:"""
-
-        try:
-            return self.provider.generate_text(prompt, model=self._model_override)
-        except Exception as e:
-            print(f"Error extracting from chunk {chunk_num}: {e}")
-            return f"[Error processing chunk {chunk_num}]"
-
-    def _build_knowledge_base(self, transcript: str, slides_context: str = "") -> str:
-        chunks = self._chunk_text(transcript)
+Extract the key knowledge from part {chunk_num} of {total_chunks} now:"""
 
-        if len(chunks) == 1:
-            print(f"[LLMService] Short transcript ({len(transcript)} chars), using directly")
-            return transcript + ("\n\n## Slide Context:\n" + slides_context if slides_context else "")
+MERGE_SYSTEM_PROMPT = """You are condensing knowledge extracted from consecutive parts of a lecture transcript.
 
-        print(f"[LLMService] Long transcript ({len(transcript)} chars), splitting into {len(chunks)} chunks...")
+## Instructions:
+Merge the sections into one, in lecture order:
+1. Keep every **concept, definition, example and code/technical detail**
+2. Keep every **announcement** (deadlines, assignments, dates) verbatim
+3. Remove repetition between sections
+4. Shorten explanations before dropping facts
 
-        knowledge_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            print(f"[LLMService] Processing chunk {i}/{len(chunks)}...")
-            knowledge = self._extract_knowledge_from_chunk(chunk, i, len(chunks))
-            knowledge_parts.append(f"## Section {i}\n{knowledge}")
+Do NOT add filler text - only merge actual content."""
 
-        combined_knowledge = "\n\n".join(knowledge_parts)
+MERGE_PROMPT = """{sections}
 
-        if slides_context:
-            combined_knowledge += f"\n\n## Slide Text (OCR):\n{slides_context}"
+---
+Merge these sections in under {words} words:"""
 
-        print(f"[LLMService] Built knowledge base: {len(combined_knowledge)} chars from {len(transcript)} chars transcript")
-        return combined_knowledge
+NOTES_SYSTEM_PROMPT = """You are an expert academic assistant. You will be asked to turn the lecture below into study material: notes, a summary, flashcards, or a list of announcements.
+Work only from the knowledge base, and follow the task's instructions and format exactly.
 
-    def generate_notes(self, transcript_text: str, slides_context: str = "", model: Optional[str] = None) -> Dict[str, str]:
-        effective_model = model or self._model_override
-        knowledge_base = self._build_knowledge_base(transcript_text, slides_context)
+## Knowledge Base (extracted from lecture):
+{knowledge_base}"""
 
-        notes_prompt = f"""You are an expert academic note-taker. Create comprehensive, well-structured lecture notes.
+NOTES_PROMPTS = {
+    "notes": """Create comprehensive, well-structured lecture notes, as an expert academic note-taker.
 
 ## Instructions:
 1. **Clear title** derived from the main topic
@@ -124,13 +95,10 @@ Extract the key knowledge now:"""
 - **Key Takeaways** (bullet list of most important points)
 - **Terms & Definitions** (glossary)
 
-## Knowledge Base (extracted from lecture):
-{knowledge_base}
-
 ---
-Generate comprehensive lecture notes:"""
+Generate comprehensive lecture notes:""",
 
-        summary_prompt = f"""You are an expert summarizer. Create a comprehensive executive summary.
+    "summary": """Create a comprehensive executive summary, as an expert summarizer.
 
 ## Instructions:
 1. **Opening**: Main topic and its importance
@@ -140,13 +108,10 @@ Generate comprehensive lecture notes:"""
 
 Write 400-600 words in prose form (no bullet points).
 
-## Knowledge Base:
-{knowledge_base}
-
 ---
-Generate executive summary:"""
+Generate executive summary:""",
 
-        qa_prompt = f"""You are creating study flashcards. Generate 15-20 Q&A pairs.
+    "qa": """You are creating study flashcards. Generate 15-20 Q&A pairs.
 
 ## Instructions:
 - Mix of: Conceptual, Application, Comparison, Definition questions
@@ -156,13 +121,10 @@ Generate executive summary:"""
 - Questions should test understanding, not just recall
 - Include specific terminology from the lecture
 
-## Knowledge Base:
-{knowledge_base}
-
 ---
-Generate Q&A flashcards:"""
+Generate Q&A flashcards:""",
 
-        announcements_prompt = f"""Extract announcements and action items from this lecture.
+    "announcements": """Extract announcements and action items from this lecture.
 
 ## Look for:
 1. **Deadlines** - assignments, projects
@@ -184,35 +146,256 @@ Generate Q&A flashcards:"""
 
 If no announcements found, state "No specific announcements in this lecture."
 
-## Knowledge Base:
-{knowledge_base}
-
 ---
-Extract announcements:"""
+Extract announcements:""",
+}
+
+
+def _split_oversized(piece: str, budget: int) -> List[str]:
+    """Break a segment or sentence longer than `budget` tokens into word runs that fit."""
+    tokens = count_tokens(piece)
+    if tokens <= budget:
+        return [piece]
+    words = piece.split()
+    per_part = max(1, len(words) * budget // (tokens + 1))
+    return [" ".join(words[i:i + per_part]) for i in range(0, len(words), per_part)]
+
+
+def _format_section(section: Section) -> str:
+    first, last, text = section
+    title = f"Section {first}" if first == last else f"Sections {first}-{last}"
+    return f"## {title}\n{text}"
+
+
+def _group_sections(sections: List[Section], budget: int) -> List[List[Section]]:
+    """Consecutive sections packed into groups of at most `budget` tokens (an oversized one goes alone)."""
+    groups: List[List[Section]] = []
+    used = 0
+    for section in sections:
+        size = count_tokens(_format_section(section)) + 1
+        if groups and used + size <= budget:
+            groups[-1].append(section)
+            used += size
+        else:
+            groups.append([section])
+            used = size
+    return groups
+
+
+class LLMService:
+    """Orchestration layer for LLM operations.
+
+    Handles chunking, prompt templates, and knowledge base building.
+    Delegates raw text generation to the active LLMProvider.
+    """
+
+    def __init__(self, provider_name: Optional[str] = None, model: Optional[str] = None):
+        name = provider_name or config_store.get("LLM_PROVIDER")
+
+        if name == "openai":
+            from app.services.llm.openai_provider import OpenAIProvider
+            api_key = config_store.get("OPENAI_API_KEY")
+            default_model = model or config_store.get("LLM_MODEL") or "gpt-4o"
+            self.provider = OpenAIProvider(api_key=api_key, default_model=default_model)
+        elif name == "ollama":
+            from app.services.llm.ollama_provider import OllamaProvider
+            base_url = config_store.get("OLLAMA_BASE_URL")
+            default_model = model or config_store.get("LLM_MODEL") or "gpt-oss:20b"
+            self.provider = OllamaProvider(base_url=base_url, default_model=default_model)
+        else:
+            self.provider = get_provider(name)
+
+        self._model_override = model
+
+    def _chunk_tokens(self, model: Optional[str] = None) -> int:
+        """
+        Transcript tokens one request can carry: the model's context minus
+        the response reserve (LLM_OUTPUT_TOKENS) and the largest fixed prompt
+        that goes with it (chunk extraction, merging, or notes around the
+        knowledge base).
+        """
+        overhead = max(
+            count_tokens(EXTRACTION_SYSTEM_PROMPT) + count_tokens(CHUNK_PROMPT),
+            count_tokens(MERGE_SYSTEM_PROMPT) + count_tokens(MERGE_PROMPT),
+            count_tokens(NOTES_SYSTEM_PROMPT) + max(count_tokens(p) for p in NOTES_PROMPTS.values()),
+        )
+        context = self.provider.context_length(model or self._model_override)
+        return max(MIN_CHUNK_TOKENS, context - settings.LLM_OUTPUT_TOKENS - overhead)
+
+    def _chunk_text(self, text: str, segments: Optional[Sequence[str]] = None,
+                    max_tokens: Optional[int] = None) -> List[str]:
+        """
+        Split a transcript into chunks of at most `max_tokens` (default:
+        _chunk_tokens), breaking between Whisper segments when given (their
+        texts, which join to `text`), otherwise between sentences. Each chunk
+        starts with about LLM_CHUNK_OVERLAP_TOKENS of the previous one.
+        """
+        budget = max_tokens or self._chunk_tokens()
+        if count_tokens(text) <= budget:
+            return [text]
+
+        pieces = [
+            part
+            for piece in (segments if segments else SENTENCE_END.split(text))
+            for part in _split_oversized(piece.strip(), budget)
+            if part
+        ]
+        sizes = [count_tokens(p) + 1 for p in pieces]  # +1 for the joining space
+
+        chunks = []
+        start = 0
+        while start < len(pieces):
+            end, used = start, 0
+            while end < len(pieces) and (end == start or used + sizes[end] <= budget):
+                used += sizes[end]
+                end += 1
+            chunks.append(" ".join(pieces[start:end]))
+            if end == len(pieces):
+                break
+            # Repeat the previous chunk's last pieces, within the overlap, but always move forward
+            back, overlap = end, 0
+            while back - 1 > start and overlap + sizes[back - 1] <= settings.LLM_CHUNK_OVERLAP_TOKENS:
+                back -= 1
+                overlap += sizes[back]
+            start = back
+
+        return chunks
+
+    def _extract_knowledge_from_chunk(self, chunk: str, chunk_num: int, total_chunks: int) -> str:
+        prompt = CHUNK_PROMPT.format(chunk=chunk, chunk_num=chunk_num, total_chunks=total_chunks)
 
         try:
-            print("[LLMService] Generating Lecture Notes...")
-            notes = self.provider.generate_text(notes_prompt, model=effective_model)
+            return self._generate_with_retry(prompt, self._model_override, f"chunk {chunk_num}",
+                                             system=EXTRACTION_SYSTEM_PROMPT)
+        except Exception:
+            return f"[Error processing chunk {chunk_num}]"
 
-            print("[LLMService] Generating Summary...")
-            summary = self.provider.generate_text(summary_prompt, model=effective_model)
+    def _generate_with_retry(self, prompt: str, model: Optional[str], label: str,
+                             system: Optional[str] = None) -> str:
+        """generate_text, retried LLM_RETRIES times with exponential backoff. Raises the last error."""
+        attempts = 1 + settings.LLM_RETRIES
+        for attempt in range(attempts):
+            try:
+                return self.provider.generate_text(prompt, model=model, system=system)
+            except Exception as e:
+                print(f"Error generating {label} (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(RETRY_BASE_DELAY * (2 ** attempt))
+
+    def _build_knowledge_base(self, transcript: str, slides_context: str = "",
+                              segments: Optional[Sequence[str]] = None, model: Optional[str] = None) -> str:
+        budget = self._chunk_tokens(model)
+        direct = transcript + ("\n\n## Slide Context:\n" + slides_context if slides_context else "")
+        if count_tokens(direct) <= budget:
+            print(f"[LLMService] Short transcript ({len(transcript)} chars), using directly")
+            return direct
 
-            print("[LLMService] Generating Q&A Cards...")
-            qa = self.provider.generate_text(qa_prompt, model=effective_model)
+        chunks = self._chunk_text(transcript, segments, max_tokens=budget)
 
-            print("[LLMService] Generating Announcements...")
-            announcements = self.provider.generate_text(announcements_prompt, model=effective_model)
+        workers = min(len(chunks), self.provider.max_concurrency)
+        print(f"[LLMService] Long transcript ({len(transcript)} chars), splitting into {len(chunks)} chunks "
+              f"({workers} at a time)...")
 
-            return {
-                "notes": notes,
-                "summary": summary,
-                "qa": qa,
-                "announcements": announcements,
-            }
+        # Chunks are independent: extract them concurrently, up to what the provider serves
+        # in parallel. map() keeps the results in chunk order.
+        def extract(numbered):
+            i, chunk = numbered
+            print(f"[LLMService] Processing chunk {i}/{len(chunks)}...")
+            return self._extract_knowledge_from_chunk(chunk, i, len(chunks))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            extractions = list(pool.map(extract, enumerate(chunks, 1)))
+        sections: List[Section] = [(i, i, knowledge) for i, knowledge in enumerate(extractions, 1)]
+
+        slides_part = f"\n\n## Slide Text (OCR):\n{slides_context}" if slides_context else ""
+        target = min(budget, settings.LLM_KNOWLEDGE_TOKENS or budget)
+        sections = self._reduce_sections(sections, max(MIN_CHUNK_TOKENS, target - count_tokens(slides_part)),
+                                         budget)
+        combined_knowledge = "\n\n".join(_format_section(section) for section in sections) + slides_part
 
-        except Exception as e:
-            print(f"LLM generation error: {e}")
-            raise
+        print(f"[LLMService] Built knowledge base: {len(combined_knowledge)} chars from {len(transcript)} chars transcript")
+        return combined_knowledge
+
+    def _reduce_sections(self, sections: List[Section], target: int, budget: int) -> List[Section]:
+        """
+        Tree-reduce: merge neighbouring sections in groups that fit one
+        request (`budget` tokens), level by level, until together they fit
+        `target` tokens. The groups of a level are merged concurrently.
+        """
+        level = 0
+        while count_tokens("\n\n".join(map(_format_section, sections))) > target:
+            groups = _group_sections(sections, budget)
+            if len(groups) == len(sections):
+                print(f"[LLMService] Can't merge sections further ({len(sections)} left), using them as they are")
+                break
+            level += 1
+            words = max(MIN_MERGE_WORDS, int(target / len(groups) * WORDS_PER_TOKEN))
+            workers = min(len(groups), self.provider.max_concurrency)
+            print(f"[LLMService] Reduce level {level}: merging {len(sections)} sections into {len(groups)} "
+                  f"({workers} at a time)...")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                sections = list(pool.map(lambda group: self._merge_sections(group, words), groups))
+        return sections
+
+    def _merge_sections(self, group: List[Section], words: int) -> Section:
+        first, last = group[0][0], group[-1][1]
+        if len(group) == 1:
+            return group[0]
+        prompt = MERGE_PROMPT.format(sections="\n\n".join(map(_format_section, group)), words=words)
+        try:
+            text = self._generate_with_retry(prompt, self._model_override, f"sections {first}-{last}",
+                                             system=MERGE_SYSTEM_PROMPT)
+        except Exception:
+            # Keep the content unmerged rather than lose it
+            text = "\n\n".join(section[2] for section in group)
+        return first, last, text
+
+    def generate_notes(self, transcript_text: str, slides_context: str = "", model: Optional[str] = None,
+                       artifacts: Optional[Sequence[str]] = None,
+                       segments: Optional[Sequence[str]] = None,
+                       knowledge_base: Optional[str] = None) -> Dict[str, str]:
+        """
+        Generate the notes artifacts (NOTES_ARTIFACTS, or just `artifacts`)
+        from one knowledge base. Pass the Whisper `segments` texts to chunk
+        long transcripts between segments. The prompts are independent, so they run
+        concurrently, up to LLM_NOTES_CONCURRENCY and the provider's limit.
+        If any fail, the rest still complete and NotesGenerationError
+        carries them and the knowledge base. A retry passes that back as
+        `knowledge_base`, skipping the map and reduce phases, and only asks
+        for the failed artifacts.
+        """
+        effective_model = model or self._model_override
+        names = [name for name in NOTES_ARTIFACTS if artifacts is None or name in artifacts]
+        if not names:
+            return {}
+        if knowledge_base is None:
+            knowledge_base = self._build_knowledge_base(transcript_text, slides_context, segments, effective_model)
+
+        # One stable prefix (instructions + knowledge base) shared by all four
+        # requests, task last: the provider's prompt cache prefills it once
+        system = NOTES_SYSTEM_PROMPT.format(knowledge_base=knowledge_base)
+        workers = min(len(names), settings.LLM_NOTES_CONCURRENCY, self.provider.max_concurrency)
+        print(f"[LLMService] Generating {', '.join(names)} ({workers} at a time)...")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                name: pool.submit(self._generate_with_retry, NOTES_PROMPTS[name], effective_model, name, system)
+                for name in names
+            }
+            results: Dict[str, str] = {}
+            errors: Dict[str, Exception] = {}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                    print(f"[LLMService] Generated {name}")
+                except Exception as e:
+                    print(f"LLM generation error ({name}): {e}")
+                    errors[name] = e
+
+        if errors:
+            raise NotesGenerationError(results, errors, knowledge_base)
+        return results
 
     def list_models(self) -> List[str]:
         return self.provider.list_models()
@@ -0,0 +1,188 @@
+import os
+import shutil
+import threading
+import ffmpeg
+import numpy as np
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple
+from datetime import datetime
+from app.core.config import settings
+
+AUDIO_NAME = "audio.wav"
+FRAMES_NAME = "frames"
+FRAME_PATTERN = "frame_%04d.png"
+SCENE_SAMPLE_FPS = 2  # Scene scores are computed on this many frames per second, not every decoded frame
+
+
+def log_media(message: str):
+    """Print debug message with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+    print(f"[{timestamp}] 🎞️ MEDIA: {message}", flush=True)
+
+
+def frame_sampling_params(interval: Optional[int] = None) -> List[Any]:
+    """Everything that determines which frames get sampled (part of the frame cache keys)."""
+    if settings.FRAME_SAMPLING == "scene" and interval is None:
+        return ["scene", settings.FRAME_SCENE_THRESHOLD, settings.FRAME_MIN_GAP, settings.FRAME_MAX_GAP]
+    return ["interval", interval or settings.FRAME_INTERVAL]
+
+
+def frame_filter(video, interval: Optional[int] = None):
+    """
+    Sampled-frames filter chain. In scene mode a frame is emitted when the
+    picture changes (ffmpeg scene score above FRAME_SCENE_THRESHOLD), but no
+    sooner than FRAME_MIN_GAP after the previous one and no later than
+    FRAME_MAX_GAP. An explicit `interval` forces fixed-interval sampling.
+    """
+    params = frame_sampling_params(interval)
+    if params[0] == "interval":
+        return video.filter('fps', fps=1/params[1])
+
+    _, threshold, min_gap, max_gap = params
+    since_last = "t-prev_selected_t"
+    expr = (
+        f"isnan(prev_selected_t)"
+        f"+gte({since_last},{max_gap})"
+        f"+gt(scene,{threshold})*gte({since_last},{min_gap})"
+    )
+    return video.filter('fps', fps=SCENE_SAMPLE_FPS).filter('select', expr)
+
+
+def media_outputs(stream, audio_path: Optional[Path], frames_dir: Optional[Path],
+                  interval: Optional[int] = None) -> List:
+    """
+    ffmpeg output nodes for the derivatives the pipeline consumes: 16 kHz mono
+    PCM for Whisper and sampled frames for slide analysis (see frame_filter).
+    Attach them to any input (a file or a pipe) so both come out of one decode.
+    Pass None for a derivative that isn't needed.
+    """
+    outputs = []
+    if audio_path is not None:
+        outputs.append(
+            stream.audio.output(str(audio_path), acodec='pcm_s16le', ac=1, ar='16k', format='wav')
+        )
+    if frames_dir is not None:
+        outputs.append(
+            frame_filter(stream.video, interval)
+            .output(str(frames_dir / FRAME_PATTERN), vsync='vfr')
+        )
+    return outputs
+
+
+def prepare_media(video_path: str, audio_path: Optional[Path] = None,
+                  frames_dir: Optional[Path] = None,
+                  interval: Optional[int] = None) -> List[str]:
+    """
+    Decode the video once, writing audio.wav and/or sampled frames in the
+    same ffmpeg pass. Returns the sorted list of frame paths (empty if frames
+    were not requested).
+    """
+    if frames_dir is not None:
+        frames_dir.mkdir(parents=True, exist_ok=True)
+
+    outputs = media_outputs(ffmpeg.input(video_path), audio_path, frames_dir, interval)
+    if not outputs:
+        return []
+
+    log_media(f"Decoding {video_path} -> audio={audio_path}, frames={frames_dir}")
+    try:
+        (
+            ffmpeg
+            .merge_outputs(*outputs)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        log_media(f"❌ ffmpeg error: {e.stderr.decode() if e.stderr else 'no stderr'}")
+        raise e
+    log_media("Media preparation complete")
+
+    if frames_dir is None:
+        return []
+    return sorted(str(p) for p in frames_dir.glob("frame_*.png"))
+
+
+def stream_frames(video_path: str, audio_path: Optional[Path] = None,
+                  interval: Optional[int] = None) -> Iterator[np.ndarray]:
+    """
+    Decode the video once, yielding sampled frames (see frame_filter) as
+    (height, width, 3) RGB arrays read straight from ffmpeg's stdout, so no
+    frame is encoded to disk. audio.wav is written in the same pass if
+    `audio_path` is given, and only appears once the decode has succeeded.
+    """
+    info = next(s for s in ffmpeg.probe(video_path)["streams"] if s["codec_type"] == "video")
+    width, height = int(info["width"]), int(info["height"])
+    frame_size = width * height * 3
+
+    stream = ffmpeg.input(video_path)
+    outputs = [
+        frame_filter(stream.video, interval)
+        .output("pipe:", format="rawvideo", pix_fmt="rgb24", vsync="vfr")
+    ]
+    audio_part = audio_path.with_name(audio_path.name + ".part") if audio_path is not None else None
+    outputs += media_outputs(stream, audio_part, None)
+
+    log_media(f"Streaming frames from {video_path} ({width}x{height}) -> audio={audio_path}")
+    process = (
+        ffmpeg
+        .merge_outputs(*outputs)
+        .global_args("-loglevel", "error")
+        .overwrite_output()
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    # Drain stderr on the side so a chatty ffmpeg can't block on a full pipe
+    stderr: List[bytes] = []
+    drain = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    drain.start()
+
+    try:
+        count = 0
+        while True:
+            buf = process.stdout.read(frame_size)
+            if len(buf) < frame_size:
+                break
+            count += 1
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+
+        process.wait()
+        drain.join()
+        if process.returncode != 0:
+            err = b"".join(stderr)
+            log_media(f"❌ ffmpeg error: {err.decode() or 'no stderr'}")
+            raise ffmpeg.Error("ffmpeg", None, err)
+        if audio_part is not None:
+            os.replace(audio_part, audio_path)
+        log_media(f"Streamed {count} frames")
+    finally:
+        if process.poll() is None:
+            # Consumer stopped early or failed: don't leave ffmpeg running
+            process.kill()
+            process.wait()
+        if audio_part is not None and audio_part.exists():
+            audio_part.unlink()
+
+
+def discard_prepared_media(media_dir: Path):
+    """
+    Remove audio.wav and frames/ from `media_dir`. Called when a new
+    download into the folder starts, so outputs decoded from the previous
+    video are never mistaken for the new one's (see find_prepared_media).
+    """
+    (media_dir / AUDIO_NAME).unlink(missing_ok=True)
+    shutil.rmtree(media_dir / FRAMES_NAME, ignore_errors=True)
+
+
+def find_prepared_media(video_path: str) -> Tuple[Optional[Path], Optional[Path]]:
+    """
+    Return (audio.wav, frames dir) produced next to the video at download
+    time, or None for each that is missing. Only complete outputs are ever
+    renamed into place, and a new download clears them first
+    (discard_prepared_media), so anything found here is safe to use.
+    """
+    video_dir = Path(video_path).parent
+    audio = video_dir / AUDIO_NAME
+    frames = video_dir / FRAMES_NAME
+    return (
+        audio if audio.is_file() else None,
+        frames if frames.is_dir() and any(frames.glob("frame_*.png")) else None,
+    )
@@ -0,0 +1,99 @@
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+def _to_int64(hex_hash: str) -> int:
+    """64-bit pHash hex -> signed int64, SQLite's INTEGER range."""
+    value = int(hex_hash, 16)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _hamming(a: np.ndarray, b: int) -> np.ndarray:
+    """Hamming distance from every int64 hash in `a` to `b`."""
+    xor = (a ^ np.int64(b)).view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(xor, axis=1).sum(axis=1)
+
+
+class OCRCache:
+    """
+    Persistent OCR results (text and bounding boxes) keyed by a slide's
+    perceptual hash. A lookup matches the nearest stored hash within
+    `tolerance` bits, so the same slide re-encoded, or shown in another
+    lecture, skips EasyOCR. Backed by SQLite; beyond `max_entries` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: Path, tolerance: int = 2, max_entries: int = 20000):
+        self.path = Path(path)
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr ("
+                " hash INTEGER PRIMARY KEY, text TEXT NOT NULL, boxes TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # Commit on success, roll back on error
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, hashes: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """Cached {"text", "boxes"} for each hash, or None where nothing is close enough."""
+        if not hashes:
+            return []
+        with self._lock, self._connect() as db:
+            rows = db.execute("SELECT hash FROM ocr").fetchall()
+            if not rows:
+                return [None] * len(hashes)
+            stored = np.array([r[0] for r in rows], dtype=np.int64)
+
+            matches: List[Optional[int]] = []
+            for h in hashes:
+                distances = _hamming(stored, _to_int64(h))
+                best = int(np.argmin(distances))
+                matches.append(int(stored[best]) if distances[best] <= self.tolerance else None)
+
+            results: List[Optional[Dict[str, Any]]] = []
+            now = time.time()
+            for match in matches:
+                if match is None:
+                    results.append(None)
+                    continue
+                text, boxes = db.execute("SELECT text, boxes FROM ocr WHERE hash = ?", (match,)).fetchone()
+                db.execute("UPDATE ocr SET last_used = ? WHERE hash = ?", (now, match))
+                results.append({"text": text, "boxes": json.loads(boxes)})
+            return results
+
+    def store(self, entries: Dict[str, Dict[str, Any]]):
+        """Save {"text", "boxes"} per hash, then evict down to max_entries."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO ocr (hash, text, boxes, last_used) VALUES (?, ?, ?, ?)",
+                [(_to_int64(h), e["text"], json.dumps(e["boxes"]), now) for h, e in entries.items()],
+            )
+            db.execute(
+                "DELETE FROM ocr WHERE hash IN ("
+                " SELECT hash FROM ocr ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM ocr").fetchone()[0]
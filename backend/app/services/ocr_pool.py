@@ -0,0 +1,78 @@
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+
+
+class OCRReaderPool:
+    """
+    Process-wide OCR readers shared by every job. Readers are built by
+    `factory` on first use (or by preload) and handed out one caller at a
+    time; when all `size` readers are busy, callers wait for one to come
+    back. release_idle() drops them once unused for a while, so the model
+    weights only occupy memory while there is work.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 1):
+        self._factory = factory
+        self.size = max(1, size)
+        self._idle: List[Any] = []
+        self._loaded = 0
+        self._cond = threading.Condition()
+        self._last_used = time.monotonic()
+
+    @property
+    def loaded(self) -> int:
+        """Readers currently in memory (idle or in use)."""
+        return self._loaded
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Check out a reader for the duration of the block, loading one if needed."""
+        reader = self._checkout()
+        try:
+            yield reader
+        finally:
+            with self._cond:
+                self._idle.append(reader)
+                self._last_used = time.monotonic()
+                self._cond.notify()
+
+    def _checkout(self) -> Any:
+        with self._cond:
+            while not self._idle and self._loaded >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._loaded += 1
+
+        # Load outside the lock so other callers can return and take readers meanwhile
+        try:
+            return self._factory()
+        except Exception:
+            with self._cond:
+                self._loaded -= 1
+                self._cond.notify()
+            raise
+
+    def preload(self):
+        """Load a reader ahead of the first job (no-op if one is already loaded)."""
+        if self._loaded == 0:
+            with self.acquire():
+                pass
+
+    def release_idle(self, timeout: float) -> int:
+        """
+        Drop all readers if none is in use and none has been used for
+        `timeout` seconds (0 disables). Returns how many were released.
+        """
+        with self._cond:
+            if (timeout <= 0 or not self._idle or len(self._idle) < self._loaded
+                    or time.monotonic() - self._last_used < timeout):
+                return 0
+            released = len(self._idle)
+            self._idle.clear()
+            self._loaded -= released
+        gc.collect()
+        return released
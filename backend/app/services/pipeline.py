@@ -1,14 +1,35 @@
+import json
 import os
 import shutil
-import ffmpeg
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from datetime import datetime
 from app.services.whisper_service import WhisperService
-from app.services.vision_service import VisionService
-from app.services.llm_service import LLMService
+from app.services.vision_service import VisionService, DEDUP_THRESHOLD, OCR_LANGUAGES
+from app.services.llm_service import NOTES_ARTIFACTS, LLMService, NotesGenerationError
+from app.services.media_prep import find_prepared_media, frame_sampling_params, prepare_media, stream_frames
+from app.services.artifact_cache import CACHE_DIR_NAME, ArtifactCache, cache_key, file_digest
+from app.services.asr import parse_model_spec
+from app.services.vad import wav_duration
 from app.core.config import settings
+from app.core.config_store import config_store
+from app.utils.files import link_or_copy
+
+# Share of the parallel analysis phase each branch accounts for in progress
+# reports (matches the worker's old sequential transcription/frames bands)
+BRANCH_WEIGHTS = {"transcription": 40, "frames": 30}
+
+TRANSCRIPT_KEY_FILE = "transcript.jsonl.meta"  # Transcript cache key transcript.jsonl was written for
+
+NOTES_FILES = {
+    "notes": "lecture_notes.md",
+    "summary": "summary.md",
+    "qa": "qa_cards.md",
+    "announcements": "announcements.md",
+}
 
 def log_debug(message: str):
     """Print debug message with timestamp"""
@@ -20,10 +41,15 @@ class ProcessingPipeline:
                  whisper_model: str = settings.WHISPER_MODEL,
                  llm_model: str = None):
         self.output_base = Path(output_base)
+        self.whisper_model = whisper_model or settings.WHISPER_MODEL
+        self.llm_model = llm_model
+        self.artifacts = ArtifactCache(self.output_base / CACHE_DIR_NAME)
         self.whisper_service = WhisperService()
         self.vision_service = VisionService()
         self.llm_service = LLMService(model=llm_model)
         self.progress_callback: Optional[Callable[[str, int, int, str], None]] = None
+        self._progress_lock = threading.Lock()
+        self._branch_progress: Dict[str, Tuple[float, str]] = {}
 
     def set_progress_callback(self, callback: Callable[[str, int, int, str], None]):
         self.progress_callback = callback
@@ -32,6 +58,17 @@ class ProcessingPipeline:
         if self.progress_callback:
             self.progress_callback(stage, current, total, message)
 
+    def _update_branch_progress(self, branch: str, fraction: float, message: str):
+        """Record one branch's progress and report the weighted combination."""
+        with self._progress_lock:
+            self._branch_progress[branch] = (fraction, message)
+            total_weight = sum(BRANCH_WEIGHTS.values())
+            combined = sum(
+                BRANCH_WEIGHTS[b] * frac for b, (frac, _) in self._branch_progress.items()
+            ) / total_weight
+            active = [msg for frac, msg in self._branch_progress.values() if msg and frac < 1.0]
+            self._update_progress("analysis", int(combined * 100), 100, " | ".join(active) or message)
+
     def process(self, video_path: str, title: str,
                 skip_transcription: bool = False,
                 skip_frames: bool = False,
@@ -65,42 +102,225 @@ class ProcessingPipeline:
              # For now, let's just use the original video path for processing
              pass
 
-        transcript_text = ""
-        slides_context = ""
+        # 2. Media prep: one decode for everything both branches need.
+        # Stages whose outputs are already cached for this media (from any
+        # earlier run, under any title) don't need their input decoded.
+        self._branch_progress = {branch: (0.0, "") for branch in BRANCH_WEIGHTS}
+        keys = self._artifact_keys(video_path)
+        cached_transcript = None if skip_transcription else self.artifacts.get("transcript", keys["transcript"])
+        cached_slides = None if skip_frames or skip_slide_analysis else self.artifacts.get("slides", keys["slides"])
+        audio_path, frames, deduplicated = self._prepare_media(
+            video_path, output_dir,
+            skip_transcription or cached_transcript is not None,
+            skip_frames or cached_slides is not None,
+            keys, stream_slides=settings.FRAME_PIPE and not skip_slide_analysis,
+        )
+
+        # 3. Audio and vision branches are independent, so run them side
+        # by side; notes generation waits for both.
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline") as pool:
+            audio_future = pool.submit(
+                self._run_audio_branch, audio_path, output_dir, skip_transcription,
+                keys, cached_transcript
+            )
+            vision_future = pool.submit(
+                self._run_vision_branch, frames, output_dir, skip_frames, skip_slide_analysis,
+                keys, cached_slides, deduplicated
+            )
+            # Re-raise the first branch failure (leaving the block still waits
+            # for the other branch, since running threads can't be cancelled)
+            for future in as_completed([audio_future, vision_future]):
+                future.result()
+
+        transcript_text = audio_future.result()
+        slides_context = vision_future.result()
+
+        # 4. Notes Generation
+        if not skip_notes and transcript_text:
+            log_debug("=== STAGE: NOTES ===")
+            self._update_progress("notes", 80, 100, "Generating notes (LLM)...")
+
+            log_debug(f"Starting LLM note generation (transcript: {len(transcript_text)} chars, slides: {len(slides_context)} chars)")
+            self._generate_notes(transcript_text, slides_context, output_dir)
+
+        log_debug("=== STAGE: COMPLETE ===")
+        self._update_progress("complete", 100, 100, "Processing complete!")
+        log_debug("========== PROCESSING FINISHED ==========")
+
+        return {
+            "output_dir": str(output_dir),
+            "transcript_len": len(transcript_text),
+            "slides_count": slides_context.count("Slide") if slides_context else 0
+        }
+
+    def _generate_notes(self, transcript_text: str, slides_context: str, output_dir: Path):
+        """
+        Generate and write the notes artifacts. After a partly failed run on
+        the same inputs and model, the artifacts that succeeded and the
+        knowledge base they were built from are reused, so a retry only
+        regenerates the failed ones, from the same knowledge base.
+        """
+        key = cache_key("notes", transcript_text, slides_context, config_store.get("LLM_PROVIDER"),
+                        self.llm_model or config_store.get("LLM_MODEL"))
+        partial: Dict[str, Any] = self.artifacts.get("notes_partial", key) or {}
+        done: Dict[str, str] = dict(partial.get("artifacts", {}))
+        knowledge_base: Optional[str] = partial.get("knowledge_base")
+        todo = [name for name in NOTES_ARTIFACTS if name not in done]
+        if done:
+            log_debug(f"Reusing {', '.join(done)} and their knowledge base from an earlier partial run")
+
+        error: Optional[NotesGenerationError] = None
+        try:
+            done.update(self.llm_service.generate_notes(transcript_text, slides_context, artifacts=todo,
+                                                        segments=self._segment_texts(output_dir, transcript_text),
+                                                        knowledge_base=knowledge_base))
+            log_debug(f"LLM generation complete")
+        except NotesGenerationError as e:
+            log_debug(f"❌ LLM NOTE GENERATION FAILED: {e}")
+            done.update(e.results)
+            knowledge_base = e.knowledge_base or knowledge_base
+            error = e
+        except Exception as e:
+            log_debug(f"❌ LLM NOTE GENERATION FAILED: {e}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            raise e
+
+        log_debug("Writing output files...")
+        for name, text in done.items():
+            with open(output_dir / NOTES_FILES[name], "w") as f:
+                f.write(text)
+            log_debug(f"  -> {NOTES_FILES[name]} written")
+
+        if error is not None:
+            self._store_artifact("notes_partial", key, {"artifacts": done, "knowledge_base": knowledge_base})
+            raise error
+        self.artifacts.delete("notes_partial", key)
+
+    def _segment_texts(self, output_dir: Path, transcript_text: str) -> Optional[List[str]]:
+        """Whisper segment texts for chunking, if transcript.jsonl matches the transcript."""
+        texts = [r["text"] for r in _load_segment_records(output_dir / "transcript.jsonl") if r["text"]]
+        return texts if texts and " ".join(texts) == transcript_text else None
+
+    def _artifact_keys(self, video_path: str) -> Dict[str, str]:
+        """Cache keys for each stage: the media's content hash plus everything else the output depends on."""
+        digest = file_digest(video_path)
+        engine, model = parse_model_spec(self.whisper_model)
+        asr_params = [engine, model, "en"]
+        if engine == "ctranslate2":
+            asr_params.append(settings.WHISPER_COMPUTE_TYPE)
+        frame_params = [digest, *frame_sampling_params()]
+        return {
+            "transcript": cache_key("transcript", digest, *asr_params),
+            "frame_hashes": cache_key("frame_hashes", *frame_params),
+            "slides": cache_key("slides", *frame_params, DEDUP_THRESHOLD, OCR_LANGUAGES),
+        }
+
+    def _store_artifact(self, kind: str, key: str, value: Any, files: Optional[List[str]] = None):
+        # Best effort: a failed cache write must not fail the job
+        try:
+            self.artifacts.put(kind, key, value, files=files)
+        except Exception as e:
+            log_debug(f"⚠️ Could not cache {kind}: {e}")
+
+    def _prepare_media(self, video_path: str, output_dir: Path, skip_transcription: bool,
+                       skip_frames: bool, keys: Dict[str, str],
+                       stream_slides: bool = False) -> Tuple[Optional[Path], List[str], bool]:
+        """
+        Produce audio.wav and sampled frames for the two branches.
+
+        Derivatives decoded at download time (prepareMedia) are reused; whatever
+        is still missing comes out of a single ffmpeg pass over the video.
+        With `stream_slides`, frames are piped out of that pass and
+        deduplicated in memory, so only unique slides are written.
+        Returns (audio path or None, frame or slide paths, whether the paths
+        are already-deduplicated slides).
+        """
+        prepared_audio, prepared_frames = find_prepared_media(video_path)
+        audio_path: Optional[Path] = None
+        frames: List[str] = []
+        frames_dir = output_dir / "frames"
+        decode_audio: Optional[Path] = None
+        decode_frames: Optional[Path] = None
 
-        # 2. Transcription
         if not skip_transcription:
-            log_debug("=== STAGE: TRANSCRIPTION ===")
-            self._update_progress("transcription", 10, 100, "Extracting audio...")
             audio_path = output_dir / "audio.wav"
+            if audio_path.exists():
+                log_debug(f"Audio file already exists: {audio_path}")
+            elif prepared_audio is not None:
+                log_debug(f"Using audio prepared at download time: {prepared_audio}")
+                audio_path = prepared_audio
+            else:
+                decode_audio = audio_path
 
-            # Extract Audio
-            try:
-                if not audio_path.exists():
-                    log_debug(f"Extracting audio from video to {audio_path}")
-                    (
-                        ffmpeg
-                        .input(video_path)
-                        .output(str(audio_path), acodec='pcm_s16le', ac=1, ar='16k')
-                        .overwrite_output()
-                        .run(quiet=True)
-                    )
-                    log_debug("Audio extraction complete")
-                else:
-                    log_debug(f"Audio file already exists: {audio_path}")
+        if not skip_frames:
+            if prepared_frames is not None and not frames_dir.exists():
+                # Take ownership of the download-time frames; they are
+                # cleaned up with the rest of frames/ after deduplication
+                log_debug(f"Using frames prepared at download time: {prepared_frames}")
+                shutil.move(str(prepared_frames), str(frames_dir))
+                frames = sorted(str(p) for p in frames_dir.glob("frame_*.png"))
+            else:
+                decode_frames = frames_dir
+
+        if decode_audio is None and decode_frames is None:
+            return audio_path, frames, False
+
+        log_debug("=== STAGE: MEDIA PREP ===")
+        self._update_progress("analysis", 0, 100, "Extracting audio and frames...")
+        try:
+            if decode_frames is not None and stream_slides:
+                frames, hashes = self.vision_service.deduplicate_stream(
+                    stream_frames(video_path, audio_path=decode_audio), output_dir / "slides"
+                )
+                self._store_artifact("frame_hashes", keys["frame_hashes"], hashes)
+                log_debug(f"Media prep complete (audio: {decode_audio is not None}, slides: {len(frames)})")
+                return audio_path, frames, True
+            decoded = prepare_media(video_path, audio_path=decode_audio, frames_dir=decode_frames)
+        except Exception as e:
+            log_debug(f"❌ MEDIA PREP FAILED: {e}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            raise e
+        if decode_frames is not None:
+            frames = decoded
+        log_debug(f"Media prep complete (audio: {decode_audio is not None}, frames: {len(decoded)})")
+        return audio_path, frames, False
+
+    def _run_audio_branch(self, audio_path: Optional[Path], output_dir: Path,
+                          skip_transcription: bool, keys: Dict[str, str],
+                          cached: Optional[Dict[str, Any]] = None) -> str:
+        """Transcribe the prepared audio (or restore a cached transcript). Returns the transcript text."""
+        transcript_text = ""
 
+        if not skip_transcription and cached is not None:
+            log_debug("=== STAGE: TRANSCRIPTION (cached) ===")
+            transcript_text = cached["text"]
+            _write_segment_records(output_dir / "transcript.jsonl", cached["segments"])
+            _write_transcript_key(output_dir, keys["transcript"])
+            with open(output_dir / "transcript.txt", "w") as f:
+                f.write(transcript_text)
+            log_debug(f"Restored cached transcript, length: {len(transcript_text)} chars")
+        elif not skip_transcription:
+            log_debug("=== STAGE: TRANSCRIPTION ===")
+            try:
                 log_debug("Starting Whisper transcription...")
-                self._update_progress("transcription", 30, 100, "Transcribing audio (Whisper)...")
-                transcript_result = self.whisper_service.transcribe(str(audio_path))
-                transcript_text = transcript_result['text']
+                self._update_branch_progress("transcription", 0.3, "Transcribing audio (Whisper)...")
+                if settings.WHISPER_WORKERS > 1:
+                    transcript_result = self.whisper_service.transcribe(str(audio_path), model=self.whisper_model)
+                    transcript_text = transcript_result['text']
+                    records = [_segment_record(seg) for seg in transcript_result.get('segments', [])]
+                    _write_segment_records(output_dir / "transcript.jsonl", records)
+                    _write_transcript_key(output_dir, keys["transcript"])
+                else:
+                    records = self._transcribe_incremental(audio_path, output_dir, keys["transcript"])
+                    transcript_text = " ".join(r["text"] for r in records if r["text"])
                 log_debug(f"Transcription complete, length: {len(transcript_text)} chars")
+                self._store_artifact("transcript", keys["transcript"],
+                                     {"text": transcript_text, "segments": records})
 
                 # Save Transcript
                 with open(output_dir / "transcript.txt", "w") as f:
                     f.write(transcript_text)
 
-                # Save enhanced transcript (segments) could be done here
-
             except Exception as e:
                 log_debug(f"❌ TRANSCRIPTION FAILED: {e}")
                 log_debug(f"Traceback: {traceback.format_exc()}")
@@ -113,34 +333,89 @@ class ProcessingPipeline:
                 transcript_text = (output_dir / "transcript.txt").read_text()
                 log_debug(f"Loaded existing transcript, length: {len(transcript_text)} chars")
 
-        # 3. Vision / Slides
-        if not skip_frames:
+        self._update_branch_progress("transcription", 1.0, "Transcription complete")
+        return transcript_text
+
+    def _transcribe_incremental(self, audio_path: Path, output_dir: Path, key: str) -> List[Dict[str, Any]]:
+        """
+        Stream segments into transcript.jsonl as Whisper produces them,
+        reporting progress in audio seconds. A transcript.jsonl left by an
+        interrupted run is picked up where it stopped, but only if it was
+        written for the same transcript `key` (same audio and model);
+        otherwise it is discarded. Returns all segments.
+        """
+        segments_path = output_dir / "transcript.jsonl"
+        if _read_transcript_key(output_dir) == key:
+            records = _load_segment_records(segments_path)
+        else:
+            records = []
+            _write_segment_records(segments_path, records)
+            _write_transcript_key(output_dir, key)
+        resume_from = records[-1]["end"] if records else 0.0
+        if records:
+            log_debug(f"Resuming transcription at {resume_from:.1f}s ({len(records)} segments on disk)")
+
+        duration = wav_duration(str(audio_path)) or 1.0
+        with open(segments_path, "a") as f:
+            for seg in self.whisper_service.transcribe_stream(
+                    str(audio_path), start_offset=resume_from, model=self.whisper_model):
+                record = _segment_record(seg)
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                records.append(record)
+                done = min(record["end"] / duration, 1.0)
+                self._update_branch_progress(
+                    "transcription", 0.3 + 0.7 * done,
+                    f"Transcribing audio (Whisper)... {int(record['end'])}s / {int(duration)}s",
+                )
+
+        return records
+
+    def _run_vision_branch(self, frames: List[str], output_dir: Path, skip_frames: bool,
+                           skip_slide_analysis: bool, keys: Dict[str, str],
+                           cached: Optional[Dict[str, Any]] = None, deduplicated: bool = False) -> str:
+        """
+        Deduplicate and OCR the prepared frames (or restore cached slides).
+        `deduplicated` means media prep already reduced `frames` to unique
+        slides. Returns the slides context.
+        """
+        slides_context = ""
+
+        if not skip_frames and not skip_slide_analysis and cached is not None:
+            log_debug("=== STAGE: FRAMES (cached) ===")
+            slides_dir = output_dir / "slides"
+            slides_dir.mkdir(exist_ok=True)
+            cached_dir = self.artifacts.files_dir("slides", keys["slides"])
+            for name in cached["slides"]:
+                link_or_copy(str(cached_dir / name), str(slides_dir / name))
+            slides_context = "\n".join([f"[Slide {k}]: {v}" for k, v in cached["ocr"].items()])
+            log_debug(f"Restored {len(cached['slides'])} cached slides")
+        elif not skip_frames:
             log_debug("=== STAGE: FRAMES ===")
-            self._update_progress("frames", 50, 100, "Extracting frames...")
             frames_dir = output_dir / "frames"
-
-            log_debug(f"Starting frame extraction to {frames_dir}")
-            try:
-                frames = self.vision_service.extract_frames(video_path, str(frames_dir))
-                log_debug(f"Frame extraction complete, got {len(frames)} frames")
-            except Exception as e:
-                log_debug(f"❌ FRAME EXTRACTION FAILED: {e}")
-                log_debug(f"Traceback: {traceback.format_exc()}")
-                raise e
+            log_debug(f"Got {len(frames)} frames")
 
             if not skip_slide_analysis:
-                log_debug("Starting slide deduplication")
-                self._update_progress("frames", 60, 100, "Analyzing slides...")
-                try:
-                    unique_slides = self.vision_service.deduplicate_slides(str(frames_dir))
-                    log_debug(f"Deduplication complete, {len(unique_slides)} unique slides")
-                except Exception as e:
-                    log_debug(f"❌ SLIDE DEDUPLICATION FAILED: {e}")
-                    log_debug(f"Traceback: {traceback.format_exc()}")
-                    raise e
+                if deduplicated:
+                    log_debug(f"Frames were deduplicated during media prep ({len(frames)} unique slides)")
+                    unique_slides = frames
+                else:
+                    log_debug("Starting slide deduplication")
+                    self._update_branch_progress("frames", 0.4, "Analyzing slides...")
+                    try:
+                        hashes = self.artifacts.get("frame_hashes", keys["frame_hashes"])
+                        if hashes is None:
+                            hashes = self.vision_service.hash_frames(str(frames_dir))
+                            self._store_artifact("frame_hashes", keys["frame_hashes"], hashes)
+                        unique_slides = self.vision_service.deduplicate_slides(str(frames_dir), hashes=hashes)
+                        log_debug(f"Deduplication complete, {len(unique_slides)} unique slides")
+                    except Exception as e:
+                        log_debug(f"❌ SLIDE DEDUPLICATION FAILED: {e}")
+                        log_debug(f"Traceback: {traceback.format_exc()}")
+                        raise e
 
                 log_debug("Starting OCR on slides")
-                self._update_progress("frames", 70, 100, "OCRing slides...")
+                self._update_branch_progress("frames", 0.6, "OCRing slides...")
                 try:
                     ocr_results = self.vision_service.ocr_slides(unique_slides)
                     log_debug(f"OCR complete for {len(ocr_results)} slides")
@@ -152,6 +427,11 @@ class ProcessingPipeline:
                 # Build context
                 slides_context = "\n".join([f"[Slide {k}]: {v}" for k,v in ocr_results.items()])
                 log_debug(f"Slides context built, length: {len(slides_context)} chars")
+                self._store_artifact(
+                    "slides", keys["slides"],
+                    {"slides": [os.path.basename(s) for s in unique_slides], "ocr": ocr_results},
+                    files=unique_slides,
+                )
 
                 # Cleanup raw frames to save space? V1 keeps them in 'frames' vs 'slides'
                 # V1 keeps 'slides' (unique) and maybe deletes raw 'frames'.
@@ -160,44 +440,43 @@ class ProcessingPipeline:
                     log_debug(f"Cleaning up raw frames directory: {frames_dir}")
                     shutil.rmtree(frames_dir)
 
-        # 4. Notes Generation
-        if not skip_notes and transcript_text:
-            log_debug("=== STAGE: NOTES ===")
-            self._update_progress("notes", 80, 100, "Generating notes (LLM)...")
+        self._update_branch_progress("frames", 1.0, "Slide analysis complete")
+        return slides_context
 
-            log_debug(f"Starting LLM note generation (transcript: {len(transcript_text)} chars, slides: {len(slides_context)} chars)")
-            try:
-                notes_data = self.llm_service.generate_notes(transcript_text, slides_context)
-                log_debug(f"LLM generation complete")
-            except Exception as e:
-                log_debug(f"❌ LLM NOTE GENERATION FAILED: {e}")
-                log_debug(f"Traceback: {traceback.format_exc()}")
-                raise e
 
-            log_debug("Writing output files...")
-            with open(output_dir / "lecture_notes.md", "w") as f:
-                f.write(notes_data['notes'])
-            log_debug("  -> lecture_notes.md written")
+def _segment_record(seg: Dict[str, Any]) -> Dict[str, Any]:
+    return {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
 
-            with open(output_dir / "summary.md", "w") as f:
-                f.write(notes_data['summary'])
-            log_debug("  -> summary.md written")
 
-            with open(output_dir / "qa_cards.md", "w") as f:
-                f.write(notes_data['qa'])
-            log_debug("  -> qa_cards.md written")
+def _write_segment_records(path: Path, records: List[Dict[str, Any]]):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
 
-            # Save announcements if generated
-            if 'announcements' in notes_data:
-                with open(output_dir / "announcements.md", "w") as f:
-                    f.write(notes_data['announcements'])
 
-        log_debug("=== STAGE: COMPLETE ===")
-        self._update_progress("complete", 100, 100, "Processing complete!")
-        log_debug("========== PROCESSING FINISHED ==========")
+def _read_transcript_key(output_dir: Path) -> Optional[str]:
+    try:
+        return (output_dir / TRANSCRIPT_KEY_FILE).read_text().strip()
+    except OSError:
+        return None
 
-        return {
-            "output_dir": str(output_dir),
-            "transcript_len": len(transcript_text),
-            "slides_count": slides_context.count("Slide") if slides_context else 0
-        }
+
+def _write_transcript_key(output_dir: Path, key: str):
+    """Record which audio/model transcript.jsonl belongs to, so resume never mixes transcripts."""
+    (output_dir / TRANSCRIPT_KEY_FILE).write_text(key)
+
+
+def _load_segment_records(path: Path) -> List[Dict[str, Any]]:
+    """Read transcript.jsonl, stopping at a line torn by an interrupted write."""
+    records = []
+    if not path.exists():
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    # Rewrite without the torn tail so appends start on a clean line
+    _write_segment_records(path, records)
+    return records
@@ -0,0 +1,86 @@
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+HASH_SIZE = 8                  # 8x8 low-frequency DCT block -> 64-bit hash
+IMG_SIZE = HASH_SIZE * 4       # Thumbnails are 32x32 grayscale, as imagehash.phash uses
+DECODE_WORKERS = 8             # PIL releases the GIL while decoding
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Unnormalised DCT-II basis (scipy's default), so hashes match imagehash.phash."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return 2 * np.cos(np.pi * k * (2 * x + 1) / (2 * n))
+
+
+_DCT_LOW = _dct_matrix(IMG_SIZE)[:HASH_SIZE]
+
+
+def thumbnail(img: Image.Image) -> np.ndarray:
+    """32x32 grayscale float thumbnail of a frame, the input to phash_batch."""
+    # Plain LANCZOS, exactly as imagehash.phash resizes; a reducing_gap shortcut
+    # shifts a few bits, enough to matter against DEDUP_THRESHOLD
+    small = img.convert("L").resize((IMG_SIZE, IMG_SIZE), Image.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
+
+
+def _thumbnail(path: str) -> Optional[np.ndarray]:
+    try:
+        with Image.open(path) as img:
+            return thumbnail(img)
+    except Exception as e:
+        print(f"Error hashing frame {path}: {e}")
+        return None
+
+
+def load_thumbnails(paths: Sequence[str], workers: int = DECODE_WORKERS) -> Tuple[np.ndarray, List[int]]:
+    """
+    Decode frames to 32x32 grayscale in parallel. Returns the stacked
+    thumbnails and the indices (into `paths`) of the frames that decoded.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        thumbs = list(pool.map(_thumbnail, paths))
+    ok = [i for i, t in enumerate(thumbs) if t is not None]
+    if not ok:
+        return np.zeros((0, IMG_SIZE, IMG_SIZE)), ok
+    return np.stack([thumbs[i] for i in ok]), ok
+
+
+def phash_batch(thumbs: np.ndarray) -> np.ndarray:
+    """pHash bits for a (N, 32, 32) stack: low-frequency DCT above its median. Returns (N, 64) bool."""
+    low = _DCT_LOW @ thumbs @ _DCT_LOW.T  # (N, 8, 8)
+    flat = low.reshape(len(thumbs), -1)
+    return flat > np.median(flat, axis=1, keepdims=True)
+
+
+def bits_to_hex(bits: np.ndarray) -> List[str]:
+    """Hex strings in imagehash's format (so str(imagehash.phash(...)) and these interchange)."""
+    return [row.tobytes().hex() for row in np.packbits(bits, axis=1)]
+
+
+def hex_to_bits(hashes: Sequence[str]) -> np.ndarray:
+    packed = np.array([list(bytes.fromhex(h)) for h in hashes], dtype=np.uint8).reshape(len(hashes), -1)
+    return np.unpackbits(packed, axis=1).astype(bool)
+
+
+def select_unique(bits: np.ndarray, threshold: int) -> List[int]:
+    """
+    Indices of frames that start a new slide: a frame is new when its
+    Hamming distance to the last new frame is >= threshold. Each step
+    compares the current slide against all later frames at once and jumps
+    to the first one that differs, so the Python loop runs once per slide
+    rather than once per frame.
+    """
+    if len(bits) == 0:
+        return []
+    unique = [0]
+    anchor = 0
+    while True:
+        distances = np.count_nonzero(bits[anchor + 1:] != bits[anchor], axis=1)
+        changed = np.flatnonzero(distances >= threshold)
+        if len(changed) == 0:
+            return unique
+        anchor = anchor + 1 + int(changed[0])
+        unique.append(anchor)
@@ -0,0 +1,97 @@
+import numpy as np
+from PIL import Image
+from typing import NamedTuple, Optional, Tuple
+
+ANALYSIS_WIDTH = 640        # Frames are classified at roughly this width
+CELL = 16                   # Analysis grid cell size (pixels at analysis scale)
+EDGE_THRESHOLD = 48         # Grey-level step that counts as a sharp edge
+CELL_EDGE_DENSITY = 0.12    # Share of sharp-edge pixels that makes a cell look like text
+MIN_TEXT_FRACTION = 0.005   # Below this share of text-like cells the frame is skipped
+MAX_CROP_FRACTION = 0.9     # Don't bother cropping away less than 10% of the frame
+CANVAS_STEP = 256           # OCR inputs are padded to multiples of this so crops of similar size batch together
+
+
+class PreparedSlide(NamedTuple):
+    """OCR input cut from a slide; detected boxes map back via (x / scale + left, y / scale + top)."""
+    image: np.ndarray
+    left: int
+    top: int
+    scale: float
+
+
+def text_cells(img: Image.Image) -> Tuple[np.ndarray, int]:
+    """
+    Grid of cells that look like text: dense in short, sharp edges, unlike
+    blank screens and the soft gradients of a camera shot. Returns the
+    boolean grid and the size of a cell in original pixels.
+    """
+    factor = max(1, img.width // ANALYSIS_WIDTH)
+    gray = np.asarray(img.convert("L").reduce(factor), dtype=np.int16)
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) >= EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(gray, axis=0)) >= EDGE_THRESHOLD
+
+    rows, cols = gray.shape[0] // CELL, gray.shape[1] // CELL
+    if rows == 0 or cols == 0:
+        return np.zeros((0, 0), dtype=bool), CELL * factor
+    density = edges[:rows * CELL, :cols * CELL].reshape(rows, CELL, cols, CELL).mean(axis=(1, 3))
+    return density >= CELL_EDGE_DENSITY, CELL * factor
+
+
+def find_text_region(img: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (left, top, right, bottom) around the text-like part of a frame, padded
+    by a cell and aligned to the analysis grid (so a static slide layout
+    crops identically from frame to frame), or None if the frame is
+    unlikely to contain text.
+    """
+    cells, size = text_cells(img)
+    if cells.size == 0 or cells.mean() < MIN_TEXT_FRACTION:
+        return None
+    ys, xs = np.nonzero(cells)
+    left = max(0, (xs.min() - 1) * size)
+    top = max(0, (ys.min() - 1) * size)
+    right = min(img.width, (xs.max() + 2) * size)
+    bottom = min(img.height, (ys.max() + 2) * size)
+    return int(left), int(top), int(right), int(bottom)
+
+
+def pad_to_canvas(img: Image.Image, step: int = CANVAS_STEP) -> Image.Image:
+    """
+    Pad an image at the right and bottom up to the next multiple of `step`
+    in each dimension, filled with the median colour of its border so the
+    padding reads as more background. Coordinates are unchanged.
+    """
+    width, height = -(-img.width // step) * step, -(-img.height // step) * step
+    if (width, height) == img.size:
+        return img
+    pixels = np.asarray(img)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    canvas = Image.new("RGB", (width, height), tuple(int(c) for c in np.median(border, axis=0)))
+    canvas.paste(img, (0, 0))
+    return canvas
+
+
+def prepare_for_ocr(img: Image.Image, max_side: int, detect: bool = True) -> Optional[PreparedSlide]:
+    """
+    Crop a slide to its text region and downscale it so the longer side is
+    at most `max_side`, then pad it to a fixed canvas size (pad_to_canvas)
+    so slides with slightly different crops can share an OCR batch.
+    Returns None if `detect` finds no text to read.
+    """
+    left, top, right, bottom = 0, 0, img.width, img.height
+    if detect:
+        region = find_text_region(img)
+        if region is None:
+            return None
+        if (region[2] - region[0]) * (region[3] - region[1]) < MAX_CROP_FRACTION * img.width * img.height:
+            left, top, right, bottom = region
+            img = img.crop(region)
+
+    scale = 1.0
+    if 0 < max_side < max(img.size):
+        ratio = max_side / max(img.size)
+        width = max(1, round(img.width * ratio))
+        img = img.resize((width, max(1, round(img.height * ratio))), Image.LANCZOS, reducing_gap=2.0)
+        scale = width / (right - left)
+    return PreparedSlide(np.asarray(pad_to_canvas(img.convert("RGB"))), left, top, scale)
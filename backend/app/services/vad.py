@@ -0,0 +1,83 @@
+import wave
+import numpy as np
+from typing import List, Optional, Tuple
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+SMOOTH_FRAMES = 10  # ~300ms moving average, so a split lands in a pause, not between syllables
+READ_BLOCK_SECONDS = 60  # Energy is computed block by block so long lectures aren't loaded whole
+
+
+def read_wav(path: str, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+    """
+    Read 16-bit mono PCM samples [start, end) as float32 in [-1, 1], the
+    format Whisper accepts directly. This is what media prep writes.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"Expected 16-bit mono PCM: {path}")
+        total = wav.getnframes()
+        end = total if end is None else min(end, total)
+        wav.setpos(start)
+        raw = wav.readframes(max(0, end - start))
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def wav_duration(path: str) -> float:
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def frame_energy(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS energy of consecutive non-overlapping frames."""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def _file_energy(path: str, start_sample: int, frame_len: int) -> Tuple[np.ndarray, int]:
+    """Frame energy from `start_sample` to the end, plus the file's total sample count."""
+    with wave.open(path, "rb") as wav:
+        total = wav.getnframes()
+    block = (SAMPLE_RATE * READ_BLOCK_SECONDS // frame_len) * frame_len
+    parts = [
+        frame_energy(read_wav(path, pos, pos + block), frame_len)
+        for pos in range(start_sample, total, block)
+    ]
+    energy = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return energy, total
+
+
+def split_on_silence(path: str, target_seconds: float = 300, search_seconds: float = 30,
+                     start_sample: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split a WAV into spans of roughly `target_seconds`, each cut at the
+    quietest point within `search_seconds` of the target. Returns
+    (start_sample, end_sample) pairs that tile the file from `start_sample`
+    to the end (empty if there is nothing left).
+    """
+    frame_len = SAMPLE_RATE * FRAME_MS // 1000
+    energy, total = _file_energy(path, start_sample, frame_len)
+    if start_sample >= total:
+        return []
+
+    if len(energy) >= SMOOTH_FRAMES:
+        energy = np.convolve(energy, np.ones(SMOOTH_FRAMES) / SMOOTH_FRAMES, mode="same")
+
+    frames_per_second = 1000 / FRAME_MS
+    target = int(target_seconds * frames_per_second)
+    search = int(search_seconds * frames_per_second)
+
+    boundaries = [0]
+    pos = 0
+    # Don't leave a tail much shorter than a normal span
+    while len(energy) - pos > target * 1.5:
+        lo = max(pos + 1, pos + target - search)
+        hi = min(len(energy), pos + target + search)
+        pos = lo + int(np.argmin(energy[lo:hi]))
+        boundaries.append(pos)
+
+    starts = [start_sample + b * frame_len for b in boundaries]
+    return list(zip(starts, starts[1:] + [total]))
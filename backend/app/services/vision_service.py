@@ -1,70 +1,177 @@
 import os
-import shutil
-import ffmpeg
-import imagehash
+import multiprocessing
 import easyocr
+import numpy as np
+import torch
 from PIL import Image
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.core.config import settings
+from app.services.media_prep import FRAME_PATTERN, prepare_media
+from app.services.ocr_cache import OCRCache
+from app.services.ocr_pool import OCRReaderPool
+from app.services.slide_dedup import (
+    bits_to_hex, hex_to_bits, load_thumbnails, phash_batch, select_unique, thumbnail,
+)
+from app.services.text_regions import PreparedSlide, prepare_for_ocr
+from app.utils.files import link_or_copy
+
+DEDUP_THRESHOLD = 5      # pHash Hamming distance below which consecutive frames are the same slide
+OCR_LANGUAGES = ['en']
+RECOGNIZER_BATCH = 32    # Text crops per EasyOCR recognizer batch
+
+# Per-process reader for OCR workers
+_worker_reader = None
 
 def log_vision(message: str):
     """Print debug message with timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
     print(f"[{timestamp}] 👁️ VISION: {message}", flush=True)
 
+def _new_reader():
+    # Explicitly disable GPU to avoid hangs on Mac/CPU environments when memory is tight
+    log_vision("Initializing EasyOCR Reader (gpu=False)...")
+    reader = easyocr.Reader(OCR_LANGUAGES, gpu=False)
+    log_vision("EasyOCR Reader initialized")
+    return reader
+
+
+# Shared by every job in this process, so the weights load once rather than per lecture
+reader_pool = OCRReaderPool(_new_reader)
+
+
+def _init_ocr_worker(num_threads: int):
+    global _worker_reader
+    # Split the cores between workers instead of every worker grabbing all of them
+    torch.set_num_threads(num_threads)
+    _worker_reader = easyocr.Reader(OCR_LANGUAGES, gpu=False)
+
+
+def _ocr_chunk(slides: List[str], batch_size: int) -> List[Optional[Dict[str, Any]]]:
+    return _ocr_batched(_worker_reader, slides, batch_size)
+
+
+def _ocr_entry(detections) -> Dict[str, Any]:
+    """EasyOCR (box, text, confidence) detections -> {"text", "boxes"} (plain types, JSON- and pickle-safe)."""
+    return {
+        "text": " ".join(text for _, text, _ in detections),
+        "boxes": [
+            {"box": [[int(x), int(y)] for x, y in box], "text": text, "confidence": float(conf)}
+            for box, text, conf in detections
+        ],
+    }
+
+
+def _place(entry: Dict[str, Any], slide: PreparedSlide) -> Dict[str, Any]:
+    """Map box coordinates from the prepared (cropped, scaled) image back to the slide."""
+    for box in entry["boxes"]:
+        box["box"] = [[round(x / slide.scale) + slide.left, round(y / slide.scale) + slide.top]
+                      for x, y in box["box"]]
+    return entry
+
+
+def _prepare_slides(slides: List[str]) -> Dict[int, PreparedSlide]:
+    """OCR input for each slide worth reading, keyed by index; see text_regions.prepare_for_ocr."""
+    prepared: Dict[int, PreparedSlide] = {}
+    skipped = 0
+    for i, path in enumerate(slides):
+        try:
+            with Image.open(path) as img:
+                slide = prepare_for_ocr(img, settings.OCR_MAX_SIDE, detect=settings.OCR_TEXT_FILTER)
+        except Exception as e:
+            log_vision(f"❌ OCR Error on {path}: {e}")
+            continue
+        if slide is None:
+            skipped += 1
+        else:
+            prepared[i] = slide
+    if skipped:
+        log_vision(f"Skipping {skipped}/{len(slides)} slides with no text-like content")
+    return prepared
+
+
+def _ocr_batched(reader, slides: List[str], batch_size: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    {"text", "boxes"} for each slide, in order, or None where a slide wasn't
+    read: OCR failed, or the text filter skipped it. Slides are cropped to
+    their text region, downscaled and padded to a canvas size first. Inputs
+    of the same size go through EasyOCR's batched path `batch_size` at a
+    time; a batch that fails is retried slide by slide so one bad image
+    only fails itself.
+    """
+    prepared = _prepare_slides(slides)
+    by_size: Dict[Tuple[int, ...], List[int]] = {}
+    for i, slide in prepared.items():
+        by_size.setdefault(slide.image.shape, []).append(i)
+
+    entries: List[Optional[Dict[str, Any]]] = [None] * len(slides)
+    for indices in by_size.values():
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            try:
+                results = reader.readtext_batched(
+                    [prepared[i].image for i in batch], batch_size=RECOGNIZER_BATCH, detail=1
+                )
+            except Exception as e:
+                log_vision(f"Batched OCR failed ({e}), retrying {len(batch)} slides one by one")
+                results = []
+                for i in batch:
+                    try:
+                        results.append(reader.readtext(prepared[i].image, batch_size=RECOGNIZER_BATCH, detail=1))
+                    except Exception as e:
+                        log_vision(f"❌ OCR Error on {slides[i]}: {e}")
+                        results.append(None)
+            for i, detections in zip(batch, results):
+                if detections is not None:
+                    entries[i] = _place(_ocr_entry(detections), prepared[i])
+    return entries
+
+
 class VisionService:
     def __init__(self):
-        self.reader = None # Initialize lazily to save RAM on startup
-
-    def get_reader(self):
-        if self.reader is None:
-            # Initialize for English. Explicitly disable GPU to avoid hangs on Mac/CPU environments
-            # when memory is tight.
-            log_vision("Initializing EasyOCR Reader (gpu=False)...")
-            self.reader = easyocr.Reader(['en'], gpu=False)
-            log_vision("EasyOCR Reader initialized")
-        return self.reader
-
-    def extract_frames(self, video_path: str, output_dir: str, interval: int = 10) -> List[str]:
+        self.ocr_cache: Optional[OCRCache] = None
+
+    def get_ocr_cache(self) -> Optional[OCRCache]:
+        if self.ocr_cache is None and settings.OCR_CACHE_ENABLED:
+            self.ocr_cache = OCRCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_TOLERANCE,
+                                      settings.OCR_CACHE_MAX_ENTRIES)
+        return self.ocr_cache
+
+    def extract_frames(self, video_path: str, output_dir: str, interval: Optional[int] = None) -> List[str]:
         """
-        Extract frames from video at fixed intervals using ffmpeg.
+        Extract frames from video using ffmpeg, on scene changes or at fixed
+        intervals (FRAME_SAMPLING; passing `interval` forces fixed intervals).
         Returns list of paths to extracted frames.
+
+        Frames only; the pipeline uses media_prep.prepare_media directly to get
+        audio and frames from a single decode.
         """
         log_vision(f"extract_frames called: video={video_path}, output={output_dir}, interval={interval}")
-        out_path = Path(output_dir)
-        out_path.mkdir(parents=True, exist_ok=True)
-
-        # Pattern for output files
-        output_pattern = str(out_path / "frame_%04d.png")
-        log_vision(f"Output pattern: {output_pattern}")
-
-        try:
-            log_vision("Starting ffmpeg frame extraction...")
-            (
-                ffmpeg
-                .input(video_path)
-                .filter('fps', fps=1/interval)
-                .output(output_pattern, vsync='vfr')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-            log_vision("ffmpeg frame extraction complete")
-        except ffmpeg.Error as e:
-            log_vision(f"❌ ffmpeg error: {e.stderr.decode() if e.stderr else 'no stderr'}")
-            print(f"Frame extraction error: {e.stderr.decode()}", flush=True)
-            raise e
-
-        # Return sorted list of generated files
-        frames = sorted([str(p) for p in out_path.glob("frame_*.png")])
+        frames = prepare_media(video_path, frames_dir=Path(output_dir), interval=interval)
         log_vision(f"Found {len(frames)} extracted frames")
         return frames
 
-    def deduplicate_slides(self, frames_dir: str, threshold: int = 5) -> List[str]:
+    def hash_frames(self, frames_dir: str) -> Dict[str, str]:
+        """
+        Perceptual hash (hex) of every frame, keyed by frame filename.
+        Frames are decoded to thumbnails in parallel and hashed as one batch.
+        """
+        frames = sorted(Path(frames_dir).glob("frame_*.png"))
+        thumbs, ok = load_thumbnails([str(f) for f in frames])
+        hashes = bits_to_hex(phash_batch(thumbs)) if ok else []
+        log_vision(f"Hashed {len(ok)}/{len(frames)} frames")
+        return {frames[i].name: h for i, h in zip(ok, hashes)}
+
+    def deduplicate_slides(self, frames_dir: str, threshold: int = DEDUP_THRESHOLD,
+                           hashes: Optional[Dict[str, str]] = None) -> List[str]:
         """
         Remove duplicate slides using perceptual hashing.
         Returns list of paths to unique slides.
+
+        Pass `hashes` (from hash_frames, e.g. cached) to skip hashing. Unique
+        frames are hardlinked into slides/, not copied.
         """
         log_vision(f"deduplicate_slides called: dir={frames_dir}, threshold={threshold}")
         frames_path = Path(frames_dir)
@@ -75,59 +182,109 @@ class VisionService:
             log_vision("No frames found, returning empty list")
             return []
 
-        unique_frames = []
-        last_hash = None
+        if hashes is None or any(f.name not in hashes for f in frames):
+            hashes = {**self.hash_frames(frames_dir), **(hashes or {})}
+        # Frames that failed to decode have no hash and are skipped
+        frames = [f for f in frames if f.name in hashes]
+        bits = hex_to_bits([hashes[f.name] for f in frames])
 
         # Create a 'slides' subdirectory for the unique ones
         slides_dir = frames_path.parent / "slides"
         slides_dir.mkdir(exist_ok=True)
 
-        for frame_file in frames:
-            try:
-                img = Image.open(frame_file)
-                curr_hash = imagehash.phash(img)
+        unique_frames = []
+        for i in select_unique(bits, threshold):
+            new_path = slides_dir / frames[i].name
+            link_or_copy(str(frames[i]), str(new_path))
+            unique_frames.append(str(new_path))
 
-                is_duplicate = False
-                if last_hash is not None:
-                    if curr_hash - last_hash < threshold:
-                        is_duplicate = True
+        log_vision(f"Deduplication complete: {len(unique_frames)} unique slides from {len(frames)} frames")
+        return unique_frames
 
-                if not is_duplicate:
-                    # It's a new slide
-                    new_path = slides_dir / frame_file.name
-                    shutil.copy(frame_file, new_path)
-                    unique_frames.append(str(new_path))
-                    last_hash = curr_hash
+    def deduplicate_stream(self, frames: Iterable[np.ndarray], slides_dir: Path,
+                           threshold: int = DEDUP_THRESHOLD) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Deduplicate decoded RGB frames as they arrive (e.g. from
+        media_prep.stream_frames). Only frames that start a new slide are
+        encoded, once, as PNGs in `slides_dir`; the rest never touch disk.
+        Returns (unique slide paths, hex hash per frame name).
+        """
+        slides_dir.mkdir(parents=True, exist_ok=True)
+        unique_frames: List[str] = []
+        hashes: Dict[str, str] = {}
+        last_bits = None
+        count = 0
 
-            except Exception as e:
-                print(f"Error processing frame {frame_file}: {e}")
+        for count, frame in enumerate(frames, 1):
+            name = FRAME_PATTERN % count
+            img = Image.fromarray(frame)
+            bits = phash_batch(thumbnail(img)[None])
+            hashes[name] = bits_to_hex(bits)[0]
+            if last_bits is None or np.count_nonzero(bits != last_bits) >= threshold:
+                path = slides_dir / name
+                img.save(path)
+                unique_frames.append(str(path))
+                last_bits = bits
 
-        log_vision(f"Deduplication complete: {len(unique_frames)} unique slides from {len(frames)} frames")
-        return unique_frames
+        log_vision(f"Streamed deduplication complete: {len(unique_frames)} unique slides from {count} frames")
+        return unique_frames, hashes
 
-    def ocr_slides(self, slides: List[str]) -> Dict[str, str]:
+    def ocr_slides(self, slides: List[str], workers: Optional[int] = None) -> Dict[str, str]:
         """
         Extract text from slides using EasyOCR.
         Returns dict mapping 'slide_filename' -> 'extracted_text'
+
+        Slides seen before (by perceptual hash, see OCRCache) are answered
+        from the OCR cache. The rest are cropped to their text region, with
+        text-free frames (camera, blank screen) skipped, and OCR'd in batches of OCR_BATCH_SIZE;
+        with `workers` > 1 (default: settings.OCR_WORKERS) they are split
+        across that many processes, each with its own reader.
         """
-        log_vision(f"ocr_slides called with {len(slides)} slides")
-        log_vision("Getting/initializing EasyOCR reader...")
-        reader = self.get_reader()
-        log_vision("EasyOCR reader ready")
-        results = {}
-
-        for i, slide_path in enumerate(slides):
-            log_vision(f"OCR processing slide {i+1}/{len(slides)}: {os.path.basename(slide_path)}")
-            try:
-                # detail=0 returns just the list of text strings
-                text_list = reader.readtext(slide_path, detail=0)
-                full_text = " ".join(text_list)
-                results[os.path.basename(slide_path)] = full_text
-                log_vision(f"  -> Got {len(full_text)} chars")
-            except Exception as e:
-                log_vision(f"❌ OCR Error on {slide_path}: {e}")
-                print(f"OCR Error on {slide_path}: {e}", flush=True)
-                results[os.path.basename(slide_path)] = ""
+        if not slides:
+            return {}
 
-        log_vision(f"OCR complete for all {len(slides)} slides")
+        entries: List[Optional[Dict[str, Any]]] = [None] * len(slides)
+        hashes: Dict[int, str] = {}
+        cache = self.get_ocr_cache()
+        if cache is not None:
+            thumbs, ok = load_thumbnails(slides)
+            if ok:
+                hashes = dict(zip(ok, bits_to_hex(phash_batch(thumbs))))
+            for i, hit in zip(hashes, cache.lookup(list(hashes.values()))):
+                entries[i] = hit
+            log_vision(f"OCR cache: {sum(e is not None for e in entries)}/{len(slides)} slides already known")
+
+        todo = [i for i, e in enumerate(entries) if e is None]
+        for i, entry in zip(todo, self._run_ocr([slides[i] for i in todo], workers)):
+            entries[i] = entry
+        if cache is not None:
+            # Unread slides (None) aren't cached: a transient error or a filter verdict made under
+            # other OCR_TEXT_FILTER / OCR_MAX_SIDE settings shouldn't be remembered as blank text
+            cache.store({hashes[i]: entries[i] for i in todo if i in hashes and entries[i] is not None})
+
+        results = {os.path.basename(path): entry["text"] if entry else "" for path, entry in zip(slides, entries)}
+        log_vision(f"OCR complete for all {len(slides)} slides ({sum(map(len, results.values()))} chars)")
         return results
+
+    def _run_ocr(self, slides: List[str], workers: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        if not slides:
+            return []
+        workers = settings.OCR_WORKERS if workers is None else workers
+        workers = max(1, min(workers, len(slides)))
+        batch_size = settings.OCR_BATCH_SIZE
+        log_vision(f"Running OCR on {len(slides)} slides ({workers} workers, batch {batch_size})")
+
+        if workers == 1:
+            # The reader is loaded lazily (or preloaded at startup) and kept across jobs
+            with reader_pool.acquire() as reader:
+                return _ocr_batched(reader, slides, batch_size)
+
+        # Contiguous chunks keep same-size slides together for batching
+        chunk = -(-len(slides) // workers)
+        chunks = [slides[i:i + chunk] for i in range(0, len(slides), chunk)]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a process that already holds torch state is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_ocr_worker,
+                                 initargs=(threads,)) as pool:
+            return [e for part in pool.map(_ocr_chunk, chunks, [batch_size] * len(chunks)) for e in part]
@@ -1,60 +1,250 @@
-import whisper
+import gc
 import torch
 import os
-from typing import Dict, Any, Optional
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
 from app.core.config import settings
+from app.services.asr import TranscriptionEngine, get_engine, parse_model_spec
+from app.services.vad import SAMPLE_RATE, read_wav, split_on_silence
+
+# Trailing text of one span passed as the initial prompt of the next
+STREAM_PROMPT_CHARS = 200
+
+# Per-process model for segmented transcription workers
+_worker_model = None
+
+
+def _init_worker(model_spec: str, device: str, num_threads: int):
+    global _worker_model
+    engine, model_name = parse_model_spec(model_spec)
+    # Split the cores between workers instead of every worker grabbing all of them
+    _worker_model = get_engine(engine, model_name, device=device, threads=num_threads)
+
+
+def _transcribe_span(audio_path: str, start: int, end: int, language: str) -> Dict[str, Any]:
+    audio = read_wav(audio_path, start, end)
+    return _worker_model.transcribe(audio, language=language)
+
+
+def _stitch(results: List[Dict[str, Any]], spans: List[Tuple[int, int]], language: str) -> Dict[str, Any]:
+    """Join per-span results, shifting segment timestamps by each span's offset."""
+    texts = []
+    segments = []
+    for result, (start, _) in zip(results, spans):
+        offset = start / SAMPLE_RATE
+        if result["text"].strip():
+            texts.append(result["text"].strip())
+        for seg in result.get("segments", []):
+            seg = dict(seg, id=len(segments), start=seg["start"] + offset, end=seg["end"] + offset)
+            if seg.get("words"):
+                seg["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in seg["words"]]
+            segments.append(seg)
+
+    return {
+        "text": " ".join(texts),
+        "segments": segments,
+        "language": results[0].get("language", language) if results else language,
+    }
+
 
 class WhisperService:
     _instance = None
-    _model = None
+    # ("engine:model", device) -> engine, least recently used first
+    _models: "OrderedDict[Tuple[str, str], TranscriptionEngine]" = OrderedDict()
+    # Keys being loaded right now; other callers for the same key wait on _cond
+    _loading: Set[Tuple[str, str]] = set()
+    _lock = threading.RLock()
+    _cond = threading.Condition(_lock)
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(WhisperService, cls).__new__(cls)
         return cls._instance
 
-    def load_model(self, model_name: str = settings.WHISPER_MODEL):
-        """Load the Whisper model if not already loaded."""
-        if self._model is None:
-            print(f"Loading Whisper model: {model_name}...")
-            # Force CPU - MPS has sparse tensor compatibility issues with Whisper
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            
-            self._model = whisper.load_model(model_name, device=device)
-            print(f"Whisper model loaded on {device}")
-        return self._model
+    @staticmethod
+    def _device() -> str:
+        # Force CPU - MPS has sparse tensor compatibility issues with Whisper
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _key(self, model_name: Optional[str], device: Optional[str]) -> Tuple[str, str]:
+        # "turbo" and "openai:turbo" are the same model
+        engine_name, name = parse_model_spec(model_name or settings.WHISPER_MODEL)
+        return f"{engine_name}:{name}", device or self._device()
+
+    def load_model(self, model_name: Optional[str] = None, device: Optional[str] = None) -> TranscriptionEngine:
+        """
+        Return the engine for `model_name` ("model" or "engine:model",
+        default settings.WHISPER_MODEL), loading it into the cache if needed.
+        Least recently used models are evicted once the cache exceeds
+        WHISPER_CACHE_MB; the model just loaded is always kept.
+
+        Loading happens outside the cache lock, so listing, evicting and
+        using other models isn't held up by a slow load; concurrent callers
+        for the same model wait for the one load.
+        """
+        key = self._key(model_name, device)
+        with self._cond:
+            while key in self._loading:
+                self._cond.wait()
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            self._loading.add(key)
+
+        try:
+            engine_name, name = key[0].split(":", 1)
+            print(f"Loading Whisper model: {name} (engine: {engine_name})...")
+            engine = get_engine(engine_name, name, device=key[1])
+        except Exception:
+            with self._cond:
+                self._loading.discard(key)
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            self._loading.discard(key)
+            self._models[key] = engine
+            print(f"Whisper model loaded on {key[1]} ({engine.memory_bytes() / 2**20:.0f} MB)")
+
+            budget = settings.WHISPER_CACHE_MB * 2**20
+            while len(self._models) > 1 and self._cache_bytes() > budget:
+                lru = next(iter(self._models))
+                self._unload(lru)
+            self._cond.notify_all()
+            return engine
 
-    def transcribe(self, audio_path: str, language: str = "en") -> Dict[str, Any]:
+    def evict(self, model_name: str, device: Optional[str] = None) -> bool:
+        """Drop a model from the cache. Returns False if it wasn't loaded."""
+        key = self._key(model_name, device)
+        with self._lock:
+            if key not in self._models:
+                return False
+            self._unload(key)
+            return True
+
+    def cached_models(self) -> List[Dict[str, Any]]:
+        """Loaded models ("engine:model"), least recently used first."""
+        with self._lock:
+            return [
+                {"model": spec, "device": device, "memoryBytes": engine.memory_bytes()}
+                for (spec, device), engine in self._models.items()
+            ]
+
+    def _cache_bytes(self) -> int:
+        return sum(engine.memory_bytes() for engine in self._models.values())
+
+    def _unload(self, key: Tuple[str, str]):
+        # A job still transcribing keeps its reference; memory is freed when it finishes
+        print(f"Evicting Whisper model: {key[0]} ({key[1]})")
+        del self._models[key]
+        gc.collect()
+        if key[1] == "cuda":
+            torch.cuda.empty_cache()
+
+    def transcribe(self, audio_path: str, language: str = "en",
+                   workers: Optional[int] = None, model: Optional[str] = None) -> Dict[str, Any]:
         """
         Transcribe audio file using Whisper.
-        
+
         Args:
             audio_path: Path to audio file
             language: Language code (default: 'en' for English)
                       Set to None for auto-detection
-        
+            workers: Worker processes for segmented transcription
+                     (default: settings.WHISPER_WORKERS; 1 = single pass)
+            model: Model spec, e.g. "turbo" or "ctranslate2:turbo"
+                   (default: settings.WHISPER_MODEL)
+
         Returns dict with 'text' and 'segments'.
         """
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
-        model = self.load_model()
+        workers = settings.WHISPER_WORKERS if workers is None else workers
+        if workers > 1:
+            return self.transcribe_segmented(audio_path, language, workers, model_name=model)
+
+        engine = self.load_model(model)
 
         print(f"[Whisper] Transcribing with language='{language}'...")
-        
+
         # Transcribe with explicit language to avoid wrong detection
-        # word_timestamps=True for better segmentation
-        result = model.transcribe(
-            audio_path,
-            language=language,
-            verbose=False,
-            task="transcribe",
-            # Improve accuracy with these settings
-            temperature=0.0,  # More deterministic
-            best_of=5,        # Sample multiple times
-            beam_size=5,      # Beam search
-            condition_on_previous_text=True,  # Use context
-        )
-        
+        result = engine.transcribe(audio_path, language=language)
+
         print(f"[Whisper] Transcription complete. Detected language: {result.get('language', 'unknown')}")
         return result
+
+    def transcribe_stream(self, audio_path: str, language: str = "en",
+                          start_offset: float = 0.0, model: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Transcribe span by span, yielding segments (with absolute timestamps)
+        as soon as each span is decoded.
+
+        The audio is cut at silences into spans of about
+        WHISPER_STREAM_SECONDS; the tail of each span's text primes the next
+        one so context carries across the cut. Pass `start_offset` (seconds)
+        to resume after the last segment an earlier run produced.
+        """
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        engine = self.load_model(model)
+        spans = split_on_silence(
+            audio_path,
+            target_seconds=settings.WHISPER_STREAM_SECONDS,
+            start_sample=int(start_offset * SAMPLE_RATE),
+        )
+        print(f"[Whisper] Streaming transcription of {len(spans)} spans from {start_offset:.1f}s...")
+
+        prompt = None
+        for start, end in spans:
+            if end - start < SAMPLE_RATE // 2:
+                continue  # Nothing useful in a sliver of audio
+            audio = read_wav(audio_path, start, end)
+            result = engine.transcribe(audio, language=language, initial_prompt=prompt)
+
+            offset = start / SAMPLE_RATE
+            for seg in result.get("segments", []):
+                yield dict(seg, start=seg["start"] + offset, end=seg["end"] + offset)
+
+            text = result["text"].strip()
+            if text:
+                prompt = text[-STREAM_PROMPT_CHARS:]
+
+    def transcribe_segmented(self, audio_path: str, language: str = "en", workers: int = 2,
+                             model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Split the audio at silences and transcribe the spans in parallel, one
+        engine per worker process. Timestamps are shifted back onto the
+        original timeline when the results are stitched together.
+
+        Expects the 16 kHz mono PCM WAV written by media prep.
+        """
+        spans = split_on_silence(audio_path, target_seconds=settings.WHISPER_SEGMENT_SECONDS)
+        workers = min(workers, len(spans))
+        if workers <= 1:
+            return self.transcribe(audio_path, language, workers=1, model=model_name)
+
+        model_spec = model_name or settings.WHISPER_MODEL
+        device = self._device()
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"[Whisper] Transcribing {len(spans)} segments across {workers} workers "
+              f"({threads} threads each)...")
+
+        # spawn: forking a process that already holds torch state is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(model_spec, device, threads)) as pool:
+            results = list(pool.map(
+                _transcribe_span,
+                [audio_path] * len(spans),
+                [start for start, _ in spans],
+                [end for _, end in spans],
+                [language] * len(spans),
+            ))
+
+        print(f"[Whisper] Segmented transcription complete ({len(spans)} segments)")
+        return _stitch(results, spans, language)
@@ -0,0 +1,13 @@
+import os
+import shutil
+
+
+def link_or_copy(src: str, dst: str):
+    """Hardlink `src` to `dst`, falling back to a copy across filesystems."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.remove(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
@@ -0,0 +1,44 @@
+import os
+from app.services.artifact_cache import ArtifactCache, cache_key, file_digest
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache")
+    key = cache_key("transcript", "abc", "turbo")
+    assert cache.get("transcript", key) is None
+
+    cache.put("transcript", key, {"text": "hello"})
+
+    assert cache.get("transcript", key) == {"text": "hello"}
+    assert not list((tmp_path / "cache" / "transcript").glob("*.part"))
+
+
+def test_put_copies_files(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache")
+    slide = tmp_path / "frame_0001.png"
+    slide.write_bytes(b"png")
+
+    cache.put("slides", "k", {"slides": ["frame_0001.png"]}, files=[str(slide)])
+
+    assert (cache.files_dir("slides", "k") / "frame_0001.png").read_bytes() == b"png"
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ArtifactCache(tmp_path / "cache")
+    (tmp_path / "cache" / "slides").mkdir(parents=True)
+    (tmp_path / "cache" / "slides" / "k.json").write_text('{"slid')
+    assert cache.get("slides", "k") is None
+
+
+def test_cache_key_depends_on_every_part():
+    assert cache_key("a", 1, ["en"]) == cache_key("a", 1, ["en"])
+    assert cache_key("a", 1, ["en"]) != cache_key("a", 2, ["en"])
+
+
+def test_file_digest_tracks_content(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"one")
+    first = file_digest(str(path))
+    path.write_bytes(b"two!")
+    os.utime(path, ns=(0, 10**9))
+    assert file_digest(str(path)) != first
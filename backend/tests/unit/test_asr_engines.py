@@ -0,0 +1,53 @@
+import sys
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from app.services.asr import ENGINES, TranscriptionEngine, get_engine, parse_model_spec
+from app.services.asr.benchmark import word_error_rate
+
+
+def test_engine_is_abstract():
+    with pytest.raises(TypeError):
+        TranscriptionEngine("tiny")
+
+
+def test_registry_has_engines():
+    assert {"openai", "ctranslate2"} <= set(ENGINES)
+
+
+def test_get_engine_unknown_raises():
+    with pytest.raises(KeyError):
+        get_engine("unknown_engine", "tiny")
+
+
+def test_parse_model_spec():
+    assert parse_model_spec("ctranslate2:small") == ("ctranslate2", "small")
+    assert parse_model_spec("turbo", default_engine="openai") == ("openai", "turbo")
+
+
+def test_ctranslate2_engine_returns_whisper_shaped_result():
+    segments = [
+        SimpleNamespace(start=0.0, end=2.0, text=" Hello", avg_logprob=-0.1, no_speech_prob=0.01),
+        SimpleNamespace(start=2.0, end=3.0, text=" world.", avg_logprob=-0.2, no_speech_prob=0.02),
+    ]
+    model = MagicMock()
+    model.transcribe.return_value = (iter(segments), SimpleNamespace(language="en"))
+    fake_module = SimpleNamespace(WhisperModel=MagicMock(return_value=model))
+
+    with patch.dict(sys.modules, {"faster_whisper": fake_module}):
+        engine = get_engine("ctranslate2", "small", device="cpu", threads=4)
+    result = engine.transcribe(np.zeros(16000, dtype=np.float32))
+
+    fake_module.WhisperModel.assert_called_once_with("small", device="cpu", compute_type="int8", cpu_threads=4)
+    assert result["text"] == " Hello world."
+    assert [(s["id"], s["start"], s["end"]) for s in result["segments"]] == [(0, 0.0, 2.0), (1, 2.0, 3.0)]
+    assert result["language"] == "en"
+    assert engine.memory_bytes() == 244_000_000  # int8: one byte per parameter
+
+
+def test_word_error_rate():
+    assert word_error_rate("the cat sat", "The cat sat.") == 0.0
+    # one substitution, one deletion
+    assert word_error_rate("the cat sat down", "the dog sat") == pytest.approx(0.5)
+    assert word_error_rate("", "") == 0.0
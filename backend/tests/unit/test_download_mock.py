@@ -1,8 +1,12 @@
 import pytest
+import httpx
 import asyncio
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.state import downloads, download_requests
+from app.services.downloader import VideoDownloader
+from app.services.hls import HLSSegment
 
 client = TestClient(app)
 
@@ -25,14 +29,24 @@ MOCK_DOWNLOAD_REQUEST = {
 }
 
 @pytest.fixture
-def mock_downloader():
-    with patch("app.api.v1.endpoints.download.VideoDownloader") as MockDownloader:
+def mock_downloader(tmp_path):
+    with patch("app.api.v1.endpoints.download.VideoDownloader") as MockDownloader, \
+         patch("app.api.v1.endpoints.download.settings.VIDEO_DIR", tmp_path):
         instance = MockDownloader.return_value
 
         # Mock async download_chunks
         async def async_download_success(*args, **kwargs):
             return True
         instance.download_chunks = MagicMock(side_effect=async_download_success)
+        instance.download_segments = MagicMock(side_effect=async_download_success)
+
+        # Mock playlist: ten 16-second segments
+        async def async_playlist(*args, **kwargs):
+            return [
+                HLSSegment(index=i, url=f"https://example.com/hls/data{i:06d}.ts", duration=16.0, start=i * 16.0)
+                for i in range(10)
+            ]
+        instance.fetch_playlist = MagicMock(side_effect=async_playlist)
 
         # Mock merge
         async def async_merge_success(*args, **kwargs):
@@ -59,3 +73,99 @@ def test_get_download_status(mock_downloader):
     status_data = response.json()
     assert status_data["downloadId"] == download_id
     assert status_data["status"] in ["pending", "downloading", "complete"]
+
+def test_resume_download(mock_downloader):
+    download_id = test_start_download(mock_downloader)
+    downloads[download_id].status = "error"
+
+    response = client.post(f"/api/v1/download/{download_id}/resume", json={
+        "streamInfo": {**MOCK_STREAM_INFO, "signature": "fresh_sig"}
+    })
+    assert response.status_code == 200
+    assert response.json()["message"] == "Download resumed"
+    assert download_requests[download_id].streamInfo.signature == "fresh_sig"
+    assert mock_downloader.download_segments.call_args[1]["signature"] == "fresh_sig"
+
+def test_resume_download_after_restart(mock_downloader):
+    download_id = test_start_download(mock_downloader)
+    # A restart loses the in-memory state; the request saved with the chunks remains
+    del downloads[download_id], download_requests[download_id]
+    mock_downloader.download_segments.reset_mock()
+
+    response = client.post(f"/api/v1/download/{download_id}/resume")
+    assert response.status_code == 200
+    assert download_requests[download_id].title == "Mock Lecture"
+    assert mock_downloader.download_segments.call_args[1]["signature"] == "mock_sig"
+    assert downloads[download_id].status == "complete"
+
+def test_resume_download_rejects_complete(mock_downloader):
+    download_id = test_start_download(mock_downloader)
+    assert downloads[download_id].status == "complete"
+
+    response = client.post(f"/api/v1/download/{download_id}/resume")
+    assert response.status_code == 400
+
+def test_resume_download_not_found():
+    response = client.post("/api/v1/download/missing/resume")
+    assert response.status_code == 404
+
+def test_download_uses_playlist_segments(mock_downloader):
+    test_start_download(mock_downloader)
+
+    segments = mock_downloader.download_segments.call_args[0][0]
+    # startTime=0, endTime=30 covers exactly the first two 16s segments
+    assert [seg.index for seg in segments] == [0, 1]
+    assert mock_downloader.download_segments.call_args[1]["stream_id"] == "https://example.com/master.m3u8"
+    mock_downloader.download_chunks.assert_not_called()
+
+def test_download_falls_back_to_chunk_probing(mock_downloader):
+    async def async_playlist_error(*args, **kwargs):
+        raise httpx.HTTPError("playlist unavailable")
+    mock_downloader.fetch_playlist.side_effect = async_playlist_error
+
+    test_start_download(mock_downloader)
+
+    mock_downloader.download_chunks.assert_called_once()
+    mock_downloader.download_segments.assert_not_called()
+
+def test_interrupted_download_can_be_resumed(tmp_path):
+    playlist = "#EXTM3U\n" + "".join(f"#EXTINF:16.0,\ndata{i:06d}.ts\n" for i in range(60)) + "#EXT-X-ENDLIST\n"
+    network = {"up_to": 40}
+
+    async def handler(request):
+        name = request.url.path.rsplit("/", 1)[1]
+        if name == "master.m3u8":
+            return httpx.Response(200, text=playlist)
+        index = int(name[4:10])
+        if index >= network["up_to"]:
+            raise httpx.ConnectError("network down")
+        return httpx.Response(200, content=f"chunk-{index}".encode())
+
+    merged = []
+
+    async def merge(self, start_chunk, end_chunk):
+        merged.append(sorted(int(p.stem) for p in self.chunks_dir.glob("*.ts")))
+        return str(self.output_dir / "full_video.mp4")
+
+    real_client = httpx.AsyncClient
+    transport = httpx.MockTransport(handler)
+    request = {**MOCK_DOWNLOAD_REQUEST, "startTime": None, "endTime": None}
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: real_client(transport=transport, **kw)), \
+         patch("app.services.downloader.asyncio.sleep", new=AsyncMock()), \
+         patch("app.api.v1.endpoints.download.settings.VIDEO_DIR", tmp_path), \
+         patch.object(VideoDownloader, "merge_chunks_to_video", merge):
+        download_id = client.post("/api/v1/download", json=request).json()["downloadId"]
+
+        # Stopped short: nothing merged, chunks and the saved request kept for resume
+        status = client.get(f"/api/v1/status/{download_id}").json()
+        assert status["status"] == "error"
+        assert merged == []
+        chunks_dir = tmp_path / "Mock Lecture" / "chunks"
+        assert (chunks_dir / "manifest.jsonl").exists() and (chunks_dir / "request.json").exists()
+
+        network["up_to"] = 60
+        assert client.post(f"/api/v1/download/{download_id}/resume").status_code == 200
+
+    assert client.get(f"/api/v1/status/{download_id}").json()["status"] == "complete"
+    assert merged == [list(range(60))]
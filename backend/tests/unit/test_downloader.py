@@ -0,0 +1,351 @@
+import asyncio
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.hls import HLSSegment
+from app.services.downloader import DownloadIncomplete, StreamingMerger, VideoDownloader, MAX_CONSECUTIVE_FAILURES, LOOKAHEAD_FACTOR
+
+REAL_ASYNC_CLIENT = httpx.AsyncClient
+REAL_SLEEP = asyncio.sleep
+
+
+def make_handler(last_chunk: int, stats: dict):
+    """Serve data000000.ts..data{last_chunk}.ts, 403 past the end, with jittered latency."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        chunk_id = int(request.url.path.rsplit("data", 1)[1].split(".")[0])
+        stats["in_flight"] += 1
+        stats["peak"] = max(stats["peak"], stats["in_flight"])
+        stats["requested"].append(chunk_id)
+        try:
+            await REAL_SLEEP(random.uniform(0, 0.01))
+            if chunk_id > last_chunk:
+                return httpx.Response(403)
+            return httpx.Response(200, content=f"chunk-{chunk_id}".encode())
+        finally:
+            stats["in_flight"] -= 1
+    return handler
+
+
+@pytest.fixture
+def stats():
+    return {"in_flight": 0, "peak": 0, "requested": []}
+
+
+def run_download(tmp_path, handler, **kwargs):
+    transport = httpx.MockTransport(handler)
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    progress = []
+    downloader.set_progress_callback(lambda cur, total, msg: progress.append(cur))
+
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: REAL_ASYNC_CLIENT(transport=transport, **kw)), \
+         patch("app.services.downloader.asyncio.sleep", new=AsyncMock()):
+        ok = asyncio.run(downloader.download_chunks(
+            base_url="https://example.com/hls/",
+            key_pair_id="k", policy="p", signature="s", **kwargs))
+    return ok, downloader, progress
+
+
+def test_download_chunks_keeps_window_in_flight(tmp_path, stats):
+    ok, downloader, progress = run_download(
+        tmp_path, make_handler(39, stats), start_chunk=0, end_chunk=39, concurrency=6)
+
+    assert ok
+    assert stats["peak"] == 6
+    files = sorted(p.name for p in downloader.chunks_dir.glob("*.ts"))
+    assert files == [f"{i:06d}.ts" for i in range(40)]
+    assert progress[-1] == 40
+
+
+def test_download_chunks_stops_at_end_of_stream(tmp_path, stats):
+    ok, downloader, _ = run_download(
+        tmp_path, make_handler(24, stats), start_chunk=0, end_chunk=200, concurrency=8)
+
+    assert ok
+    files = sorted(int(p.stem) for p in downloader.chunks_dir.glob("*.ts"))
+    assert files == list(range(25))
+    # Scheduling stops shortly after the failure run instead of probing to end_chunk
+    assert max(stats["requested"]) < 25 + MAX_CONSECUTIVE_FAILURES + 8 * LOOKAHEAD_FACTOR
+
+
+def test_download_chunks_tolerates_gap(tmp_path, stats):
+    base = make_handler(29, stats)
+
+    async def handler(request):
+        if "data000005.ts" in request.url.path:
+            return httpx.Response(500)
+        return await base(request)
+
+    ok, downloader, _ = run_download(
+        tmp_path, handler, start_chunk=0, end_chunk=29, concurrency=4)
+
+    assert ok
+    files = sorted(int(p.stem) for p in downloader.chunks_dir.glob("*.ts"))
+    assert files == [i for i in range(30) if i != 5]
+
+
+class BrokenStream(httpx.AsyncByteStream):
+    """Yields part of a body, then drops the connection."""
+
+    async def __aiter__(self):
+        yield b"x" * 1000
+        raise httpx.ReadError("connection reset")
+
+
+def test_stream_to_file_writes_large_body(tmp_path):
+    body = bytes(range(256)) * 1024  # 256 KiB, several write blocks
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    target = downloader.chunks_dir / "000000.ts"
+
+    async def fetch():
+        async with REAL_ASYNC_CLIENT(transport=transport) as client:
+            await downloader._stream_to_file(client, "https://example.com/a.ts", {}, target)
+
+    asyncio.run(fetch())
+    assert target.read_bytes() == body
+    assert not list(downloader.chunks_dir.glob("*.part"))
+
+
+def test_stream_to_file_leaves_nothing_on_truncated_body(tmp_path):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=BrokenStream()))
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    target = downloader.chunks_dir / "000000.ts"
+
+    async def fetch():
+        async with REAL_ASYNC_CLIENT(transport=transport) as client:
+            await downloader._stream_to_file(client, "https://example.com/a.ts", {}, target)
+
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(fetch())
+    assert list(downloader.chunks_dir.iterdir()) == []
+
+
+def test_download_chunks_resumes_from_manifest(tmp_path, stats):
+    calls = {"n": 0}
+    base = make_handler(29, stats)
+
+    async def flaky(request):
+        # First run: the network drops out after chunk 14
+        chunk_id = int(request.url.path.rsplit("data", 1)[1].split(".")[0])
+        if chunk_id >= 15:
+            raise httpx.ConnectError("network down")
+        return await base(request)
+
+    # Connection errors aren't the end of the stream: the run fails instead of looking done
+    with pytest.raises(DownloadIncomplete):
+        run_download(tmp_path, flaky, start_chunk=0, end_chunk=29, concurrency=4)
+
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    assert sorted(int(p.stem) for p in downloader.chunks_dir.glob("*.ts")) == list(range(15))
+    # Corrupt one finished chunk; it must be fetched again
+    (downloader.chunks_dir / "000003.ts").write_bytes(b"garbage")
+
+    stats["requested"].clear()
+    ok, downloader, _ = run_download(tmp_path, base, start_chunk=0, end_chunk=29, concurrency=4)
+
+    assert ok
+    assert sorted(stats["requested"]) == [3] + list(range(15, 30))
+    files = sorted(downloader.chunks_dir.glob("*.ts"), key=lambda p: int(p.stem))
+    assert [int(p.stem) for p in files] == list(range(30))
+    assert all(p.read_bytes() == f"chunk-{int(p.stem)}".encode() for p in files)
+
+
+def test_download_chunks_discards_manifest_for_other_stream(tmp_path, stats):
+    run_download(tmp_path, make_handler(9, stats), start_chunk=0, end_chunk=9, concurrency=4)
+    (tmp_path / "chunks" / "request.json").write_text("{}")
+
+    stats["requested"].clear()
+    transport = httpx.MockTransport(make_handler(9, stats))
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: REAL_ASYNC_CLIENT(transport=transport, **kw)):
+        asyncio.run(downloader.download_chunks(
+            base_url="https://example.com/other/", start_chunk=0, end_chunk=9,
+            key_pair_id="k", policy="p", signature="s"))
+
+    assert sorted(stats["requested"]) == list(range(10))
+    # The request saved for resume survives the reset
+    assert (tmp_path / "chunks" / "request.json").read_text() == "{}"
+
+
+def test_download_discards_media_prepared_from_previous_video(tmp_path, stats):
+    (tmp_path / "audio.wav").write_bytes(b"old audio")
+    (tmp_path / "frames").mkdir()
+    (tmp_path / "frames" / "frame_0001.png").write_bytes(b"old frame")
+
+    ok, _, _ = run_download(tmp_path, make_handler(4, stats), start_chunk=0, end_chunk=4)
+
+    assert ok
+    assert not (tmp_path / "audio.wav").exists()
+    assert not (tmp_path / "frames").exists()
+
+
+def test_merge_only_uses_chunks_in_the_requested_range(tmp_path, stats):
+    # Chunks 0-9 are left over from an earlier, wider download of the same stream
+    run_download(tmp_path, make_handler(9, stats), start_chunk=0, end_chunk=9)
+    ok, downloader, _ = run_download(tmp_path, make_handler(9, stats), start_chunk=3, end_chunk=5)
+    assert ok
+
+    with patch("app.services.downloader.ffmpeg"):
+        asyncio.run(downloader.merge_chunks_to_video(3, 5))
+
+    listed = (downloader.chunks_dir / "file_list.txt").read_text().splitlines()
+    assert listed == [f"file '{i:06d}.ts'" for i in range(3, 6)]
+
+
+def test_fetch_playlist_and_download_segments(tmp_path, stats):
+    master = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow/index.m3u8\n" \
+             "#EXT-X-STREAM-INF:BANDWIDTH=2500000\n720p/index.m3u8\n"
+    media = "#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:0\n" + "".join(
+        f"#EXTINF:16.0,\ndata{i:06d}.ts\n" for i in range(4)) + "#EXT-X-ENDLIST\n"
+    segment_handler = make_handler(3, stats)
+
+    async def handler(request):
+        path = request.url.path
+        assert request.url.params["Signature"] == "s"
+        if path == "/hls/master.m3u8":
+            return httpx.Response(200, text=master)
+        if path == "/hls/720p/index.m3u8":
+            return httpx.Response(200, text=media)
+        if path.startswith("/hls/720p/data"):
+            return await segment_handler(request)
+        return httpx.Response(404)
+
+    transport = httpx.MockTransport(handler)
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: REAL_ASYNC_CLIENT(transport=transport, **kw)):
+        async def run():
+            segments = await downloader.fetch_playlist(
+                "https://example.com/hls/master.m3u8", "k", "p", "s")
+            ok = await downloader.download_segments(
+                segments, stream_id="https://example.com/hls/master.m3u8",
+                key_pair_id="k", policy="p", signature="s")
+            return segments, ok
+        segments, ok = asyncio.run(run())
+
+    assert ok
+    assert [s.index for s in segments] == [0, 1, 2, 3]
+    # Exactly the playlist's segments are requested: no probing past the end
+    assert sorted(stats["requested"]) == [0, 1, 2, 3]
+    assert sorted(p.name for p in downloader.chunks_dir.glob("*.ts")) == [f"{i:06d}.ts" for i in range(4)]
+
+
+@pytest.mark.parametrize("missing", [{5}, set(range(12, 30))])
+def test_playlist_segments_that_fail_are_not_the_end(tmp_path, stats, missing):
+    # A 403 on a listed segment is an expired signature, not the end of the stream
+    base = make_handler(29, stats)
+
+    async def handler(request):
+        chunk_id = int(request.url.path.rsplit("data", 1)[1].split(".")[0])
+        if chunk_id in missing:
+            return httpx.Response(403)
+        return await base(request)
+
+    segments = [HLSSegment(index=i, url=f"https://example.com/hls/data{i:06d}.ts", duration=16.0, start=i * 16.0)
+                for i in range(30)]
+    transport = httpx.MockTransport(handler)
+    downloader = VideoDownloader(output_dir=str(tmp_path))
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: REAL_ASYNC_CLIENT(transport=transport, **kw)), \
+         patch("app.services.downloader.asyncio.sleep", new=AsyncMock()), \
+         pytest.raises(DownloadIncomplete):
+        asyncio.run(downloader.download_segments(
+            segments, stream_id="https://example.com/hls/index.m3u8",
+            key_pair_id="k", policy="p", signature="s", concurrency=4))
+
+    # What did arrive stays on disk for resume
+    files = sorted(int(p.stem) for p in downloader.chunks_dir.glob("*.ts"))
+    assert set(range(min(missing))) <= set(files)
+    assert not set(files) & missing
+
+
+def make_ts_segments(tmp_path, count: int):
+    """Encode a short test clip and cut it into real MPEG-TS segments."""
+    import subprocess
+    src = tmp_path / "src"
+    src.mkdir()
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=10",
+        "-f", "lavfi", "-i", "sine=frequency=440", "-t", str(count), "-c:v", "libx264",
+        "-g", "10", "-c:a", "aac", "-f", "hls", "-hls_time", "1", "-hls_list_size", "0",
+        "-hls_segment_filename", str(src / "data%06d.ts"), str(src / "index.m3u8"),
+    ], check=True)
+    return {p.name: p.read_bytes() for p in src.glob("data*.ts")}
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("prepare_media", [False, True])
+def test_streaming_merge_remuxes_while_downloading(tmp_path, prepare_media):
+    import ffmpeg
+    segments = make_ts_segments(tmp_path, 6)
+    peak_on_disk = {"n": 0}
+    out_dir = tmp_path / "out"
+
+    async def handler(request):
+        name = request.url.path.rsplit("/", 1)[1]
+        await REAL_SLEEP(random.uniform(0, 0.01))
+        on_disk = len(list((out_dir / "chunks").glob("*.ts")))
+        peak_on_disk["n"] = max(peak_on_disk["n"], on_disk)
+        if name not in segments:
+            return httpx.Response(403)
+        return httpx.Response(200, content=segments[name])
+
+    transport = httpx.MockTransport(handler)
+    downloader = VideoDownloader(output_dir=str(out_dir), streaming_merge=True, prepare_media=prepare_media)
+    with patch("app.services.downloader.httpx.AsyncClient",
+               side_effect=lambda **kw: REAL_ASYNC_CLIENT(transport=transport, **kw)), \
+         patch("app.services.downloader.asyncio.sleep", new=AsyncMock()):
+        async def run():
+            ok = await downloader.download_chunks(
+                base_url="https://example.com/hls/", start_chunk=0, end_chunk=len(segments) - 1,
+                key_pair_id="k", policy="p", signature="s", concurrency=3)
+            return ok, await downloader.merge_chunks_to_video(0, len(segments) - 1)
+        ok, video_path = asyncio.run(run())
+
+    assert ok
+    assert video_path == str(out_dir / "full_video.mp4")
+    assert not (out_dir / "chunks").exists()
+    duration = float(ffmpeg.probe(video_path)["format"]["duration"])
+    assert duration == pytest.approx(len(segments), abs=0.5)
+    assert peak_on_disk["n"] < len(segments)
+    if prepare_media:
+        audio = ffmpeg.probe(str(out_dir / "audio.wav"))["streams"][0]
+        assert (audio["sample_rate"], audio["channels"]) == ("16000", 1)
+        assert list((out_dir / "frames").glob("frame_*.png"))
+        assert not list(out_dir.glob("*.part"))
+
+
+def test_streaming_merger_survives_chatty_ffmpeg_stderr(tmp_path):
+    # Stand-in for ffmpeg that logs far more than a pipe buffer before reading its input
+    output = tmp_path / "full_video.mp4"
+    script = ("import sys; sys.stderr.buffer.write(b'corrupt packet\\n' * 20000); sys.stderr.flush(); "
+              f"open({str(output)!r}, 'wb').write(sys.stdin.buffer.read())")
+    chunks = []
+    for i in range(4):
+        chunk = tmp_path / f"{i:06d}.ts"
+        chunk.write_bytes(bytes([i]) * 256 * 1024)
+        chunks.append(chunk)
+
+    merger = StreamingMerger(output)
+    with patch("app.services.downloader.ffmpeg") as fake_ffmpeg:
+        chain = fake_ffmpeg.merge_outputs.return_value.global_args.return_value.overwrite_output.return_value
+        chain.run_async.side_effect = lambda **kw: subprocess.Popen(
+            [sys.executable, "-c", script], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        merger.start()
+
+    result = {}
+    worker = threading.Thread(target=lambda: [merger.append(c) for c in chunks] and result.update(ok=merger.finish()))
+    worker.start()
+    worker.join(30)
+    if worker.is_alive():
+        merger.abort()
+        pytest.fail("merger blocked on ffmpeg's stderr")
+    assert result["ok"]
+    assert output.stat().st_size == 4 * 256 * 1024
@@ -0,0 +1,65 @@
+import pytest
+from app.services.hls import (
+    is_master_playlist, parse_master_playlist, parse_media_playlist, select_segments,
+)
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720
+720p/index.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:16
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:16.000000,
+data000000.ts
+#EXTINF:16.000000,
+data000001.ts
+#EXTINF:15.500000,
+data000002.ts
+#EXTINF:4.250000,
+https://cdn.example.com/other/data000003.ts
+#EXT-X-ENDLIST
+"""
+
+
+def test_parse_master_playlist():
+    assert is_master_playlist(MASTER)
+    assert not is_master_playlist(MEDIA)
+    variants = parse_master_playlist(MASTER, "https://example.com/hls/master.m3u8")
+    assert [(v.bandwidth, v.url) for v in variants] == [
+        (800000, "https://example.com/hls/360p/index.m3u8"),
+        (2500000, "https://example.com/hls/720p/index.m3u8"),
+    ]
+
+
+def test_parse_media_playlist():
+    segments = parse_media_playlist(MEDIA, "https://example.com/hls/index.m3u8?sig=x")
+    assert [s.index for s in segments] == [0, 1, 2, 3]
+    assert segments[0].url == "https://example.com/hls/data000000.ts"
+    assert segments[3].url == "https://cdn.example.com/other/data000003.ts"
+    assert [s.start for s in segments] == [0.0, 16.0, 32.0, 47.5]
+    assert segments[3].duration == 4.25
+
+
+def test_parse_media_playlist_uses_media_sequence():
+    text = MEDIA.replace("#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-MEDIA-SEQUENCE:37")
+    segments = parse_media_playlist(text, "https://example.com/hls/index.m3u8")
+    assert [s.index for s in segments] == [37, 38, 39, 40]
+
+
+def test_parse_media_playlist_rejects_non_playlist():
+    with pytest.raises(ValueError):
+        parse_media_playlist("<html>Access denied</html>", "https://example.com/index.m3u8")
+
+
+def test_select_segments_by_time():
+    segments = parse_media_playlist(MEDIA, "https://example.com/hls/index.m3u8")
+    assert [s.index for s in select_segments(segments)] == [0, 1, 2, 3]
+    assert [s.index for s in select_segments(segments, 16, 32)] == [1]
+    assert [s.index for s in select_segments(segments, 20, 48)] == [1, 2, 3]
+    assert [s.index for s in select_segments(segments, end_time=0.5)] == [0]
+    assert select_segments(segments, start_time=100) == []
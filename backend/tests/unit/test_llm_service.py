@@ -1,16 +1,30 @@
+import re
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.llm_service import LLMService
+from app.services import llm_service
+from app.services.llm.tokens import estimate_tokens
+from app.services.llm_service import LLMService, NotesGenerationError
 
 
 @pytest.fixture
 def mock_provider():
     provider = MagicMock()
     provider.provider_name = "mock"
+    provider.max_concurrency = 4
+    provider.context_length.return_value = 8192
     provider.generate_text.return_value = "Mock LLM response"
     return provider
 
 
+@pytest.fixture(autouse=True)
+def offline_tokenizer():
+    # Deterministic counts, and no tiktoken download
+    with patch.object(llm_service, "count_tokens", estimate_tokens):
+        yield
+
+
 @pytest.fixture
 def service(mock_provider):
     with patch("app.services.llm_service.config_store") as mock_store:
@@ -33,10 +47,132 @@ def test_chunk_text_short(service):
 
 def test_chunk_text_long(service):
     long_text = "word " * 5000
-    chunks = service._chunk_text(long_text)
+    chunks = service._chunk_text(long_text, max_tokens=1000)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk) <= 1000
+
+
+def test_chunk_budget_follows_model_context(service, mock_provider):
+    small = service._chunk_tokens()
+    mock_provider.context_length.return_value = 128_000
+    assert service._chunk_tokens() - small == 128_000 - 8192
+    assert small < 8192 - llm_service.settings.LLM_OUTPUT_TOKENS
+
+    # Fewer, fuller chunks on the bigger model
+    transcript = "This is a sentence about graphs. " * 3000
+    mock_provider.context_length.return_value = 8192
+    assert len(service._chunk_text(transcript)) > len(service._chunk_text(transcript, max_tokens=20_000))
+
+
+def test_chunks_break_between_segments_with_overlap(service):
+    segments = [f"segment {i} " + "x" * 60 for i in range(40)]
+    with patch.object(llm_service.settings, "LLM_CHUNK_OVERLAP_TOKENS", 40):
+        chunks = service._chunk_text(" ".join(segments), segments, max_tokens=200)
+
     assert len(chunks) > 1
     for chunk in chunks:
-        assert len(chunk) <= service.chunk_size + 500
+        assert estimate_tokens(chunk) <= 200
+        # Whole segments only
+        assert chunk.startswith("segment ") and chunk.endswith("x")
+    # Every segment is covered, and each chunk repeats the previous chunk's last segment
+    assert all(any(seg in c for c in chunks) for seg in segments)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev.rsplit("segment", 1)[1] in nxt
+
+
+def chunk_number(prompt):
+    return int(re.search(r"part (\d+) of", prompt).group(1))
+
+
+def test_knowledge_base_extracts_chunks_concurrently_in_order(service, mock_provider):
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+
+    def generate(prompt, model=None, system=None):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        n = chunk_number(prompt)
+        time.sleep(0.01 * (n % 3))  # Finish out of order
+        with lock:
+            in_flight -= 1
+        return f"knowledge {n}"
+
+    mock_provider.generate_text.side_effect = generate
+    chunks = [f"chunk {i}" for i in range(10)]
+    with patch.object(service, "_chunk_tokens", return_value=1), \
+         patch.object(service, "_chunk_text", return_value=chunks):
+        kb = service._build_knowledge_base("transcript")
+
+    assert 1 < peak <= mock_provider.max_concurrency
+    sections = re.findall(r"## Section (\d+)\nknowledge (\d+)", kb)
+    assert sections == [(str(i), str(i)) for i in range(1, 11)]
+
+
+def test_failed_chunk_is_retried_alone(service, mock_provider):
+    failures = {2: 1, 3: 5}  # Chunk 2 fails once, chunk 3 every time
+
+    def generate(prompt, model=None, system=None):
+        n = chunk_number(prompt)
+        if failures.get(n, 0) > 0:
+            failures[n] -= 1
+            raise RuntimeError("timeout")
+        return f"knowledge {n}"
+
+    mock_provider.generate_text.side_effect = generate
+    with patch.object(service, "_chunk_tokens", return_value=1), \
+         patch.object(service, "_chunk_text", return_value=["a", "b", "c"]), \
+         patch.object(llm_service.settings, "LLM_RETRIES", 2), \
+         patch.object(llm_service.time, "sleep") as sleep:
+        kb = service._build_knowledge_base("transcript")
+
+    assert "knowledge 1" in kb and "knowledge 2" in kb
+    assert "[Error processing chunk 3]" in kb
+    calls = [chunk_number(c.args[0]) for c in mock_provider.generate_text.call_args_list]
+    assert sorted(calls) == [1, 2, 2, 3, 3, 3]
+    assert sleep.call_count == 3
+
+
+def test_long_knowledge_base_is_tree_reduced_to_budget(service, mock_provider):
+    merges = []
+    lock = threading.Lock()
+
+    def generate(prompt, model=None, system=None):
+        if system == llm_service.MERGE_SYSTEM_PROMPT:
+            titles = re.findall(r"^## (Sections? [\d-]+)", prompt, re.M)
+            with lock:
+                merges.append(titles)
+            return "merged " + " + ".join(titles) + " point" * 120  # Still too long together after level 1
+        return f"knowledge {chunk_number(prompt)} " + "detail " * 150  # ~250 tokens each
+
+    mock_provider.generate_text.side_effect = generate
+    chunks = [f"chunk {i}" for i in range(16)]
+    with patch.object(service, "_chunk_tokens", return_value=1000), \
+         patch.object(service, "_chunk_text", return_value=chunks), \
+         patch.object(llm_service.settings, "LLM_KNOWLEDGE_TOKENS", 600):
+        kb = service._build_knowledge_base("x" * 10_000, slides_context="Slide 1: Intro")
+
+    # Level 1 merges neighbours three at a time; later levels merge its output, in order
+    assert merges[0] == ["Section 1", "Section 2", "Section 3"]
+    assert ["Sections 4-6", "Sections 7-9"] in [m[i:i + 2] for m in merges for i in range(len(m))]
+    titles = re.findall(r"^## Sections (\d+)-(\d+)", kb, re.M)
+    assert len(titles) < 6
+    assert titles[0][0] == "1" and titles[-1][1] == "16"
+    assert all(int(a[1]) + 1 == int(b[0]) for a, b in zip(titles, titles[1:]))
+    assert estimate_tokens(kb) <= 600 + estimate_tokens("\n\n## Slide Text (OCR):\nSlide 1: Intro")
+    assert kb.endswith("## Slide Text (OCR):\nSlide 1: Intro")
+
+
+def test_knowledge_base_within_budget_is_not_reduced(service, mock_provider):
+    mock_provider.generate_text.side_effect = lambda prompt, model=None, system=None: "short"
+    with patch.object(service, "_chunk_tokens", return_value=1000), \
+         patch.object(service, "_chunk_text", return_value=["a", "b", "c"]):
+        kb = service._build_knowledge_base("x" * 10_000)
+
+    assert mock_provider.generate_text.call_count == 3
+    assert re.findall(r"^## (Section \d+)", kb, re.M) == ["Section 1", "Section 2", "Section 3"]
 
 
 def test_generate_notes_returns_four_keys(service, mock_provider):
@@ -56,8 +192,64 @@ def test_generate_notes_with_model_override(service, mock_provider):
 
 def test_generate_notes_with_slides_context(service, mock_provider):
     service.generate_notes("transcript", slides_context="Slide 1: Intro")
-    prompts = [call[0][0] for call in mock_provider.generate_text.call_args_list]
-    assert any("Slide" in p for p in prompts)
+    systems = [call[1]["system"] for call in mock_provider.generate_text.call_args_list]
+    assert all("Slide 1: Intro" in s for s in systems)
+
+
+def test_notes_prompts_share_the_knowledge_base_prefix(service, mock_provider):
+    service.generate_notes("the lecture transcript")
+    calls = mock_provider.generate_text.call_args_list
+    systems = {call[1]["system"] for call in calls}
+    assert len(systems) == 1
+    assert systems.pop().endswith("the lecture transcript")
+    # Only the task differs, and it comes after the shared prefix
+    prompts = [call[0][0] for call in calls]
+    assert len(set(prompts)) == 4
+    assert not any("the lecture transcript" in p for p in prompts)
+
+
+def test_notes_prompts_run_concurrently(service, mock_provider):
+    # Every prompt waits for all four to be in flight; run serially, this would time out
+    all_started = threading.Barrier(4, timeout=5)
+
+    def generate(prompt, model=None, system=None):
+        all_started.wait()
+        return "ok"
+
+    mock_provider.generate_text.side_effect = generate
+    result = service.generate_notes("transcript")
+    assert list(result) == ["notes", "summary", "qa", "announcements"]
+
+
+def test_failed_notes_artifact_does_not_sink_the_others(service, mock_provider):
+    def generate(prompt, model=None, system=None):
+        if "flashcards" in prompt:
+            raise RuntimeError("server error")
+        return "ok"
+
+    mock_provider.generate_text.side_effect = generate
+    with patch.object(llm_service.time, "sleep"), pytest.raises(NotesGenerationError) as excinfo:
+        service.generate_notes("transcript")
+
+    assert excinfo.value.results == {"notes": "ok", "summary": "ok", "announcements": "ok"}
+    assert list(excinfo.value.errors) == ["qa"]
+    assert excinfo.value.knowledge_base
+
+
+def test_retry_with_knowledge_base_skips_map_reduce(service, mock_provider):
+    with patch.object(service, "_build_knowledge_base") as build:
+        result = service.generate_notes("transcript", artifacts=["qa"], knowledge_base="saved kb")
+
+    build.assert_not_called()
+    assert result == {"qa": "Mock LLM response"}
+    assert "saved kb" in mock_provider.generate_text.call_args[1]["system"]
+
+
+def test_generate_notes_only_requested_artifacts(service, mock_provider):
+    result = service.generate_notes("transcript", artifacts=["qa"])
+    assert result == {"qa": "Mock LLM response"}
+    assert mock_provider.generate_text.call_count == 1
+    assert service.generate_notes("transcript", artifacts=[]) == {}
 
 
 def test_list_models_delegates(service, mock_provider):
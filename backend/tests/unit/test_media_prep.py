@@ -0,0 +1,86 @@
+import shutil
+import ffmpeg
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+from app.services.media_prep import (
+    find_prepared_media, frame_sampling_params, media_outputs, prepare_media, settings, stream_frames,
+)
+
+
+def test_media_outputs_single_decode(tmp_path):
+    stream = ffmpeg.input("pipe:", format="mpegts")
+    args = ffmpeg.merge_outputs(*media_outputs(stream, tmp_path / "audio.wav", tmp_path / "frames", 10)).compile()
+
+    # One input, two outputs: 16 kHz mono PCM and fps-sampled frames
+    assert args.count("-i") == 1
+    assert "pcm_s16le" in args and "16k" in args
+    assert any("fps=fps=0.1" in a for a in args)
+    assert str(tmp_path / "frames" / "frame_%04d.png") in args
+
+
+def test_scene_sampling_filter(tmp_path):
+    stream = ffmpeg.input("video.mp4")
+    with patch.object(settings, "FRAME_SAMPLING", "scene"):
+        args = ffmpeg.merge_outputs(*media_outputs(stream, None, tmp_path / "frames")).compile()
+        params = frame_sampling_params()
+
+    graph = args[args.index("-filter_complex") + 1]
+    assert "gt(scene\\,0.1)" in graph
+    assert f"gte(t-prev_selected_t\\,{settings.FRAME_MAX_GAP})" in graph
+    assert params[0] == "scene"
+    # An explicit interval always means fixed-interval sampling
+    assert frame_sampling_params(5) == ["interval", 5]
+
+
+def make_slides_video(path: Path, audio: bool = False):
+    """5s red, 1s blue, 8s green (plus a tone if `audio`)."""
+    colors = ";".join(
+        f"color=c={c}:s=320x240:d={d},format=yuv420p[v{i}]"
+        for i, (c, d) in enumerate([("red", 5), ("blue", 1), ("green", 8)])
+    )
+    inputs = [ffmpeg.input(f"{colors};[v0][v1][v2]concat=n=3:v=1:a=0", f="lavfi")]
+    if audio:
+        inputs.append(ffmpeg.input("sine=frequency=440:duration=14", f="lavfi"))
+    ffmpeg.output(*inputs, str(path), r=25, loglevel="error").run()
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_scene_sampling_catches_short_slides(tmp_path):
+    video = tmp_path / "slides.mp4"
+    make_slides_video(video)
+
+    with patch.object(settings, "FRAME_SAMPLING", "scene"):
+        frames = prepare_media(str(video), frames_dir=tmp_path / "frames")
+
+    # One frame per slide, including the 1-second one a 10s interval would miss
+    assert len(frames) == 3
+
+
+def test_find_prepared_media(tmp_path):
+    video = tmp_path / "full_video.mp4"
+    video.touch()
+    assert find_prepared_media(str(video)) == (None, None)
+
+    (tmp_path / "frames").mkdir()
+    assert find_prepared_media(str(video)) == (None, None)  # empty frames dir doesn't count
+
+    (tmp_path / "audio.wav").touch()
+    (tmp_path / "frames" / "frame_0001.png").touch()
+    assert find_prepared_media(str(video)) == (tmp_path / "audio.wav", tmp_path / "frames")
+
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None, reason="ffmpeg not installed")
+def test_stream_frames_pipes_rgb_and_writes_audio(tmp_path):
+    video = tmp_path / "slides.mp4"
+    make_slides_video(video, audio=True)
+
+    with patch.object(settings, "FRAME_SAMPLING", "scene"):
+        frames = list(stream_frames(str(video), audio_path=tmp_path / "audio.wav"))
+
+    assert len(frames) == 3
+    assert frames[0].shape == (240, 320, 3)
+    assert frames[0][120, 160, 0] > 200  # red
+    assert (tmp_path / "audio.wav").exists()
+    assert not (tmp_path / "audio.wav.part").exists()
+    assert not list(tmp_path.glob("*.png"))
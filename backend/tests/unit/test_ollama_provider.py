@@ -16,7 +16,17 @@ def test_generate_text(mock_ollama):
     provider = OllamaProvider()
     result = provider.generate_text("Say hello", model="test-model")
     assert result == "Hello world"
-    mock_ollama.generate.assert_called_once_with(model="test-model", prompt="Say hello")
+    mock_ollama.generate.assert_called_once_with(model="test-model", prompt="Say hello", keep_alive="30m", options={"num_ctx": 8192})
+
+
+@patch("app.services.llm.ollama_provider.ollama")
+def test_generate_text_with_system_prefix(mock_ollama):
+    mock_ollama.generate.return_value = {"response": "Notes"}
+    provider = OllamaProvider()
+    provider.generate_text("Write notes", model="m", system="Knowledge base")
+    mock_ollama.generate.assert_called_once_with(
+        model="m", prompt="Write notes", keep_alive="30m", options={"num_ctx": 8192}, system="Knowledge base"
+    )
 
 
 @patch("app.services.llm.ollama_provider.ollama")
@@ -25,7 +35,7 @@ def test_generate_text_uses_default_model(mock_ollama):
     provider = OllamaProvider()
     provider.default_model = "my-model"
     result = provider.generate_text("prompt")
-    mock_ollama.generate.assert_called_once_with(model="my-model", prompt="prompt")
+    mock_ollama.generate.assert_called_once_with(model="my-model", prompt="prompt", keep_alive="30m", options={"num_ctx": 8192})
 
 
 @patch("app.services.llm.ollama_provider.ollama")
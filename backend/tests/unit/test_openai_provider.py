@@ -29,6 +29,23 @@ def test_generate_text(MockOpenAI):
     )
 
 
+@patch("app.services.llm.openai_provider.OpenAI")
+def test_generate_text_puts_system_message_first(MockOpenAI):
+    mock_client = MagicMock()
+    mock_choice = MagicMock()
+    mock_choice.message.content = "Notes"
+    mock_client.chat.completions.create.return_value = MagicMock(choices=[mock_choice])
+    MockOpenAI.return_value = mock_client
+
+    provider = OpenAIProvider(api_key="sk-test")
+    provider.generate_text("Write notes", system="Knowledge base")
+    call_kwargs = mock_client.chat.completions.create.call_args[1]
+    assert call_kwargs["messages"] == [
+        {"role": "system", "content": "Knowledge base"},
+        {"role": "user", "content": "Write notes"},
+    ]
+
+
 @patch("app.services.llm.openai_provider.OpenAI")
 def test_generate_text_uses_default_model(MockOpenAI):
     mock_client = MagicMock()
@@ -127,3 +144,12 @@ def test_generate_text_raises_after_max_retries(MockOpenAI, mock_time):
     with pytest.raises(RateLimitError):
         provider.generate_text("prompt", model="gpt-4o")
     assert mock_client.chat.completions.create.call_count == 3
+
+
+def test_context_length_by_model():
+    with patch("app.services.llm.openai_provider.OpenAI"):
+        provider = OpenAIProvider(api_key="sk-test", default_model="gpt-4o-mini")
+    assert provider.context_length() == 128_000
+    assert provider.context_length("gpt-4.1-mini") == 1_047_576
+    assert provider.context_length("gpt-4-0613") == 8_192
+    assert provider.context_length("some-new-model") == 128_000
@@ -0,0 +1,286 @@
+import json
+import threading
+from pathlib import Path
+import pytest
+from unittest.mock import ANY, MagicMock, patch
+from app.services.llm_service import NOTES_ARTIFACTS, NotesGenerationError
+from app.services.pipeline import ProcessingPipeline
+
+ALL_NOTES = list(NOTES_ARTIFACTS)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    with patch("app.services.pipeline.WhisperService"), \
+         patch("app.services.pipeline.VisionService"), \
+         patch("app.services.pipeline.LLMService"):
+        p = ProcessingPipeline(output_base=str(tmp_path / "output"))
+    p.vision_service.hash_frames.return_value = {}
+    p.llm_service.generate_notes.return_value = {
+        "notes": "n", "summary": "s", "qa": "q", "announcements": "a",
+    }
+    video = tmp_path / "videos" / "Lecture" / "full_video.mp4"
+    video.parent.mkdir(parents=True)
+    video.touch()
+    p.video_path = str(video)
+    with patch("app.services.pipeline.prepare_media", return_value=["frame_0001.png"]) as prep, \
+         patch("app.services.pipeline.wav_duration", return_value=60.0), \
+         patch("app.services.pipeline.settings.FRAME_PIPE", False):
+        p.mock_prepare_media = prep
+        yield p
+
+
+def segments(*texts, length=10.0, start=0.0):
+    return [
+        {"start": start + i * length, "end": start + (i + 1) * length, "text": f" {t}"}
+        for i, t in enumerate(texts)
+    ]
+
+
+def test_audio_and_vision_branches_run_concurrently(pipeline):
+    # Each branch blocks until the other has started; a sequential pipeline
+    # would time out here.
+    both_started = threading.Barrier(2, timeout=5)
+
+    def transcribe_stream(path, start_offset=0.0, model=None):
+        both_started.wait()
+        yield from segments("hello", "world")
+
+    def deduplicate_slides(frames_dir, hashes=None):
+        both_started.wait()
+        return ["slide_1.png"]
+
+    pipeline.whisper_service.transcribe_stream.side_effect = transcribe_stream
+    pipeline.vision_service.deduplicate_slides.side_effect = deduplicate_slides
+    pipeline.vision_service.ocr_slides.return_value = {"slide_1.png": "Intro"}
+
+    result = pipeline.process(pipeline.video_path, "Lecture")
+
+    pipeline.llm_service.generate_notes.assert_called_once_with(
+        "hello world", "[Slide slide_1.png]: Intro", artifacts=ALL_NOTES, segments=["hello", "world"],
+        knowledge_base=None
+    )
+    assert result["transcript_len"] == len("hello world")
+
+
+def test_branch_failure_is_raised(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("t")
+    pipeline.vision_service.deduplicate_slides.side_effect = RuntimeError("bad frame")
+
+    with pytest.raises(RuntimeError, match="bad frame"):
+        pipeline.process(pipeline.video_path, "Lecture")
+    pipeline.llm_service.generate_notes.assert_not_called()
+
+
+def test_progress_merges_branches(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("t")
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+    updates = []
+    pipeline.set_progress_callback(lambda stage, cur, total, msg: updates.append((stage, cur, msg)))
+
+    pipeline.process(pipeline.video_path, "Lecture")
+
+    analysis = [u for u in updates if u[0] == "analysis"]
+    assert analysis[-1][1] == 100
+    assert [cur for _, cur, _ in analysis] == sorted(cur for _, cur, _ in analysis)
+    assert updates[-1][0] == "complete"
+
+
+def test_media_is_decoded_once_for_both_branches(pipeline, tmp_path):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("t")
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+
+    result = pipeline.process(pipeline.video_path, "Lecture")
+
+    pipeline.mock_prepare_media.assert_called_once()
+    kwargs = pipeline.mock_prepare_media.call_args[1]
+    output_dir = Path(result["output_dir"])
+    assert kwargs == {"audio_path": output_dir / "audio.wav", "frames_dir": output_dir / "frames"}
+    pipeline.vision_service.extract_frames.assert_not_called()
+    pipeline.whisper_service.transcribe_stream.assert_called_once_with(str(output_dir / "audio.wav"), start_offset=0.0, model="turbo")
+
+
+def test_download_time_media_skips_decode(pipeline):
+    video_dir = Path(pipeline.video_path).parent
+    (video_dir / "audio.wav").touch()
+    (video_dir / "frames").mkdir()
+    (video_dir / "frames" / "frame_0001.png").touch()
+    pipeline.whisper_service.transcribe_stream.return_value = segments("t")
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+
+    pipeline.process(pipeline.video_path, "Lecture")
+
+    pipeline.mock_prepare_media.assert_not_called()
+    pipeline.whisper_service.transcribe_stream.assert_called_once_with(str(video_dir / "audio.wav"), start_offset=0.0, model="turbo")
+
+
+def test_transcript_segments_are_written_as_they_arrive(pipeline):
+    on_disk = []
+
+    def transcribe_stream(path, start_offset=0.0, model=None):
+        transcript = Path(path).parent / "transcript.jsonl"
+        for seg in segments("one", "two", "three", length=20.0):
+            on_disk.append(len(transcript.read_text().splitlines()))
+            yield seg
+
+    pipeline.whisper_service.transcribe_stream.side_effect = transcribe_stream
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+    messages = []
+    pipeline.set_progress_callback(lambda stage, cur, total, msg: messages.append(msg))
+
+    result = pipeline.process(pipeline.video_path, "Lecture")
+
+    assert on_disk == [0, 1, 2]
+    output_dir = Path(result["output_dir"])
+    lines = (output_dir / "transcript.jsonl").read_text().splitlines()
+    assert [json.loads(l) for l in lines] == [
+        {"start": 0.0, "end": 20.0, "text": "one"},
+        {"start": 20.0, "end": 40.0, "text": "two"},
+        {"start": 40.0, "end": 60.0, "text": "three"},
+    ]
+    assert (output_dir / "transcript.txt").read_text() == "one two three"
+    assert any("40s / 60s" in m for m in messages)
+
+
+def test_transcription_resumes_after_last_segment(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("three", length=20.0, start=40.0)
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+    output_dir = pipeline.output_base / "resume"
+    output_dir.mkdir(parents=True)
+    done = [json.dumps(dict(r, text=r["text"].strip())) for r in segments("one", "two", length=20.0)]
+    # Second record was torn mid-write by the interruption
+    (output_dir / "transcript.jsonl").write_text(done[0] + "\n" + done[1] + "\n" + '{"start": 40')
+    (output_dir / "transcript.jsonl.meta").write_text("key-1")
+
+    with patch.object(pipeline, "_update_branch_progress"):
+        records = pipeline._transcribe_incremental(output_dir / "audio.wav", output_dir, "key-1")
+
+    pipeline.whisper_service.transcribe_stream.assert_called_once_with(
+        str(output_dir / "audio.wav"), start_offset=40.0, model="turbo"
+    )
+    assert [r["end"] for r in records] == [20.0, 40.0, 60.0]
+    lines = (output_dir / "transcript.jsonl").read_text().splitlines()
+    assert [json.loads(l)["text"] for l in lines] == ["one", "two", "three"]
+
+
+def test_transcript_from_other_audio_or_model_is_not_resumed(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("new", length=20.0)
+    output_dir = pipeline.output_base / "resume"
+    output_dir.mkdir(parents=True)
+    (output_dir / "transcript.jsonl").write_text(json.dumps({"start": 0.0, "end": 60.0, "text": "OLD"}) + "\n")
+    (output_dir / "transcript.jsonl.meta").write_text("key-of-earlier-run")
+
+    with patch.object(pipeline, "_update_branch_progress"):
+        records = pipeline._transcribe_incremental(output_dir / "audio.wav", output_dir, "key-2")
+
+    pipeline.whisper_service.transcribe_stream.assert_called_once_with(
+        str(output_dir / "audio.wav"), start_offset=0.0, model="turbo"
+    )
+    assert [r["text"] for r in records] == ["new"]
+    assert [json.loads(l)["text"] for l in (output_dir / "transcript.jsonl").read_text().splitlines()] == ["new"]
+    assert (output_dir / "transcript.jsonl.meta").read_text() == "key-2"
+
+
+def test_unchanged_stages_are_restored_from_cache(pipeline):
+    frames_dir = pipeline.output_base / "frames_src"
+    frames_dir.mkdir(parents=True)
+    slide = frames_dir / "frame_0001.png"
+    slide.write_bytes(b"png")
+    pipeline.whisper_service.transcribe_stream.return_value = segments("hello", "world")
+    pipeline.vision_service.hash_frames.return_value = {"frame_0001.png": "ff00"}
+    pipeline.vision_service.deduplicate_slides.return_value = [str(slide)]
+    pipeline.vision_service.ocr_slides.return_value = {"frame_0001.png": "Intro"}
+    pipeline.process(pipeline.video_path, "Lecture")
+
+    pipeline.mock_prepare_media.reset_mock()
+    pipeline.whisper_service.reset_mock()
+    pipeline.vision_service.reset_mock()
+    pipeline.llm_service.generate_notes.reset_mock()
+
+    # Same media, different title (and so a different output folder)
+    result = pipeline.process(pipeline.video_path, "Lecture again")
+
+    pipeline.mock_prepare_media.assert_not_called()
+    pipeline.whisper_service.transcribe_stream.assert_not_called()
+    pipeline.vision_service.deduplicate_slides.assert_not_called()
+    pipeline.vision_service.ocr_slides.assert_not_called()
+    pipeline.llm_service.generate_notes.assert_called_once_with(
+        "hello world", "[Slide frame_0001.png]: Intro", artifacts=ALL_NOTES, segments=["hello", "world"],
+        knowledge_base=None
+    )
+    output_dir = Path(result["output_dir"])
+    assert (output_dir / "transcript.txt").read_text() == "hello world"
+    assert len((output_dir / "transcript.jsonl").read_text().splitlines()) == 2
+    assert (output_dir / "slides" / "frame_0001.png").read_bytes() == b"png"
+
+
+def test_cache_miss_when_model_changes(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("hello")
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+    pipeline.process(pipeline.video_path, "Lecture")
+
+    pipeline.whisper_model = "ctranslate2:small"
+    pipeline.whisper_service.transcribe_stream.return_value = segments("hello")
+    pipeline.process(pipeline.video_path, "Lecture two")
+
+    assert pipeline.whisper_service.transcribe_stream.call_count == 2
+    # Frame hashes don't depend on the ASR model
+    pipeline.vision_service.hash_frames.assert_called_once()
+
+
+def test_piped_frames_are_deduplicated_during_media_prep(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("t")
+    pipeline.vision_service.deduplicate_stream.return_value = (["slides/frame_0001.png"], {"frame_0001.png": "ff00"})
+    pipeline.vision_service.ocr_slides.return_value = {"frame_0001.png": "Intro"}
+
+    with patch("app.services.pipeline.settings.FRAME_PIPE", True), \
+         patch("app.services.pipeline.stream_frames") as stream:
+        result = pipeline.process(pipeline.video_path, "Lecture")
+
+    output_dir = Path(result["output_dir"])
+    pipeline.mock_prepare_media.assert_not_called()
+    stream.assert_called_once_with(pipeline.video_path, audio_path=output_dir / "audio.wav")
+    assert pipeline.vision_service.deduplicate_stream.call_args[0] == (stream.return_value, output_dir / "slides")
+    pipeline.vision_service.deduplicate_slides.assert_not_called()
+    pipeline.vision_service.ocr_slides.assert_called_once_with(["slides/frame_0001.png"])
+    pipeline.llm_service.generate_notes.assert_called_once_with("t", "[Slide frame_0001.png]: Intro", artifacts=ALL_NOTES, segments=ANY,
+                                                                knowledge_base=None)
+
+
+def test_failed_notes_artifact_is_the_only_one_retried(pipeline):
+    pipeline.whisper_service.transcribe_stream.return_value = segments("hello")
+    pipeline.vision_service.deduplicate_slides.return_value = []
+    pipeline.vision_service.ocr_slides.return_value = {}
+    pipeline.llm_service.generate_notes.side_effect = NotesGenerationError(
+        {"notes": "n", "summary": "s", "announcements": "a"}, {"qa": RuntimeError("timeout")}, "kb"
+    )
+
+    with pytest.raises(NotesGenerationError):
+        pipeline.process(pipeline.video_path, "Lecture")
+    output_dir = next(pipeline.output_base.glob("*_Lecture"))
+    assert (output_dir / "summary.md").read_text() == "s"
+    assert not (output_dir / "qa_cards.md").exists()
+
+    pipeline.llm_service.generate_notes.reset_mock()
+    pipeline.llm_service.generate_notes.side_effect = None
+    pipeline.llm_service.generate_notes.return_value = {"qa": "q"}
+    pipeline.process(pipeline.video_path, "Lecture")
+
+    # Only the failed artifact, from the knowledge base the others were built on
+    pipeline.llm_service.generate_notes.assert_called_once_with("hello", "", artifacts=["qa"], segments=["hello"],
+                                                                knowledge_base="kb")
+    assert (output_dir / "qa_cards.md").read_text() == "q"
+    assert (output_dir / "lecture_notes.md").read_text() == "n"
+
+    # Once everything succeeded, a later run regenerates from scratch
+    pipeline.llm_service.generate_notes.reset_mock()
+    pipeline.llm_service.generate_notes.return_value = {"notes": "n2", "summary": "s2", "qa": "q2", "announcements": "a2"}
+    pipeline.process(pipeline.video_path, "Lecture")
+    pipeline.llm_service.generate_notes.assert_called_once_with("hello", "", artifacts=ALL_NOTES, segments=["hello"],
+                                                                knowledge_base=None)
@@ -0,0 +1,76 @@
+import os
+import imagehash
+import numpy as np
+from PIL import Image
+from app.services.slide_dedup import (
+    bits_to_hex, hex_to_bits, load_thumbnails, phash_batch, select_unique,
+)
+from app.services.vision_service import VisionService
+
+
+def slide(seed: int, size=(320, 240)) -> Image.Image:
+    """A smooth synthetic 'slide': a few random blocks of colour."""
+    rng = np.random.default_rng(seed)
+    img = np.full((size[1], size[0], 3), 255, dtype=np.uint8)
+    for _ in range(6):
+        x, y = rng.integers(0, size[0] - 60), rng.integers(0, size[1] - 40)
+        img[y:y + 40, x:x + 60] = rng.integers(0, 255, 3)
+    return Image.fromarray(img)
+
+
+def test_batch_hash_matches_imagehash(tmp_path):
+    paths = []
+    for i in range(8):
+        path = tmp_path / f"frame_{i:04d}.png"
+        # Full-size frames: downscaling is where hashes could drift from imagehash's
+        slide(i, size=(1920, 1080)).save(path)
+        paths.append(str(path))
+
+    thumbs, ok = load_thumbnails(paths)
+    ours = bits_to_hex(phash_batch(thumbs))
+
+    assert ok == list(range(8))
+    for path, h in zip(paths, ours):
+        assert imagehash.hex_to_hash(h) - imagehash.phash(Image.open(path)) == 0
+    assert (hex_to_bits(ours) == phash_batch(thumbs)).all()
+
+
+def test_select_unique_matches_sequential_scan():
+    rng = np.random.default_rng(0)
+    bits = rng.random((300, 64)) < 0.5
+    # Long runs of near-identical frames, as in a lecture
+    bits = np.repeat(bits[:30], 10, axis=0)
+    bits ^= rng.random(bits.shape) < 0.02
+
+    expected, last = [], None
+    for i, b in enumerate(bits):
+        if last is None or np.count_nonzero(b != last) >= 5:
+            expected.append(i)
+            last = b
+
+    assert select_unique(bits, 5) == expected
+    assert select_unique(bits[:0], 5) == []
+
+
+def test_deduplicate_slides_hardlinks_unique_frames(tmp_path):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    for i, seed in enumerate([1, 1, 1, 2, 2, 3]):
+        slide(seed).save(frames_dir / f"frame_{i + 1:04d}.png")
+    (frames_dir / "frame_0007.png").write_bytes(b"not a png")
+
+    unique = VisionService().deduplicate_slides(str(frames_dir))
+
+    assert [os.path.basename(p) for p in unique] == ["frame_0001.png", "frame_0004.png", "frame_0006.png"]
+    assert all(os.stat(p).st_nlink == 2 for p in unique)
+
+
+def test_deduplicate_stream_writes_only_unique_slides(tmp_path):
+    frames = (np.asarray(slide(seed)) for seed in [1, 1, 2, 2, 2, 1])
+
+    unique, hashes = VisionService().deduplicate_stream(frames, tmp_path / "slides")
+
+    assert [os.path.basename(p) for p in unique] == ["frame_0001.png", "frame_0003.png", "frame_0006.png"]
+    assert sorted(os.listdir(tmp_path / "slides")) == ["frame_0001.png", "frame_0003.png", "frame_0006.png"]
+    assert len(hashes) == 6 and hashes["frame_0001.png"] == hashes["frame_0002.png"]
+    assert Image.open(unique[1]).size == (320, 240)
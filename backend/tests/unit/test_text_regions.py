@@ -0,0 +1,86 @@
+import numpy as np
+from unittest.mock import MagicMock, patch
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from app.services import vision_service
+from app.services.text_regions import find_text_region, prepare_for_ocr
+
+
+def slide_with_text(size=(1920, 1080), origin=(300, 200)):
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=40)
+    for i in range(6):
+        draw.text((origin[0], origin[1] + i * 70), f"- bullet point {i} about memoization", fill="black", font=font)
+    return img
+
+
+def camera_frame():
+    # Smooth, photo-like content without sharp strokes
+    noise = (np.random.default_rng(0).random((108, 192, 3)) * 255).astype(np.uint8)
+    return Image.fromarray(noise).resize((1920, 1080), Image.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+
+
+def test_frames_without_text_are_skipped():
+    assert find_text_region(Image.new("RGB", (1920, 1080), (240, 240, 240))) is None
+    assert find_text_region(camera_frame()) is None
+    assert prepare_for_ocr(camera_frame(), max_side=1280) is None
+
+
+def test_slide_is_cropped_to_text_region():
+    left, top, right, bottom = find_text_region(slide_with_text())
+    assert left <= 300 and top <= 200
+    assert right < 1200 and bottom < 1080
+    # A static layout crops identically, so slides keep batching together
+    assert find_text_region(slide_with_text()) == (left, top, right, bottom)
+
+
+def test_prepare_downscales_and_records_placement():
+    full = prepare_for_ocr(slide_with_text(), max_side=1280, detect=False)
+    # 1280x720, padded to the 256px canvas grid with the white background
+    assert full.image.shape == (768, 1280, 3)
+    assert (full.left, full.top, full.scale) == (0, 0, 1280 / 1920)
+    assert (full.image[720:] == 255).all()
+
+    cropped = prepare_for_ocr(slide_with_text(), max_side=0)
+    left, top, right, bottom = find_text_region(slide_with_text())
+    assert cropped.scale == 1.0 and (cropped.left, cropped.top) == (left, top)
+    assert cropped.image.shape[0] == -(-(bottom - top) // 256) * 256
+    assert cropped.image.shape[1] == -(-(right - left) // 256) * 256
+
+
+def test_ocr_skips_blank_slides_and_maps_boxes_back(tmp_path):
+    text_path, blank_path = str(tmp_path / "frame_0001.png"), str(tmp_path / "frame_0002.png")
+    slide_with_text(origin=(1000, 600)).save(text_path)
+    Image.new("RGB", (1920, 1080), "white").save(blank_path)
+
+    reader = MagicMock()
+    reader.readtext_batched.return_value = [[([[10, 20], [110, 20], [110, 40], [10, 40]], "bullet", 0.9)]]
+    with patch.object(vision_service.settings, "OCR_TEXT_FILTER", True), \
+         patch.object(vision_service.settings, "OCR_MAX_SIDE", 0):
+        entries = vision_service._ocr_batched(reader, [text_path, blank_path], batch_size=8)
+
+    (images,), _ = reader.readtext_batched.call_args
+    assert len(images) == 1 and images[0].shape[1] < 1920
+    left, top, _, _ = find_text_region(Image.open(text_path))
+    assert entries[0]["text"] == "bullet"
+    assert entries[0]["boxes"][0]["box"][0] == [10 + left, 20 + top]
+    # Skipped slides aren't read, so they come back as None and stay out of the OCR cache
+    assert entries[1] is None
+
+
+def test_filtered_slides_of_similar_size_share_batches(tmp_path):
+    paths = []
+    for i, origin in enumerate([(300, 200), (320, 200), (300, 240), (340, 210)]):
+        path = str(tmp_path / f"frame_{i + 1:04d}.png")
+        slide_with_text(origin=origin).save(path)
+        paths.append(path)
+
+    reader = MagicMock()
+    reader.readtext_batched.side_effect = lambda images, **kwargs: [[] for _ in images]
+    with patch.object(vision_service.settings, "OCR_TEXT_FILTER", True), \
+         patch.object(vision_service.settings, "OCR_MAX_SIDE", 1280):
+        entries = vision_service._ocr_batched(reader, paths, batch_size=8)
+
+    # Each crop differs by a few cells, but they pad to the same canvas and go through in one batch
+    assert [len(c.args[0]) for c in reader.readtext_batched.call_args_list] == [4]
+    assert entries == [{"text": "", "boxes": []}] * 4
@@ -0,0 +1,196 @@
+import pytest
+from concurrent.futures import Executor
+from unittest.mock import MagicMock, patch
+from PIL import Image, ImageDraw
+from app.services import vision_service
+from app.services.ocr_cache import OCRCache
+from app.services.ocr_pool import OCRReaderPool
+from app.services.vision_service import VisionService
+
+
+@pytest.fixture(autouse=True)
+def ocr_cache_path(tmp_path):
+    path = tmp_path / "cache" / "ocr.sqlite3"
+    with patch.object(vision_service.settings, "OCR_CACHE_PATH", path):
+        yield path
+
+
+@pytest.fixture(autouse=True)
+def no_text_filter():
+    # The synthetic slides below are shapes, not text; text_regions has its own tests
+    with patch.object(vision_service.settings, "OCR_TEXT_FILTER", False):
+        yield
+
+
+def make_slides(tmp_path, sizes, seeds=None):
+    """Slides with distinct layouts (so distinct pHashes) unless they share a seed."""
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, size in enumerate(sizes, 1):
+        path = tmp_path / f"frame_{i:04d}.png"
+        img = Image.new("RGB", size, "white")
+        seed = seeds[i - 1] if seeds else i
+        draw = ImageDraw.Draw(img)
+        for j in range(seed % 7 + 1):
+            w, h = size
+            x = (seed * 37 + j * 53) % (w // 2)
+            y = (seed * 29 + j * 41) % (h // 2)
+            draw.rectangle([x, y, x + w // 4, y + h // 6], fill=(seed * 40 % 256, j * 60 % 256, 90))
+        img.putpixel((0, 0), (i, 0, 0))  # Lets the fake reader tell slides apart
+        img.save(path)
+        paths.append(str(path))
+    return paths
+
+
+def detections(text):
+    return [([[0, 0], [10, 0], [10, 5], [0, 5]], text, 0.9)]
+
+
+def label(image):
+    return f"{image[0, 0, 0]:04d}"
+
+
+def fake_reader():
+    reader = MagicMock()
+    reader.readtext_batched.side_effect = lambda images, **kw: [detections(f"text {label(i)}") for i in images]
+    reader.readtext.side_effect = lambda image, **kw: detections(f"single {label(image)}")
+    return reader
+
+
+def use_reader(reader):
+    return patch.object(vision_service, "reader_pool", OCRReaderPool(lambda: reader))
+
+
+def test_ocr_batches_same_size_slides(tmp_path):
+    slides = make_slides(tmp_path, [(320, 240)] * 5 + [(640, 480)])
+    reader = fake_reader()
+
+    with use_reader(reader), patch.object(vision_service.settings, "OCR_BATCH_SIZE", 2):
+        results = VisionService().ocr_slides(slides, workers=1)
+
+    batches = [[label(i) for i in c.args[0]] for c in reader.readtext_batched.call_args_list]
+    assert batches == [["0001", "0002"], ["0003", "0004"], ["0005"], ["0006"]]
+    assert list(results) == [f"frame_{i:04d}.png" for i in range(1, 7)]
+    assert results["frame_0006.png"] == "text 0006"
+
+
+def test_failed_batch_falls_back_to_single_slides(tmp_path):
+    slides = make_slides(tmp_path, [(320, 240)] * 2)
+    reader = fake_reader()
+    reader.readtext_batched.side_effect = RuntimeError("out of memory")
+    reader.readtext.side_effect = [detections("first"), RuntimeError("bad image")]
+
+    with use_reader(reader):
+        results = VisionService().ocr_slides(slides, workers=1)
+
+    assert results == {"frame_0001.png": "first", "frame_0002.png": ""}
+
+
+class InlineExecutor(Executor):
+    """Runs pool work in-process, with the worker initializer, so no EasyOCR model is needed."""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        self.max_workers = max_workers
+        initializer(*initargs)
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+def test_failed_slides_are_not_cached(tmp_path):
+    slides = make_slides(tmp_path, [(320, 240)] * 2)
+    reader = fake_reader()
+    reader.readtext_batched.side_effect = RuntimeError("out of memory")
+    reader.readtext.side_effect = [detections("first"), RuntimeError("bad image")]
+    with use_reader(reader):
+        VisionService().ocr_slides(slides, workers=1)
+
+    # The slide that failed is OCR'd again next time; the one that worked comes from the cache
+    reader = fake_reader()
+    with use_reader(reader):
+        results = VisionService().ocr_slides(slides, workers=1)
+
+    assert [[label(i) for i in c.args[0]] for c in reader.readtext_batched.call_args_list] == [["0002"]]
+    assert results == {"frame_0001.png": "first", "frame_0002.png": "text 0002"}
+
+
+def test_process_pool_mode_splits_slides_across_workers(tmp_path):
+    slides = make_slides(tmp_path, [(320, 240)] * 5)
+    reader = fake_reader()
+
+    with patch.object(vision_service, "ProcessPoolExecutor", InlineExecutor), \
+         patch.object(vision_service.easyocr, "Reader", return_value=reader), \
+         patch.object(vision_service.torch, "set_num_threads"):
+        results = VisionService().ocr_slides(slides, workers=2)
+
+    chunks = [len(c.args[0]) for c in reader.readtext_batched.call_args_list]
+    assert chunks == [3, 2]
+    assert list(results.values()) == [f"text {i:04d}" for i in range(1, 6)]
+
+
+def test_known_slides_skip_ocr(tmp_path):
+    first = make_slides(tmp_path / "a", [(320, 240)] * 3, seeds=[1, 2, 3])
+    with use_reader(fake_reader()):
+        VisionService().ocr_slides(first, workers=1)
+
+    # A later lecture reusing slides 2 and 3, plus a new one
+    second = make_slides(tmp_path / "b", [(320, 240)] * 3, seeds=[3, 4, 2])
+    reader = fake_reader()
+    with use_reader(reader):
+        results = VisionService().ocr_slides(second, workers=1)
+
+    ocr_calls = [[label(i) for i in c.args[0]] for c in reader.readtext_batched.call_args_list]
+    assert ocr_calls == [["0002"]]
+    assert results == {"frame_0001.png": "text 0003", "frame_0002.png": "text 0002", "frame_0003.png": "text 0002"}
+
+
+def test_ocr_cache_tolerance_and_eviction(tmp_path):
+    cache = OCRCache(tmp_path / "ocr.sqlite3", tolerance=2, max_entries=2)
+    entry = {"text": "Intro", "boxes": [{"box": [[0, 0]], "text": "Intro", "confidence": 0.9}]}
+    cache.store({"ffffffffffffffff": entry})
+
+    assert cache.lookup(["fffffffffffffffc"]) == [entry]   # 2 bits off
+    assert cache.lookup(["fffffffffffffff8"]) == [None]    # 3 bits off
+
+    cache.store({"0000000000000000": dict(entry, text="a")})
+    cache.lookup(["ffffffffffffffff"])  # touch, so the 0000 entry is least recently used
+    cache.store({"00000000ffffffff": dict(entry, text="b")})
+
+    assert len(cache) == 2
+    assert cache.lookup(["0000000000000000"]) == [None]
+    # Survives reopening
+    assert OCRCache(tmp_path / "ocr.sqlite3").lookup(["ffffffffffffffff"]) == [entry]
+
+
+def test_reader_pool_loads_once_across_jobs(tmp_path):
+    slides = make_slides(tmp_path, [(320, 240)] * 2)
+    factory = MagicMock(side_effect=fake_reader)
+    pool = OCRReaderPool(factory)
+
+    with patch.object(vision_service, "reader_pool", pool), \
+         patch.object(vision_service.settings, "OCR_CACHE_ENABLED", False):
+        for _ in range(3):
+            VisionService().ocr_slides(slides, workers=1)
+
+    assert factory.call_count == 1
+    assert pool.loaded == 1
+
+
+def test_reader_pool_preload_and_idle_release():
+    factory = MagicMock(side_effect=fake_reader)
+    pool = OCRReaderPool(factory)
+    pool.preload()
+    pool.preload()
+    assert factory.call_count == 1
+
+    with pool.acquire():
+        # In use: never released, however long it has been idle before
+        assert pool.release_idle(timeout=1e-9) == 0
+    assert pool.release_idle(timeout=3600) == 0  # Just used
+    assert pool.release_idle(timeout=0) == 0     # Disabled
+    assert pool.release_idle(timeout=1e-9) == 1
+    assert pool.loaded == 0
+
+    with pool.acquire():
+        pass
+    assert factory.call_count == 2
@@ -0,0 +1,112 @@
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import whisper_service
+from app.services.whisper_service import WhisperService
+
+client = TestClient(app)
+
+MB = 2**20
+
+
+def fake_engine(engine_name, model_name, device="cpu", threads=0):
+    engine = MagicMock(name=f"{engine_name}:{model_name}")
+    sizes = {"tiny": 100, "small": 500, "medium": 1500}
+    engine.memory_bytes.return_value = sizes.get(model_name, 1000) * MB
+    return engine
+
+
+@pytest.fixture
+def service():
+    WhisperService._models.clear()
+    with patch.object(whisper_service, "get_engine", side_effect=fake_engine) as get, \
+         patch.object(whisper_service.settings, "WHISPER_CACHE_MB", 2000), \
+         patch.object(whisper_service.settings, "WHISPER_ENGINE", "openai"), \
+         patch.object(WhisperService, "_device", staticmethod(lambda: "cpu")):
+        s = WhisperService()
+        s.mock_get_engine = get
+        yield s
+    WhisperService._models.clear()
+
+
+def test_models_are_cached_per_name(service):
+    small = service.load_model("small")
+    assert service.load_model("small") is small
+    assert service.load_model("tiny") is not small
+    assert service.mock_get_engine.call_count == 2
+
+
+def test_bare_and_explicit_engine_specs_share_a_model(service):
+    turbo = service.load_model("turbo")
+    assert service.load_model("openai:turbo") is turbo
+    assert service.mock_get_engine.call_count == 1
+    assert service.evict("openai:turbo")
+    assert service.cached_models() == []
+
+
+def test_cache_is_usable_while_a_model_loads(service):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_engine(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return fake_engine(*args, **kwargs)
+
+    service.load_model("tiny")
+    service.mock_get_engine.side_effect = slow_engine
+    loaders = [threading.Thread(target=service.load_model, args=("small",)) for _ in range(2)]
+    for t in loaders:
+        t.start()
+    assert started.wait(5)
+
+    # Listing and evicting don't wait for the load in progress
+    assert [m["model"] for m in service.cached_models()] == ["openai:tiny"]
+    assert service.evict("tiny")
+
+    release.set()
+    for t in loaders:
+        t.join(5)
+    # Both callers got the one load
+    assert [m["model"] for m in service.cached_models()] == ["openai:small"]
+    assert service.mock_get_engine.call_count == 2
+
+
+def test_lru_model_is_evicted_over_budget(service):
+    service.load_model("small")
+    service.load_model("tiny")
+    service.load_model("small")  # tiny is now least recently used
+    service.load_model("medium")  # 500 + 100 + 1500 > 2000
+
+    assert [m["model"] for m in service.cached_models()] == ["openai:small", "openai:medium"]
+
+
+def test_model_over_budget_is_still_kept(service):
+    service.load_model("small")
+    with patch.object(whisper_service.settings, "WHISPER_CACHE_MB", 100):
+        service.load_model("medium")
+    assert [m["model"] for m in service.cached_models()] == ["openai:medium"]
+
+
+def test_admin_preload_list_and_evict(service):
+    response = client.post("/api/v1/whisper/models", json={"model": "ctranslate2:small"})
+    assert response.status_code == 200
+    service.mock_get_engine.assert_called_once_with("ctranslate2", "small", device="cpu")
+
+    listed = client.get("/api/v1/whisper/models").json()
+    assert listed["models"] == [{"model": "ctranslate2:small", "device": "cpu", "memoryBytes": 500 * MB}]
+    assert listed["budgetBytes"] == 2000 * MB
+
+    response = client.delete("/api/v1/whisper/models", params={"model": "ctranslate2:small"})
+    assert response.status_code == 200
+    assert response.json()["models"] == []
+
+    response = client.delete("/api/v1/whisper/models", params={"model": "ctranslate2:small"})
+    assert response.status_code == 404
+
+
+def test_admin_preload_unknown_engine(service):
+    service.mock_get_engine.side_effect = KeyError("nope")
+    response = client.post("/api/v1/whisper/models", json={"model": "nope:small"})
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+import wave
+import numpy as np
+import pytest
+from concurrent.futures import Executor
+from unittest.mock import patch
+from app.services import whisper_service
+from app.services.vad import SAMPLE_RATE, read_wav, split_on_silence
+from app.services.whisper_service import WhisperService, _stitch
+
+
+def write_wav(path, samples: np.ndarray):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((samples * 32767).astype(np.int16).tobytes())
+
+
+def speech_with_pauses(pause_at_seconds, total_seconds):
+    """A loud tone with 1-second silences starting at the given offsets."""
+    t = np.arange(total_seconds * SAMPLE_RATE) / SAMPLE_RATE
+    samples = 0.5 * np.sin(2 * np.pi * 220 * t)
+    for p in pause_at_seconds:
+        samples[int(p * SAMPLE_RATE):int((p + 1) * SAMPLE_RATE)] = 0
+    return samples.astype(np.float32)
+
+
+def test_split_on_silence_cuts_inside_pauses(tmp_path):
+    path = tmp_path / "audio.wav"
+    write_wav(path, speech_with_pauses([55, 118, 170], total_seconds=200))
+
+    spans = split_on_silence(str(path), target_seconds=60, search_seconds=10)
+
+    assert spans[0][0] == 0
+    assert spans[-1][1] == 200 * SAMPLE_RATE
+    assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+    cuts = [start / SAMPLE_RATE for start, _ in spans[1:]]
+    for cut, pause in zip(cuts, [55, 118, 170]):
+        assert pause <= cut <= pause + 1
+
+
+def test_split_on_silence_short_audio_is_one_span(tmp_path):
+    path = tmp_path / "audio.wav"
+    write_wav(path, speech_with_pauses([], total_seconds=5))
+    assert split_on_silence(str(path), target_seconds=60) == [(0, 5 * SAMPLE_RATE)]
+
+
+def test_read_wav_span(tmp_path):
+    path = tmp_path / "audio.wav"
+    samples = speech_with_pauses([], total_seconds=2)
+    write_wav(path, samples)
+    span = read_wav(str(path), SAMPLE_RATE // 2, SAMPLE_RATE)
+    assert len(span) == SAMPLE_RATE // 2
+    assert np.allclose(span, samples[SAMPLE_RATE // 2:SAMPLE_RATE], atol=1e-4)
+
+
+def test_stitch_offsets_segments():
+    results = [
+        {"text": " Hello there.", "language": "en",
+         "segments": [{"id": 0, "start": 0.0, "end": 2.0, "text": " Hello there."}]},
+        {"text": " General Kenobi.", "language": "en",
+         "segments": [{"id": 0, "start": 1.0, "end": 3.5, "text": " General Kenobi."}]},
+    ]
+    spans = [(0, 60 * SAMPLE_RATE), (60 * SAMPLE_RATE, 90 * SAMPLE_RATE)]
+
+    stitched = _stitch(results, spans, "en")
+
+    assert stitched["text"] == "Hello there. General Kenobi."
+    assert [(s["id"], s["start"], s["end"]) for s in stitched["segments"]] == [(0, 0.0, 2.0), (1, 61.0, 63.5)]
+
+
+class InlineExecutor(Executor):
+    """Runs pool work in-process so the test needs no Whisper model."""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        self.max_workers = max_workers
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+def test_transcribe_segmented_maps_spans_to_workers(tmp_path):
+    path = tmp_path / "audio.wav"
+    write_wav(path, speech_with_pauses([55, 118], total_seconds=150))
+    calls = []
+
+    def fake_span(audio_path, start, end, language):
+        calls.append((start, end))
+        return {"text": f"span{len(calls)}", "language": language,
+                "segments": [{"id": 0, "start": 0.5, "end": 1.0, "text": f"span{len(calls)}"}]}
+
+    with patch.object(whisper_service.settings, "WHISPER_SEGMENT_SECONDS", 60), \
+         patch.object(whisper_service, "ProcessPoolExecutor", InlineExecutor), \
+         patch.object(whisper_service, "_transcribe_span", side_effect=fake_span):
+        result = WhisperService().transcribe(str(path), workers=3)
+
+    assert len(calls) == 3
+    assert result["text"] == "span1 span2 span3"
+    assert result["segments"][1]["start"] == pytest.approx(calls[1][0] / SAMPLE_RATE + 0.5)